@@ -3,20 +3,37 @@ N8N-Sensei Authentication & Security
 JWT-based authentication with role-based access control
 """
 
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple, Callable, Any, Dict, Set
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import select, event
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, User
+from database import get_async_db, User
 from config import settings
+from services.metrics import metrics
+from services.rate_limit import BucketStore, bucket_store
+from services.quota import quota_manager, QuotaExceeded
 
 # Security configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost makes verify_and_update flag hashes made with any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
 security = HTTPBearer()
 
 SECRET_KEY = settings.secret_key
@@ -33,6 +50,7 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     user_id: Optional[str] = None
     role: Optional[str] = None
+    expires_at: Optional[float] = None  # unix timestamp from the exp claim
 
 class UserCreate(BaseModel):
     email: str
@@ -63,6 +81,58 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool with a cap on queued work."""
+    
+    def __init__(self, workers: int = None, max_pending: int = None):
+        self.workers = workers or settings.PASSWORD_HASH_WORKERS
+        self.max_pending = max_pending or settings.PASSWORD_HASH_MAX_PENDING
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+    
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.pending >= self.max_pending:
+            metrics.inc("password_hash_rejected_total")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry",
+                headers={"Retry-After": "1"}
+            )
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        
+        self.pending += 1
+        metrics.set_gauge("password_hash_pending", self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            metrics.set_gauge("password_hash_pending", self.pending)
+    
+    def hash_blocking(self, password: str) -> str:
+        """Hash a password on the calling thread, for sync code already off the event loop."""
+        return pwd_context.hash(password)
+    
+    def verify_and_update_blocking(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Blocking counterpart of verify_and_update."""
+        return pwd_context.verify_and_update(password, hashed_password)
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost."""
+        return await self._run(self.hash_blocking, password)
+    
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash when the stored one uses a different cost."""
+        return await self._run(self.verify_and_update_blocking, password, hashed_password)
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+password_hasher = PasswordHasher()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -75,8 +145,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
-    """Verify and decode JWT token."""
+def decode_token(token: str) -> TokenData:
+    """Verify and decode a JWT token string."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -84,30 +154,127 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         role: str = payload.get("role")
         
         if user_id is None:
             raise credentials_exception
             
-        token_data = TokenData(user_id=user_id, role=role)
+        token_data = TokenData(user_id=user_id, role=role, expires_at=payload.get("exp"))
     except JWTError:
         raise credentials_exception
     
     return token_data
 
-def get_current_user(
-    token_data: TokenData = Depends(verify_token),
-    db: Session = Depends(get_db)
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
+    """Verify and decode JWT token."""
+    return decode_token(credentials.credentials)
+
+USER_SNAPSHOT_FIELDS = [column.key for column in User.__table__.columns]
+
+class UserCache:
+    """Bounded TTL cache from verified tokens to snapshots of their users."""
+    
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.AUTH_USER_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.AUTH_USER_CACHE_MAX_ENTRIES
+        self.entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.tokens_by_user: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+    
+    def get(self, token: str) -> Optional[User]:
+        """A fresh, detached User built from the cached snapshot, or None."""
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None and entry[0] <= time.time():
+                self._drop(token)
+                entry = None
+            if entry is None:
+                metrics.inc("auth_user_cache_misses_total")
+                return None
+            self.entries.move_to_end(token)
+        metrics.inc("auth_user_cache_hits_total")
+        # A new instance per request so handlers never share mutable state
+        return User(**entry[1])
+    
+    def put(self, token: str, token_data: TokenData, user: User):
+        if self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_data.expires_at is not None:
+            expires_at = min(expires_at, token_data.expires_at)
+        snapshot = {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS}
+        with self.lock:
+            self._drop(token)
+            self.entries[token] = (expires_at, snapshot)
+            self.tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+            metrics.set_gauge("auth_user_cache_entries", len(self.entries))
+    
+    def _drop(self, token: str):
+        entry = self.entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[1]["id"]
+        tokens = self.tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user_id]
+    
+    def patch(self, user_id: str, **fields):
+        """Update fields in every cached snapshot of a user."""
+        with self.lock:
+            for token in self.tokens_by_user.get(user_id, ()):
+                self.entries[token][1].update(fields)
+    
+    def invalidate(self, user_id: str):
+        """Forget every cached token of a user."""
+        with self.lock:
+            for token in list(self.tokens_by_user.get(user_id, ())):
+                self._drop(token)
+            metrics.set_gauge("auth_user_cache_entries", len(self.entries))
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens_by_user.clear()
+
+user_cache = UserCache()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    """Profile edits, deactivation and role changes made through the ORM drop cached snapshots.
+    Bulk UPDATE statements bypass this, so the TTL bounds how stale those can get."""
+    user_cache.invalidate(target.id)
+
+def _patch_cached_quota(user_id: str, used: int, limit: Optional[int]):
+    """The quota flush writes usage with a bulk UPDATE, so it reports the stored values here."""
+    user_cache.patch(user_id, api_quota_used=used, api_quota_limit=limit)
+
+quota_manager.flush_listeners.append(_patch_cached_quota)
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
-    """Get the current authenticated user."""
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    """Get the current authenticated user, from the user cache when possible."""
+    user = user_cache.get(credentials.credentials)
+    if user is not None:
+        return user
+    
+    token_data = decode_token(credentials.credentials)
+    result = await db.execute(select(User).where(User.id == token_data.user_id))
+    user = result.scalar_one_or_none()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
+    user_cache.put(credentials.credentials, token_data, user)
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -140,8 +307,28 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = db.query(User).filter(User.email == email).first()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = password_hasher.verify_and_update_blocking(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # The bcrypt cost changed since this password was stored
+        user.hashed_password = new_hash
+        db.commit()
+    return user
+
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    """Authenticate a user by email and password without blocking the event loop."""
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalar_one_or_none()
+    if not user:
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # The bcrypt cost changed since this password was stored
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_user(db: Session, user_data: UserCreate) -> User:
@@ -155,10 +342,9 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
     db_user = User(
         email=user_data.email,
-        hashed_password=hashed_password,
+        hashed_password=password_hasher.hash_blocking(user_data.password),
         full_name=user_data.full_name,
         role=user_data.role
     )
@@ -168,39 +354,49 @@ def create_user(db: Session, user_data: UserCreate) -> User:
     db.refresh(db_user)
     return db_user
 
+async def create_user_async(db: AsyncSession, user_data: UserCreate) -> User:
+    """Create a new user through an async session."""
+    result = await db.execute(select(User).where(User.email == user_data.email))
+    if result.scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    
+    db_user = User(
+        email=user_data.email,
+        hashed_password=await password_hasher.hash(user_data.password),
+        full_name=user_data.full_name,
+        role=user_data.role
+    )
+    
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
 class RateLimiter:
-    """Simple rate limiting for API endpoints."""
+    """Token bucket rate limiting for API endpoints: bursts up to max_requests, refilled over the window."""
     
-    def __init__(self, max_requests: int = 100, window_minutes: int = 60):
+    def __init__(self, max_requests: int = 100, window_minutes: int = 60, name: str = "api", store: BucketStore = None):
         self.max_requests = max_requests
         self.window_minutes = window_minutes
-        self.requests = {}
+        self.name = name
+        self.store = store or bucket_store
+        self.rate = max_requests / (window_minutes * 60)  # tokens per second
     
     def is_allowed(self, user_id: str) -> bool:
         """Check if user is within rate limits."""
-        now = datetime.utcnow()
-        window_start = now - timedelta(minutes=self.window_minutes)
-        
-        if user_id not in self.requests:
-            self.requests[user_id] = []
-        
-        # Clean old requests
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if req_time > window_start
-        ]
-        
-        # Check limit
-        if len(self.requests[user_id]) >= self.max_requests:
-            return False
-        
-        # Add current request
-        self.requests[user_id].append(now)
-        return True
+        try:
+            return self.store.take(f"{self.name}:{user_id}", self.max_requests, self.rate, time.time())
+        except Exception as e:
+            # An unreachable shared store must not lock every user out
+            print(f"⚠️ Rate limit store error, allowing request: {e}")
+            return True
 
 # Rate limiter instances
-api_rate_limiter = RateLimiter(max_requests=1000, window_minutes=60)
-ai_rate_limiter = RateLimiter(max_requests=100, window_minutes=60)
+api_rate_limiter = RateLimiter(max_requests=1000, window_minutes=60, name="api")
+ai_rate_limiter = RateLimiter(max_requests=100, window_minutes=60, name="ai")
 
 def check_api_rate_limit(current_user: User = Depends(get_current_active_user)):
     """Check API rate limits."""
@@ -218,4 +414,27 @@ def check_ai_rate_limit(current_user: User = Depends(get_current_active_user)):
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="AI API rate limit exceeded"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def charge_ai_quota(user: User):
+    """Charge one AI call to a user's API quota."""
+    if not settings.QUOTA_ENABLED:
+        return
+    try:
+        quota_manager.consume(user)
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
+
+def refund_ai_quota(user: User):
+    """Give back the charge of an AI call that failed or was turned away."""
+    if not settings.QUOTA_ENABLED:
+        return
+    quota_manager.refund(user.id)
+
+async def check_ai_quota(current_user: User = Depends(get_current_user)) -> User:
+    """Check and charge the AI API quota of the current user."""
+    charge_ai_quota(current_user)
+    return current_user
@@ -3,7 +3,7 @@ Configuration settings for the AI-N8N Bridge
 """
 
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict
 
 class Settings(BaseSettings):
     # N8N Configuration
@@ -11,7 +11,31 @@ class Settings(BaseSettings):
     N8N_PORT: int = 5678
     N8N_PROTOCOL: str = "http"
     N8N_API_KEY: Optional[str] = None
-    
+
+    # N8N HTTP client pool (shared for the lifetime of the app)
+    N8N_HTTP_TIMEOUT: float = 10.0
+    N8N_HTTP_MAX_CONNECTIONS: int = 100
+    N8N_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    N8N_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    N8N_HTTP2: bool = True
+    
+    # Local workflow catalog mirrored from N8N (reads are served locally while fresh)
+    WORKFLOW_CATALOG_ENABLED: bool = True
+    WORKFLOW_CATALOG_SYNC_INTERVAL: float = 15.0
+    WORKFLOW_CATALOG_MAX_STALENESS: float = 60.0  # older than this, reads sync first or go to N8N
+    
+    # Conditional requests (ETag / If-None-Match) on workflow reads
+    N8N_CONDITIONAL_CACHE_ENTRIES: int = 256  # N8N responses kept for revalidation
+    WORKFLOW_HTTP_MAX_AGE: int = 0  # Cache-Control max-age for GET /api/workflows/{id}
+    STATISTICS_HTTP_MAX_AGE: int = 5  # Cache-Control max-age for /statistics
+    
+    # Execution statistics aggregated incrementally from N8N executions
+    EXECUTION_STATS_ENABLED: bool = True
+    EXECUTION_STATS_SYNC_INTERVAL: float = 30.0
+    EXECUTION_STATS_MAX_STALENESS: float = 30.0  # older than this, a statistics read syncs first
+    EXECUTION_STATS_IDLE_SECONDS: float = 3600.0  # stop background syncs for workflows nobody reads
+    EXECUTION_STATS_PAGE_SIZE: int = 250
+
     # AI Providers - Local AI
     LLAMA_HOST: str = "localhost"
     LLAMA_PORT: int = 11434
@@ -34,7 +58,72 @@ class Settings(BaseSettings):
     
     OPENROUTER_API_KEY: Optional[str] = None
     OPENROUTER_MODEL: str = "anthropic/claude-3-haiku"
-    
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+
+    # AI provider client pools (built once per process)
+    AI_HTTP_TIMEOUT: float = 60.0
+    AI_POOL_MAX_CONNECTIONS: int = 20
+    AI_POOL_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    AI_POOL_KEEPALIVE_EXPIRY: float = 60.0
+    AI_PROVIDER_POOL_LIMITS: Dict[str, int] = {}  # e.g. {"ollama": 4, "openai": 50}
+
+    # AI provider health probing
+    AI_HEALTH_PROBE_TIMEOUT: float = 3.0
+    AI_HEALTH_DEADLINE: float = 4.0
+    AI_HEALTH_TTL_SECONDS: float = 30.0
+    AI_HEALTH_REFRESH_INTERVAL: float = 15.0
+
+    # AI response cache (exact match, TTL in seconds per endpoint; 0 disables)
+    AI_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    AI_CACHE_SQLITE_PATH: Optional[str] = None  # e.g. "./ai_cache.db" for an on-disk tier
+    AI_CACHE_TTL_CHAT: int = 0
+    AI_CACHE_TTL_EXPLAIN: int = 3600
+    AI_CACHE_TTL_OPTIMIZE: int = 1800
+    AI_CACHE_TTL_GENERATE: int = 1800
+
+    # Semantic cache for near-duplicate chat prompts (works offline)
+    AI_SEMANTIC_CACHE_ENABLED: bool = False
+    AI_SEMANTIC_CACHE_THRESHOLD: float = 0.85
+    AI_SEMANTIC_CACHE_TTL: int = 3600
+    AI_SEMANTIC_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    AI_SEMANTIC_CACHE_DIM: int = 1024
+    AI_SEMANTIC_CACHE_MODEL: Optional[str] = None  # local sentence-transformers model, if installed
+
+    # Latency-aware provider routing for ai_provider="auto"
+    AI_ROUTER_EWMA_ALPHA: float = 0.2
+    AI_ROUTER_DEFAULT_LATENCY_MS: float = 2000.0  # prior for providers with no calls yet
+    AI_ROUTER_ERROR_PENALTY: float = 4.0
+    AI_ROUTER_MAX_ERROR_RATE: float = 0.5
+    AI_ROUTER_ERROR_HALF_LIFE_SECONDS: float = 60.0  # idle failing providers become healthy again
+    AI_ROUTER_LATENCY_BUDGET_SECONDS: float = 60.0
+    AI_ROUTER_ATTEMPT_TIMEOUT_SECONDS: float = 20.0
+
+    # Hedged requests between the local Ollama and LM Studio backends
+    AI_HEDGE_ENABLED: bool = False
+    AI_HEDGE_PERCENTILE: float = 0.95  # hedge once the primary is slower than this share of its recent calls
+    AI_HEDGE_MIN_SAMPLES: int = 20
+    AI_HEDGE_DEFAULT_DELAY_MS: float = 2000.0  # used until enough samples exist
+    AI_HEDGE_MIN_DELAY_MS: float = 50.0
+
+    # Background jobs for workflow generation and optimization
+    AI_JOB_WORKERS: int = 4
+    AI_JOB_DEFAULT_PROVIDER_CONCURRENCY: int = 2
+    AI_JOB_PROVIDER_CONCURRENCY: Dict[str, int] = {}  # e.g. {"ollama": 1, "openai": 8}
+
+    # Per-provider admission control for AI calls
+    AI_ADMISSION_DEFAULT_MAX_IN_FLIGHT: int = 16
+    AI_ADMISSION_MAX_IN_FLIGHT: Dict[str, int] = {"llama": 4, "ollama": 4, "lm_studio": 4}
+    AI_ADMISSION_MAX_QUEUE: int = 32  # waiting calls per provider before rejecting with 503
+    AI_ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 30.0
+
+    # Multi-turn conversation context sent with chat messages
+    AI_CONTEXT_MAX_TURNS: int = 20  # recent turns loaded per session
+    AI_CONTEXT_DEFAULT_TOKEN_BUDGET: int = 2048
+    AI_CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {"openai": 8192, "anthropic": 16384, "openrouter": 8192}
+    AI_CONTEXT_SUMMARY_TOKENS: int = 256  # share of the budget for a summary of trimmed turns
+    AI_CONTEXT_CACHE_SESSIONS: int = 1000
+    AI_CONTEXT_TOKENIZER: Optional[str] = None  # tiktoken encoding, e.g. "cl100k_base", if installed
+
     # Bridge Configuration
     BRIDGE_HOST: str = "0.0.0.0"
     BRIDGE_PORT: int = 8000
@@ -42,6 +131,21 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./bridge.db"
+    DATABASE_POOL_SIZE: int = 5  # async engine connections kept open
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    DATABASE_POOL_RECYCLE: int = 1800
+    WRITE_BEHIND_BATCH_SIZE: int = 100  # conversation rows per insert transaction
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.5
+    WRITE_BEHIND_MAX_BUFFER: int = 5000
+
+    # SQLite performance profile, applied to every new connection
+    SQLITE_PERFORMANCE_PROFILE: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
+    SQLITE_CACHE_SIZE: int = -65536  # negative values are KiB, i.e. 64 MB per connection
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-this"
@@ -49,6 +153,25 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5678"
     
+    # Password hashing (bcrypt runs in its own thread pool, off the event loop)
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # existing hashes are upgraded on next login when this changes
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32  # queued plus running hashes before rejecting with 503
+    
+    # Authenticated-user cache (verified token -> user snapshot)
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60.0  # 0 disables
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Rate limit buckets: "memory" (per process), "sqlite" or "redis" (shared across workers)
+    RATE_LIMIT_STORE: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "./rate_limits.db"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    
+    # API quotas (counted in memory, written to the users table in batches)
+    QUOTA_ENABLED: bool = True
+    QUOTA_FLUSH_INTERVAL: float = 5.0
+    QUOTA_IDLE_SECONDS: float = 600.0  # forget users with no AI calls for this long
+    
     # Features
     ENABLE_CHAT_EXTENSION: bool = True
     ENABLE_SAAS_MODE: bool = False
@@ -2,15 +2,108 @@
 Database configuration and models for N8N-Sensei
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON, Float, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Index, Column, Integer, String, Text, Date, DateTime, Boolean, JSON, Float, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from datetime import datetime
+from typing import Dict, Any
 import uuid
 from config import settings
+import database_models
 
-engine = create_engine(settings.DATABASE_URL)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database URL for its asyncio counterpart"""
+    scheme, separator, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+SYNCHRONOUS_LEVELS = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def is_memory_sqlite(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Per-connection PRAGMAs of the SQLite performance profile"""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Connect event that applies the SQLite profile to every new connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def configure_sqlite(engine):
+    """Register the SQLite profile on a sync engine (or the sync core of an async one)"""
+    if engine.dialect.name == "sqlite" and settings.SQLITE_PERFORMANCE_PROFILE:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+def engine_options(url: str) -> dict:
+    """Pool settings for the sync engine, whose SQLite connections are shared across threads"""
+    if is_memory_sqlite(url):
+        return {}
+    options = {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+def async_engine_options(url: str) -> dict:
+    """Pool settings for the async engine (in-memory SQLite uses a single static connection)"""
+    options = {}
+    if is_sqlite(url):
+        if is_memory_sqlite(url):
+            return options
+        # aiosqlite defaults to opening a new connection (and thread) per checkout
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return {
+        **options,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+engine = configure_sqlite(create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Request-path database work goes through the async engine so it never blocks the event loop
+ASYNC_DATABASE_URL = async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options(ASYNC_DATABASE_URL))
+configure_sqlite(async_engine.sync_engine)
+
+# Effective settings read back from the database at startup, reported by /api/health
+database_profile: Dict[str, Any] = {}
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
 class User(Base):
@@ -62,6 +155,10 @@ class WorkflowTemplate(Base):
 
 class AIConversation(Base):
     __tablename__ = "ai_conversations"
+    __table_args__ = (
+        # Keyset pagination of a session's history
+        Index("ix_ai_conversations_session_created_id", "session_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = Column(String, index=True)
@@ -105,9 +202,102 @@ class WorkflowExecution(Base):
     # Relationships
     user = relationship("User")
 
+class AIJob(Base):
+    __tablename__ = "ai_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_type = Column(String, index=True)  # generate_workflow, optimize_workflow
+    user_id = Column(String, ForeignKey("users.id"), index=True)  # only the submitter may read the job
+    status = Column(String, index=True, default="queued")  # queued, running, succeeded, failed
+    ai_provider = Column(String)
+    request_data = Column(JSON)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class WorkflowStats(Base):
+    __tablename__ = "workflow_stats"
+    
+    # All-time execution aggregate per N8N workflow, advanced by incremental syncs
+    workflow_id = Column(String, primary_key=True)
+    total = Column(Integer, default=0)  # finished executions
+    successful = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    running = Column(Integer, default=0)  # unfinished as of the last sync
+    pending_execution_ids = Column(JSON)  # those unfinished executions, checked again by each sync
+    duration_sketch = Column(JSON)  # DurationSketch.to_dict()
+    last_execution_id = Column(String)  # sync cursor: executions up to this id are counted or pending
+    last_execution_at = Column(DateTime, nullable=True)
+    synced_at = Column(DateTime, nullable=True)
+
+class WorkflowStatsDaily(Base):
+    __tablename__ = "workflow_stats_daily"
+    
+    # The same aggregate per UTC day of execution start, summed for windowed numbers
+    workflow_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    total = Column(Integer, default=0)
+    successful = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    duration_sketch = Column(JSON)
+
 async def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # The local workflow catalog mirrors N8N into the Workflow model of database_models
+        await conn.run_sync(database_models.Base.metadata.create_all, tables=[database_models.Workflow.__table__])
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(create_missing_indexes)
+    await check_database_profile()
+
+def managed_tables():
+    """Tables init_db creates and keeps up to date"""
+    return Base.metadata.sorted_tables + [database_models.Workflow.__table__]
+
+def add_missing_columns(connection):
+    """create_all skips existing tables, so add columns introduced after a table was created"""
+    inspector = inspect(connection)
+    quote = connection.dialect.identifier_preparer.quote
+    for table in managed_tables():
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+
+def create_missing_indexes(connection):
+    """create_all skips existing tables, so add indexes introduced after a table was created"""
+    for table in managed_tables():
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+async def check_database_profile() -> Dict[str, Any]:
+    """Read back the effective connection settings and warn when the SQLite profile did not apply"""
+    profile: Dict[str, Any] = {
+        "dialect": async_engine.dialect.name,
+        "pool_size": async_engine.pool.size() if hasattr(async_engine.pool, "size") else None,
+    }
+    if async_engine.dialect.name == "sqlite":
+        async with async_engine.connect() as conn:
+            for name in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size"):
+                profile[name] = (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+        profile["synchronous"] = SYNCHRONOUS_LEVELS.get(profile["synchronous"], profile["synchronous"])
+        profile["journal_mode"] = str(profile["journal_mode"]).upper()
+        if settings.SQLITE_PERFORMANCE_PROFILE and profile["journal_mode"] != settings.SQLITE_JOURNAL_MODE.upper():
+            print(f"⚠️ SQLite journal_mode is {profile['journal_mode']}, expected {settings.SQLITE_JOURNAL_MODE}")
+    database_profile.clear()
+    database_profile.update(profile)
+    return profile
+
+async def close_db():
+    """Release pooled async database connections"""
+    await async_engine.dispose()
 
 def init_database():
     """Initialize database with default data"""
@@ -142,4 +332,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
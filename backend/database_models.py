@@ -58,12 +58,18 @@ class Workflow(Base):
     nodes = Column(JSON)
     connections = Column(JSON)
     settings = Column(JSON)
+    tag_names = Column(Text)  # lower-cased names as "|sales|crm|" for tag filters in SQL
     
     # Ownership and timestamps
     owner_id = Column(String, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Local catalog sync state
+    n8n_data = Column(JSON)  # the workflow exactly as N8N returned it
+    n8n_updated_at = Column(DateTime, index=True)
+    synced_at = Column(DateTime)
+    
     # Relationships
     owner = relationship("User", back_populates="workflows")
     executions = relationship("WorkflowExecution", back_populates="workflow")
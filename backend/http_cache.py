@@ -0,0 +1,51 @@
+"""
+HTTP caching helpers for N8N-Sensei
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from fastapi import Request, Response
+
+def content_etag(body: bytes, version: Optional[str] = None) -> str:
+    """Strong ETag over the exact response bytes, led by the resource version when it has one"""
+    digest = hashlib.sha256(body).hexdigest()[:24]
+    stamp = re.sub(r"[^0-9A-Za-z]", "", version or "")
+    return f'"{stamp}-{digest}"' if stamp else f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names this ETag; GET revalidation uses weak comparison, so W/ is ignored"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def cache_headers(etag: str, max_age: int) -> Dict[str, str]:
+    """Validator and freshness hints for a private, pollable resource"""
+    return {"ETag": etag, "Cache-Control": f"private, max-age={max_age}, must-revalidate"}
+
+def not_modified(etag: str, max_age: int) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, max_age))
+
+class ETagCache:
+    """ETags of recently served resources by key and version, so unchanged ones revalidate without serializing"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple[Any, str]]" = OrderedDict()
+
+    def get(self, key: Hashable, version: Any) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, version: Any, etag: str):
+        self.entries[key] = (version, etag)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -3,7 +3,8 @@ N8N-Sensei - Your AI Workflow Sensei
 Main FastAPI Application
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
@@ -11,8 +12,18 @@ import os
 from dotenv import load_dotenv
 
 from routers import workflows, ai, health, auth
-from database import init_db, init_database
+from database import init_db, init_database, close_db
 from config import settings
+from services.n8n_service import init_n8n_service, close_n8n_service
+from services.workflow_catalog import workflow_catalog
+from services.execution_stats import execution_stats
+from services.ai_clients import init_ai_clients, close_ai_clients
+from services.provider_health import provider_health
+from services.job_service import job_manager
+from services.admission import AdmissionRejected
+from services.write_behind import write_behind
+from services.quota import quota_manager
+from auth import password_hasher
 
 load_dotenv()
 
@@ -21,9 +32,26 @@ async def lifespan(app: FastAPI):
     # Startup
     await init_db()
     init_database()  # Initialize with default data
+    write_behind.start()  # Batch conversation inserts off the request path
+    quota_manager.start()  # Flush API quota usage in batches
+    n8n = await init_n8n_service()  # Shared pooled N8N HTTP client
+    workflow_catalog.start(n8n)  # Mirror N8N workflows locally, synced by updatedAt
+    execution_stats.start(n8n)  # Keep execution statistics of watched workflows current
+    await init_ai_clients()  # Shared pooled AI provider clients
+    provider_health.start()  # Keep AI provider status warm in the background
+    await job_manager.start()  # Resume unfinished AI jobs
     yield
     # Shutdown
-    pass
+    await job_manager.stop()
+    await provider_health.stop()
+    await workflow_catalog.stop()
+    await execution_stats.stop()
+    await close_ai_clients()
+    await close_n8n_service()
+    await write_behind.stop()  # Flush buffered rows before the pool goes away
+    await quota_manager.stop()
+    await close_db()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title="N8N-Sensei API",
@@ -41,6 +69,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Shed load from an overloaded AI provider with a retryable 503"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include routers
 app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(auth.router, prefix="/api", tags=["authentication"])
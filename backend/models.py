@@ -14,6 +14,7 @@ class AIProvider(str, Enum):
     OPENROUTER = "openrouter"
     LM_STUDIO = "lm_studio"  # LM Studio local AI
     OLLAMA = "ollama"  # Ollama local AI
+    AUTO = "auto"  # Latency-aware routing with failover across available providers
 
 class WorkflowStatus(str, Enum):
     ACTIVE = "active"
@@ -26,6 +27,12 @@ class ExecutionStatus(str, Enum):
     ERROR = "error"
     WAITING = "waiting"
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 # Request Models
 class ChatRequest(BaseModel):
     message: str = Field(..., description="User message to the AI")
@@ -81,12 +88,24 @@ class ExecutionResponse(BaseModel):
     data: Optional[Dict[str, Any]]
     ai_triggered: bool = False
 
+class JobResponse(BaseModel):
+    id: str
+    job_type: str
+    status: JobStatus
+    ai_provider: str
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     n8n_connected: bool
     ai_providers: Dict[str, bool]
     database_connected: bool
+    database_settings: Optional[Dict[str, Any]] = None
 
 # Internal Models
 class N8NWorkflow(BaseModel):
@@ -98,6 +117,14 @@ class N8NWorkflow(BaseModel):
     createdAt: datetime
     updatedAt: datetime
 
+class ChatResult(BaseModel):
+    text: str
+    provider: str
+    model: str
+    cache_hit: bool = False
+    similarity: Optional[float] = None  # set for semantic cache hits
+    error: bool = False
+
 class AIMessage(BaseModel):
     role: str  # user, assistant, system
     content: str
@@ -2,44 +2,100 @@
 AI integration endpoints for N8N-Sensei
 """
 
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Response, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
 import uuid
 from datetime import datetime
 
 from models import (
     ChatRequest, ChatResponse, WorkflowGenerateRequest, WorkflowGenerateResponse,
-    WorkflowOptimizeRequest, ParameterFillRequest, AIProvider
+    WorkflowOptimizeRequest, ParameterFillRequest, AIProvider, JobResponse
 )
-from services.ai_service import AIService
-from services.n8n_service import N8NService
-from database import get_db, AIConversation, User
-from auth import get_current_user
+from services.ai_service import AIService, get_ai_service
+from services.n8n_service import N8NService, get_n8n_service, n8n_request_memo
+from services.provider_health import provider_health
+from services.provider_router import provider_router
+from services.job_service import job_manager
+from services.admission import AdmissionRejected
+from services.write_behind import write_behind
+from services.conversation_context import context_builder
+from database import get_async_db, AIConversation, User
+from auth import get_current_user, check_ai_quota, refund_ai_quota
+from config import settings
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_fields
 
 router = APIRouter()
 
+HISTORY_FIELDS = ["id", "user_message", "ai_response", "ai_provider", "workflow_id", "action_taken", "created_at"]
+
+def detect_workflow_action(response: str) -> Tuple[Optional[str], List[str]]:
+    """Simple keyword detection for workflow actions in an AI response"""
+    workflow_action = None
+    suggestions = []
+    
+    response_lower = response.lower()
+    if "create workflow" in response_lower or "generate workflow" in response_lower:
+        workflow_action = "create_suggested"
+        suggestions.append("Would you like me to generate this workflow for you?")
+    elif "modify workflow" in response_lower or "update workflow" in response_lower:
+        workflow_action = "modify_suggested"
+        suggestions.append("I can help you modify the workflow. Please provide the workflow ID.")
+    elif "execute workflow" in response_lower or "run workflow" in response_lower:
+        workflow_action = "execute_suggested"
+        suggestions.append("I can execute this workflow for you. Please confirm.")
+    
+    return workflow_action, suggestions
+
+def set_cache_header(response: Response, cache_hit: bool, similarity: Optional[float] = None):
+    """Tell clients whether the AI response came from the response cache"""
+    response.headers["X-Cache"] = "HIT" if cache_hit else "MISS"
+    if similarity is not None:
+        response.headers["X-Cache-Similarity"] = f"{similarity:.3f}"
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
     request: ChatRequest, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    http_response: Response,
+    current_user: User = Depends(check_ai_quota),
+    ai_service: AIService = Depends(get_ai_service),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Chat with AI about workflows and automation
     """
+    refunded = False
     try:
-        ai_service = AIService()
-        
         # Generate session ID if not provided
         session_id = request.session_id or str(uuid.uuid4())
         
+        # Earlier turns of a continued session, trimmed to the provider's token budget
+        history = None
+        if request.session_id:
+            history = await context_builder.history(db, current_user.id, session_id, request.ai_provider)
+        
         # Get AI response
-        response = await ai_service.chat(
+        result = await ai_service.complete(
             message=request.message,
             provider=request.ai_provider,
-            context=request.workflow_context
+            context=request.workflow_context,
+            cache_ttl=settings.AI_CACHE_TTL_CHAT,
+            semantic=True,
+            history=history
         )
+        if result.error:
+            refund_ai_quota(current_user)
+            refunded = True
+        set_cache_header(http_response, result.cache_hit, result.similarity)
+        response = result.text
         
         # Save conversation to database
         conversation = AIConversation(
@@ -47,55 +103,128 @@ async def chat_with_ai(
             user_id=current_user.id,
             user_message=request.message,
             ai_response=response,
-            ai_provider=request.ai_provider.value,
+            ai_provider=result.provider,
             workflow_id=request.workflow_context,
             created_at=datetime.utcnow()
         )
-        db.add(conversation)
-        db.commit()
+        await write_behind.add(conversation)
+        context_builder.append(current_user.id, session_id, request.message, response)
         
         # Analyze response for workflow actions
-        workflow_action = None
+        workflow_action, suggestions = detect_workflow_action(response)
         workflow_id = None
-        suggestions = []
-        
-        # Simple keyword detection for workflow actions
-        response_lower = response.lower()
-        if "create workflow" in response_lower or "generate workflow" in response_lower:
-            workflow_action = "create_suggested"
-            suggestions.append("Would you like me to generate this workflow for you?")
-        elif "modify workflow" in response_lower or "update workflow" in response_lower:
-            workflow_action = "modify_suggested"
-            suggestions.append("I can help you modify the workflow. Please provide the workflow ID.")
-        elif "execute workflow" in response_lower or "run workflow" in response_lower:
-            workflow_action = "execute_suggested"
-            suggestions.append("I can execute this workflow for you. Please confirm.")
         
         return ChatResponse(
             response=response,
             session_id=session_id,
-            ai_provider=request.ai_provider.value,
+            ai_provider=result.provider,
             workflow_action=workflow_action,
             workflow_id=workflow_id,
             suggestions=suggestions
         )
+    except AdmissionRejected:
+        refund_ai_quota(current_user)
+        raise
     except Exception as e:
+        # A failed reply was already refunded before the later step raised
+        if not refunded:
+            refund_ai_quota(current_user)
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    request: ChatRequest,
+    current_user: User = Depends(check_ai_quota),
+    ai_service: AIService = Depends(get_ai_service),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Chat with AI and stream the response tokens as Server-Sent Events
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    history = None
+    if request.session_id:
+        history = await context_builder.history(db, current_user.id, session_id, request.ai_provider)
+    
+    async def event_stream():
+        # The start event goes out before a provider is chosen; done reports the one that answered
+        yield sse_event("start", {"session_id": session_id, "ai_provider": request.ai_provider.value})
+        
+        chunks = []
+        answered_by = request.ai_provider
+        
+        def on_provider(provider: AIProvider):
+            nonlocal answered_by
+            answered_by = provider
+        
+        try:
+            async for token in ai_service.chat_stream(
+                message=request.message,
+                provider=request.ai_provider,
+                context=request.workflow_context,
+                history=history,
+                on_provider=on_provider
+            ):
+                chunks.append(token)
+                yield sse_event("token", {"content": token})
+        except AdmissionRejected as e:
+            refund_ai_quota(current_user)
+            yield sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            refund_ai_quota(current_user)
+            yield sse_event("error", {"detail": f"Error communicating with {request.ai_provider}: {str(e)}"})
+            return
+        
+        response = "".join(chunks)
+        
+        # Save the finished conversation to database
+        conversation = AIConversation(
+            session_id=session_id,
+            user_id=current_user.id,
+            user_message=request.message,
+            ai_response=response,
+            ai_provider=answered_by.value,
+            workflow_id=request.workflow_context,
+            created_at=datetime.utcnow()
+        )
+        await write_behind.add(conversation)
+        context_builder.append(current_user.id, session_id, request.message, response)
+        
+        workflow_action, suggestions = detect_workflow_action(response)
+        yield sse_event("done", ChatResponse(
+            response=response,
+            session_id=session_id,
+            ai_provider=answered_by.value,
+            workflow_action=workflow_action,
+            workflow_id=None,
+            suggestions=suggestions
+        ).model_dump())
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/generate-workflow", response_model=WorkflowGenerateResponse)
-async def generate_workflow(request: WorkflowGenerateRequest, db: Session = Depends(get_db)):
+async def generate_workflow(
+    request: WorkflowGenerateRequest,
+    http_response: Response,
+    n8n_service: N8NService = Depends(get_n8n_service),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     Generate N8N workflow from natural language description
     """
     try:
-        ai_service = AIService()
-        n8n_service = N8NService()
-        
         # Generate workflow using AI
         workflow_data = await ai_service.generate_workflow(
             description=request.description,
-            provider=request.ai_provider
+            provider=request.ai_provider,
+            cache_ttl=settings.AI_CACHE_TTL_GENERATE
         )
+        set_cache_header(http_response, workflow_data.pop("ai_cache_hit", False))
         
         # Extract AI explanation if present
         ai_explanation = workflow_data.pop("ai_explanation", "Workflow generated successfully")
@@ -118,8 +247,7 @@ async def generate_workflow(request: WorkflowGenerateRequest, db: Session = Depe
                 action_taken="workflow_created",
                 created_at=datetime.utcnow()
             )
-            db.add(conversation)
-            db.commit()
+            await write_behind.add(conversation)
             
             return WorkflowGenerateResponse(
                 workflow=created_workflow,
@@ -131,80 +259,72 @@ async def generate_workflow(request: WorkflowGenerateRequest, db: Session = Depe
                 status_code=400,
                 detail=f"Generated workflow is invalid: {validation['errors']}"
             )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow generation failed: {str(e)}")
 
-@router.post("/optimize-workflow")
-async def optimize_workflow(request: WorkflowOptimizeRequest, db: Session = Depends(get_db)):
+@router.post("/optimize-workflow", dependencies=[Depends(n8n_request_memo)])
+async def optimize_workflow(
+    request: WorkflowOptimizeRequest,
+    http_response: Response,
+    n8n_service: N8NService = Depends(get_n8n_service),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     Optimize existing workflow using AI
     """
     try:
-        ai_service = AIService()
-        n8n_service = N8NService()
-        
-        # Get current workflow
-        workflow = await n8n_service.get_workflow(request.workflow_id)
-        analysis = await n8n_service.analyze_workflow_for_ai(request.workflow_id)
-        
-        # Create optimization prompt
-        optimization_prompt = f"""
-        Analyze and optimize this N8N workflow:
-        
-        Workflow: {workflow['name']}
-        Current Performance: {analysis['performance']}
-        Nodes: {len(analysis['nodes'])} nodes
-        
-        Optimization Goals: {', '.join(request.optimization_goals)}
-        
-        Current Workflow Structure:
-        {workflow}
-        
-        Please provide:
-        1. Specific optimization recommendations
-        2. Updated workflow JSON (if changes needed)
-        3. Expected performance improvements
-        4. Risk assessment of changes
-        """
+        # Get current workflow; the analysis shares its fetch through the request memo
+        workflow, analysis = await asyncio.gather(
+            n8n_service.get_workflow(request.workflow_id),
+            n8n_service.analyze_workflow_for_ai(request.workflow_id)
+        )
         
         # Get AI optimization suggestions
-        optimization_response = await ai_service.chat(
-            message=optimization_prompt,
+        result = await ai_service.optimize_workflow(
+            workflow=workflow,
+            analysis=analysis,
+            optimization_goals=request.optimization_goals,
             provider=request.ai_provider,
-            context=f"Optimizing workflow {request.workflow_id}"
+            cache_ttl=settings.AI_CACHE_TTL_OPTIMIZE
         )
+        set_cache_header(http_response, result.cache_hit)
+        optimization_response = result.text
         
         # Save conversation
         conversation = AIConversation(
             session_id=str(uuid.uuid4()),
             user_message=f"Optimize workflow {request.workflow_id}",
             ai_response=optimization_response,
-            ai_provider=request.ai_provider.value,
+            ai_provider=result.provider,
             workflow_id=request.workflow_id,
             action_taken="workflow_optimized",
             created_at=datetime.utcnow()
         )
-        db.add(conversation)
-        db.commit()
+        await write_behind.add(conversation)
         
         return {
             "workflow_id": request.workflow_id,
             "optimization_suggestions": optimization_response,
             "current_performance": analysis['performance'],
-            "ai_provider": request.ai_provider.value
+            "ai_provider": result.provider
         }
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow optimization failed: {str(e)}")
 
 @router.post("/fill-parameters")
-async def fill_workflow_parameters(request: ParameterFillRequest, db: Session = Depends(get_db)):
+async def fill_workflow_parameters(
+    request: ParameterFillRequest,
+    n8n_service: N8NService = Depends(get_n8n_service),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     Intelligently fill workflow parameters using AI
     """
     try:
-        ai_service = AIService()
-        n8n_service = N8NService()
-        
         # Get workflow details
         workflow = await n8n_service.get_workflow(request.workflow_id)
         
@@ -250,8 +370,7 @@ async def fill_workflow_parameters(request: ParameterFillRequest, db: Session =
             action_taken="parameters_filled",
             created_at=datetime.utcnow()
         )
-        db.add(conversation)
-        db.commit()
+        await write_behind.add(conversation)
         
         return {
             "workflow_id": request.workflow_id,
@@ -259,46 +378,127 @@ async def fill_workflow_parameters(request: ParameterFillRequest, db: Session =
             "context_used": request.context_data,
             "ai_provider": request.ai_provider.value
         }
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Parameter filling failed: {str(e)}")
 
+def history_query(session_id: str, columns: List[str], after: Optional[Tuple[datetime, str]] = None):
+    """Keyset query over (session_id, created_at, id), served by the composite index"""
+    query = select(*[getattr(AIConversation, column) for column in columns]).where(
+        AIConversation.session_id == session_id
+    )
+    if after is not None:
+        created_at, conversation_id = after
+        query = query.where(or_(
+            AIConversation.created_at > created_at,
+            and_(AIConversation.created_at == created_at, AIConversation.id > conversation_id)
+        ))
+    return query.order_by(AIConversation.created_at, AIConversation.id)
+
+def turn_key(turn: Dict[str, Any]) -> Tuple[datetime, str]:
+    return turn["created_at"], turn["id"]
+
+def history_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a conversation history cursor into its (created_at, id) key"""
+    values = decode_cursor(cursor)
+    try:
+        created_at, conversation_id = values
+        return datetime.fromisoformat(created_at), str(conversation_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def pending_turns(session_id: str, columns: List[str], after: Optional[Tuple[datetime, str]] = None) -> List[Dict[str, Any]]:
+    """Turns still waiting in the write-behind buffer, so callers read their own writes"""
+    turns = [
+        {column: getattr(conv, column) for column in columns}
+        for conv in write_behind.pending(AIConversation, session_id=session_id)
+    ]
+    return sorted((turn for turn in turns if after is None or turn_key(turn) > after), key=turn_key)
+
 @router.get("/conversation-history/{session_id}")
-async def get_conversation_history(session_id: str, db: Session = Depends(get_db)):
+async def get_conversation_history(
+    session_id: str,
+    http_response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get conversation history for a session
+    Get one page of conversation history for a session; the next page's cursor is in X-Next-Cursor
     """
     try:
-        conversations = db.query(AIConversation).filter(
-            AIConversation.session_id == session_id
-        ).order_by(AIConversation.created_at).all()
-        
-        return [
-            {
-                "id": conv.id,
-                "user_message": conv.user_message,
-                "ai_response": conv.ai_response,
-                "ai_provider": conv.ai_provider,
-                "workflow_id": conv.workflow_id,
-                "action_taken": conv.action_taken,
-                "created_at": conv.created_at
-            }
-            for conv in conversations
-        ]
+        columns = parse_fields(fields, HISTORY_FIELDS, ["id", "created_at"])
+        after = history_cursor(cursor) if cursor else None
+        
+        result = await db.execute(history_query(session_id, columns, after).limit(limit + 1))
+        turns = [dict(row._mapping) for row in result]
+        
+        if len(turns) <= limit:
+            # Stored history is exhausted, continue with turns not flushed yet
+            stored_ids = {turn["id"] for turn in turns}
+            turns += [turn for turn in pending_turns(session_id, columns, after) if turn["id"] not in stored_ids]
+            turns.sort(key=turn_key)
+        
+        if len(turns) > limit:
+            turns = turns[:limit]
+            created_at, conversation_id = turn_key(turns[-1])
+            http_response.headers[NEXT_CURSOR_HEADER] = encode_cursor([created_at.isoformat(), conversation_id])
+        
+        return turns
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get conversation history: {str(e)}")
 
-@router.post("/explain-workflow/{workflow_id}")
-async def explain_workflow(workflow_id: str, ai_provider: AIProvider = AIProvider.LLAMA):
+@router.get("/conversation-history/{session_id}/export")
+async def export_conversation_history(
+    session_id: str,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stream a session's full conversation history as one JSON array
+    """
+    columns = parse_fields(fields, HISTORY_FIELDS, ["id", "created_at"])
+    
+    async def export():
+        yield "["
+        last_key = None
+        result = await db.stream(history_query(session_id, columns).execution_options(yield_per=500))
+        async for row in result:
+            turn = dict(row._mapping)
+            yield ("," if last_key else "") + json.dumps(turn, default=str)
+            last_key = turn_key(turn)
+        for turn in pending_turns(session_id, columns, last_key):
+            yield ("," if last_key else "") + json.dumps(turn, default=str)
+            last_key = turn_key(turn)
+        yield "]"
+    
+    return StreamingResponse(
+        export(),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{session_id}.json"'}
+    )
+
+@router.post("/explain-workflow/{workflow_id}", dependencies=[Depends(n8n_request_memo)])
+async def explain_workflow(
+    workflow_id: str,
+    http_response: Response,
+    ai_provider: AIProvider = AIProvider.LLAMA,
+    n8n_service: N8NService = Depends(get_n8n_service),
+    ai_service: AIService = Depends(get_ai_service)
+):
     """
     Get AI explanation of a workflow
     """
     try:
-        ai_service = AIService()
-        n8n_service = N8NService()
-        
-        # Get workflow and analysis
-        workflow = await n8n_service.get_workflow(workflow_id)
-        analysis = await n8n_service.analyze_workflow_for_ai(workflow_id)
+        # Get workflow and analysis; the analysis shares the workflow fetch through the request memo
+        workflow, analysis = await asyncio.gather(
+            n8n_service.get_workflow(workflow_id),
+            n8n_service.analyze_workflow_for_ai(workflow_id)
+        )
         
         # Create explanation prompt
         explanation_prompt = f"""
@@ -319,19 +519,25 @@ async def explain_workflow(workflow_id: str, ai_provider: AIProvider = AIProvide
         """
         
         # Get AI explanation
-        explanation = await ai_service.chat(
+        result = await ai_service.complete(
             message=explanation_prompt,
             provider=ai_provider,
-            context=f"Explaining workflow {workflow_id}"
+            context=f"Explaining workflow {workflow_id}",
+            cache_ttl=settings.AI_CACHE_TTL_EXPLAIN,
+            cache_extra=workflow.get("updatedAt")
         )
+        set_cache_header(http_response, result.cache_hit)
+        explanation = result.text
         
         return {
             "workflow_id": workflow_id,
             "workflow_name": workflow['name'],
             "explanation": explanation,
             "analysis": analysis,
-            "ai_provider": ai_provider.value
+            "ai_provider": result.provider
         }
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow explanation failed: {str(e)}")
 
@@ -341,14 +547,69 @@ async def get_ai_providers_status():
     Get status of all AI providers
     """
     try:
-        ai_service = AIService()
-        providers = await ai_service.check_all_providers()
+        providers = await provider_health.get_statuses()
         
         return {
             "providers": providers,
             "available_count": sum(1 for available in providers.values() if available),
             "total_count": len(providers),
-            "recommended": "llama" if providers.get("llama") else next((k for k, v in providers.items() if v), None)
+            "recommended": "llama" if providers.get("llama") else next((k for k, v in providers.items() if v), None),
+            "age_seconds": provider_health.snapshot()["age_seconds"],
+            "routing": provider_router.routing_table(providers)
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get provider status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get provider status: {str(e)}")
+
+@router.post("/jobs/generate-workflow", response_model=JobResponse, status_code=202)
+async def submit_generate_workflow_job(request: WorkflowGenerateRequest, current_user: User = Depends(check_ai_quota)):
+    """
+    Queue workflow generation and creation in N8N as a background job
+    """
+    try:
+        return await job_manager.submit(
+            "generate_workflow", request.ai_provider, request.model_dump(mode="json"), user_id=current_user.id
+        )
+    except Exception as e:
+        refund_ai_quota(current_user)
+        raise HTTPException(status_code=500, detail=f"Job submission failed: {str(e)}")
+
+@router.post("/jobs/optimize-workflow", response_model=JobResponse, status_code=202)
+async def submit_optimize_workflow_job(request: WorkflowOptimizeRequest, current_user: User = Depends(check_ai_quota)):
+    """
+    Queue workflow optimization as a background job
+    """
+    try:
+        return await job_manager.submit(
+            "optimize_workflow", request.ai_provider, request.model_dump(mode="json"), user_id=current_user.id
+        )
+    except Exception as e:
+        refund_ai_quota(current_user)
+        raise HTTPException(status_code=500, detail=f"Job submission failed: {str(e)}")
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Poll the state of one of your background jobs
+    """
+    job = await job_manager.get(job_id, user_id=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Subscribe to one of your background job's state changes as Server-Sent Events
+    """
+    if await job_manager.get(job_id, user_id=current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        async for job in job_manager.watch(job_id):
+            yield sse_event("job", job.model_dump(mode="json"))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -6,22 +6,22 @@ JWT-based authentication endpoints
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, User
+from database import get_async_db, User
 from auth import (
-    authenticate_user, create_user, create_access_token,
-    get_current_active_user, UserCreate, UserLogin, UserResponse, Token,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user_async, create_user_async, create_access_token,
+    get_current_active_user, quota_manager, UserCreate, UserLogin, UserResponse, Token,
+    ACCESS_TOKEN_EXPIRE_MINUTES, user_cache
 )
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     try:
-        user = create_user(db, user_data)
+        user = await create_user_async(db, user_data)
         return UserResponse.from_orm(user)
     except HTTPException:
         raise
@@ -32,9 +32,9 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login with email and password."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,9 +57,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     )
 
 @router.post("/login-json", response_model=Token)
-async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login_json(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login with JSON payload."""
-    user = authenticate_user(db, user_data.email, user_data.password)
+    user = await authenticate_user_async(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -89,30 +89,35 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
 async def update_current_user(
     user_update: dict,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user information."""
     # Only allow updating certain fields
     allowed_fields = ["full_name"]
     
+    # current_user may be a cached snapshot, so edit the row loaded in this session
+    user = await db.get(User, current_user.id)
     for field, value in user_update.items():
         if field in allowed_fields:
-            setattr(current_user, field, value)
+            setattr(user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(user)
+    user_cache.invalidate(user.id)
     
-    return UserResponse.from_orm(current_user)
+    return UserResponse.from_orm(user)
 
 @router.get("/subscription")
 async def get_subscription_info(current_user: User = Depends(get_current_active_user)):
     """Get user subscription information."""
+    # Includes usage not yet written to the users table
+    used, limit = quota_manager.usage(current_user)
     return {
         "tier": current_user.subscription_tier,
         "expires": current_user.subscription_expires,
-        "api_quota_used": current_user.api_quota_used,
-        "api_quota_limit": current_user.api_quota_limit,
-        "quota_percentage": (current_user.api_quota_used / current_user.api_quota_limit) * 100
+        "api_quota_used": used,
+        "api_quota_limit": limit,
+        "quota_percentage": (used / limit) * 100
     }
 
 @router.post("/refresh-token", response_model=Token)
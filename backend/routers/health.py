@@ -2,28 +2,28 @@
 Health check endpoints for N8N-Sensei
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from models import HealthResponse
-from services.n8n_service import N8NService
-from services.ai_service import AIService
+from services.n8n_service import N8NService, get_n8n_service
+from services.provider_health import provider_health
+from services.metrics import metrics
+from database import database_profile
 from config import settings
 import asyncio
 
 router = APIRouter()
 
 @router.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Comprehensive health check for all N8N-Sensei components
     """
     try:
         # Check N8N connection
-        n8n_service = N8NService()
         n8n_connected = await n8n_service.check_connection()
         
-        # Check AI providers
-        ai_service = AIService()
-        ai_providers = await ai_service.check_all_providers()
+        # AI providers come from the cached status table
+        ai_providers = await provider_health.get_statuses()
         
         # Check database (simple check)
         database_connected = True  # Will be enhanced with actual DB check
@@ -33,16 +33,16 @@ async def health_check():
             version="1.0.0",
             n8n_connected=n8n_connected,
             ai_providers=ai_providers,
-            database_connected=database_connected
+            database_connected=database_connected,
+            database_settings=dict(database_profile)
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
 
 @router.get("/health/n8n")
-async def n8n_health():
+async def n8n_health(n8n_service: N8NService = Depends(get_n8n_service)):
     """Check N8N specific health"""
     try:
-        n8n_service = N8NService()
         connected = await n8n_service.check_connection()
         workflows_count = await n8n_service.get_workflows_count()
         
@@ -59,13 +59,19 @@ async def n8n_health():
 async def ai_health():
     """Check AI providers health"""
     try:
-        ai_service = AIService()
-        providers = await ai_service.check_all_providers()
+        providers = await provider_health.get_statuses()
         
         return {
             "providers": providers,
             "default_provider": "llama",
-            "total_available": sum(1 for available in providers.values() if available)
+            "total_available": sum(1 for available in providers.values() if available),
+            "age_seconds": provider_health.snapshot()["age_seconds"]
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"AI health check failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"AI health check failed: {str(e)}")
+
+
+@router.get("/health/metrics")
+async def service_metrics():
+    """Process-local counters and gauges"""
+    return metrics.snapshot()
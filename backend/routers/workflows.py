@@ -2,62 +2,114 @@
 Workflow management endpoints for N8N-Sensei
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 from models import WorkflowResponse, ExecutionResponse, WorkflowStatus
-from services.n8n_service import N8NService
+from services.n8n_service import N8NService, get_n8n_service
 from database import get_db
+from config import settings
+from pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_fields
+from http_cache import ETagCache, content_etag, etag_matches, cache_headers, not_modified
 
 router = APIRouter()
 
-@router.get("/", response_model=List[WorkflowResponse])
+WORKFLOW_FIELDS = ["id", "name", "description", "status", "nodes", "connections", "created_at", "updated_at"]
+
+# N8N attributes each response field is built from, so list views can ask N8N for less
+N8N_WORKFLOW_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "description": "meta",
+    "status": "active",
+    "nodes": "nodes",
+    "connections": "connections",
+    "created_at": "createdAt",
+    "updated_at": "updatedAt",
+}
+
+# ETags by workflow id and (updatedAt, active), so polling an unchanged workflow skips serialization
+workflow_etags = ETagCache()
+
+def workflow_offset(cursor: str) -> int:
+    """Decode a workflow list cursor into its offset"""
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values[0]
+
+@router.get("/", response_model=List[Dict[str, Any]])
 async def get_workflows(
+    http_response: Response,
     active_only: bool = Query(False, description="Filter only active workflows"),
-    category: Optional[str] = Query(None, description="Filter by category"),
-    limit: int = Query(50, description="Maximum number of workflows to return")
+    category: Optional[str] = Query(None, description="Filter by category (workflow tag)"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of workflows to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,status"),
+    n8n_service: N8NService = Depends(get_n8n_service)
 ):
     """
-    Get all workflows from N8N with optional filtering
+    Get one page of workflows from N8N with optional filtering; the next page's cursor is in X-Next-Cursor
     """
     try:
-        n8n_service = N8NService()
-        workflows = await n8n_service.get_workflows()
+        selected = parse_fields(fields, WORKFLOW_FIELDS, ["id"])
+        offset = workflow_offset(cursor) if cursor else 0
         
-        # Apply filters
-        if active_only:
-            workflows = [w for w in workflows if w.get("active", False)]
+        select = None
+        if fields:
+            # Small attributes the response model and the tag filter always need
+            select = sorted(
+                {N8N_WORKFLOW_FIELDS[field] for field in selected} | {"id", "name", "active", "tags", "createdAt", "updatedAt"}
+            )
+        
+        workflows, next_offset = await n8n_service.list_workflows(
+            active=True if active_only else None,
+            tag=category,
+            select=select,
+            limit=limit,
+            offset=offset
+        )
+        if next_offset is not None:
+            http_response.headers[NEXT_CURSOR_HEADER] = encode_cursor([next_offset])
         
         # Convert to response format
         workflow_responses = []
-        for workflow in workflows[:limit]:
+        for workflow in workflows:
             workflow_response = WorkflowResponse(
                 id=workflow["id"],
                 name=workflow["name"],
-                description=workflow.get("meta", {}).get("description", ""),
+                description=(workflow.get("meta") or {}).get("description", ""),
                 status=WorkflowStatus.ACTIVE if workflow.get("active") else WorkflowStatus.INACTIVE,
-                nodes=workflow.get("nodes", []),
-                connections=workflow.get("connections", {}),
+                nodes=workflow.get("nodes", []) if "nodes" in selected else [],
+                connections=workflow.get("connections", {}) if "connections" in selected else {},
                 created_at=workflow.get("createdAt"),
                 updated_at=workflow.get("updatedAt")
             )
-            workflow_responses.append(workflow_response)
+            workflow_responses.append(workflow_response.model_dump(include=set(selected)))
         
         return workflow_responses
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get workflows: {str(e)}")
 
 @router.get("/{workflow_id}", response_model=WorkflowResponse)
-async def get_workflow(workflow_id: str):
+async def get_workflow(workflow_id: str, request: Request, n8n_service: N8NService = Depends(get_n8n_service)):
     """
-    Get specific workflow by ID
+    Get specific workflow by ID; answers 304 when If-None-Match still matches
     """
     try:
-        n8n_service = N8NService()
         workflow = await n8n_service.get_workflow(workflow_id)
         
-        return WorkflowResponse(
+        version = (workflow.get("updatedAt"), workflow.get("active")) if workflow.get("updatedAt") else None
+        etag = workflow_etags.get(workflow_id, version) if version else None
+        if etag and etag_matches(request, etag):
+            return not_modified(etag, settings.WORKFLOW_HTTP_MAX_AGE)
+        
+        workflow_response = WorkflowResponse(
             id=workflow["id"],
             name=workflow["name"],
             description=workflow.get("meta", {}).get("description", ""),
@@ -67,17 +119,23 @@ async def get_workflow(workflow_id: str):
             created_at=workflow.get("createdAt"),
             updated_at=workflow.get("updatedAt")
         )
+        response = JSONResponse(jsonable_encoder(workflow_response))
+        etag = content_etag(response.body, workflow.get("updatedAt"))
+        if version:
+            workflow_etags.put(workflow_id, version, etag)
+        if etag_matches(request, etag):
+            return not_modified(etag, settings.WORKFLOW_HTTP_MAX_AGE)
+        response.headers.update(cache_headers(etag, settings.WORKFLOW_HTTP_MAX_AGE))
+        return response
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Workflow not found: {str(e)}")
 
 @router.post("/", response_model=WorkflowResponse)
-async def create_workflow(workflow_data: Dict[str, Any]):
+async def create_workflow(workflow_data: Dict[str, Any], n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Create new workflow in N8N
     """
     try:
-        n8n_service = N8NService()
-        
         # Validate workflow
         validation = await n8n_service.validate_workflow(workflow_data)
         if not validation["valid"]:
@@ -100,13 +158,15 @@ async def create_workflow(workflow_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Failed to create workflow: {str(e)}")
 
 @router.put("/{workflow_id}", response_model=WorkflowResponse)
-async def update_workflow(workflow_id: str, workflow_data: Dict[str, Any]):
+async def update_workflow(
+    workflow_id: str,
+    workflow_data: Dict[str, Any],
+    n8n_service: N8NService = Depends(get_n8n_service)
+):
     """
     Update existing workflow
     """
     try:
-        n8n_service = N8NService()
-        
         # Validate workflow
         validation = await n8n_service.validate_workflow(workflow_data)
         if not validation["valid"]:
@@ -129,12 +189,11 @@ async def update_workflow(workflow_id: str, workflow_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Failed to update workflow: {str(e)}")
 
 @router.delete("/{workflow_id}")
-async def delete_workflow(workflow_id: str):
+async def delete_workflow(workflow_id: str, n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Delete workflow
     """
     try:
-        n8n_service = N8NService()
         success = await n8n_service.delete_workflow(workflow_id)
         
         if success:
@@ -145,12 +204,15 @@ async def delete_workflow(workflow_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete workflow: {str(e)}")
 
 @router.post("/{workflow_id}/execute", response_model=ExecutionResponse)
-async def execute_workflow(workflow_id: str, input_data: Optional[Dict[str, Any]] = None):
+async def execute_workflow(
+    workflow_id: str,
+    input_data: Optional[Dict[str, Any]] = None,
+    n8n_service: N8NService = Depends(get_n8n_service)
+):
     """
     Execute workflow manually
     """
     try:
-        n8n_service = N8NService()
         execution = await n8n_service.execute_workflow(workflow_id, input_data)
         
         return ExecutionResponse(
@@ -166,12 +228,11 @@ async def execute_workflow(workflow_id: str, input_data: Optional[Dict[str, Any]
         raise HTTPException(status_code=500, detail=f"Failed to execute workflow: {str(e)}")
 
 @router.post("/{workflow_id}/activate")
-async def activate_workflow(workflow_id: str):
+async def activate_workflow(workflow_id: str, n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Activate workflow
     """
     try:
-        n8n_service = N8NService()
         success = await n8n_service.activate_workflow(workflow_id)
         
         if success:
@@ -182,12 +243,11 @@ async def activate_workflow(workflow_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to activate workflow: {str(e)}")
 
 @router.post("/{workflow_id}/deactivate")
-async def deactivate_workflow(workflow_id: str):
+async def deactivate_workflow(workflow_id: str, n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Deactivate workflow
     """
     try:
-        n8n_service = N8NService()
         success = await n8n_service.deactivate_workflow(workflow_id)
         
         if success:
@@ -200,13 +260,13 @@ async def deactivate_workflow(workflow_id: str):
 @router.get("/{workflow_id}/executions", response_model=List[ExecutionResponse])
 async def get_workflow_executions(
     workflow_id: str,
-    limit: int = Query(20, description="Maximum number of executions to return")
+    limit: int = Query(20, description="Maximum number of executions to return"),
+    n8n_service: N8NService = Depends(get_n8n_service)
 ):
     """
     Get workflow execution history
     """
     try:
-        n8n_service = N8NService()
         executions = await n8n_service.get_executions(workflow_id, limit)
         
         execution_responses = []
@@ -227,24 +287,32 @@ async def get_workflow_executions(
         raise HTTPException(status_code=500, detail=f"Failed to get executions: {str(e)}")
 
 @router.get("/{workflow_id}/statistics")
-async def get_workflow_statistics(workflow_id: str):
+async def get_workflow_statistics(
+    workflow_id: str,
+    request: Request,
+    window_days: int = Query(7, ge=1, le=365, description="Days covered by the windowed statistics"),
+    n8n_service: N8NService = Depends(get_n8n_service)
+):
     """
-    Get workflow performance statistics
+    Get all-time and windowed workflow performance statistics; answers 304 when If-None-Match still matches
     """
     try:
-        n8n_service = N8NService()
-        stats = await n8n_service.get_workflow_statistics(workflow_id)
-        return stats
+        stats = await n8n_service.get_workflow_statistics(workflow_id, window_days)
+        response = JSONResponse(stats)
+        etag = content_etag(response.body)
+        if etag_matches(request, etag):
+            return not_modified(etag, settings.STATISTICS_HTTP_MAX_AGE)
+        response.headers.update(cache_headers(etag, settings.STATISTICS_HTTP_MAX_AGE))
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
 
 @router.get("/{workflow_id}/analyze")
-async def analyze_workflow(workflow_id: str):
+async def analyze_workflow(workflow_id: str, n8n_service: N8NService = Depends(get_n8n_service)):
     """
     Analyze workflow for AI processing
     """
     try:
-        n8n_service = N8NService()
         analysis = await n8n_service.analyze_workflow_for_ai(workflow_id)
         return analysis
     except Exception as e:
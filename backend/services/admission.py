@@ -0,0 +1,118 @@
+"""
+Admission Control for N8N-Sensei - Per-provider in-flight limits with a bounded wait queue
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, AsyncIterator
+from config import settings
+from models import AIProvider
+from services.metrics import metrics
+from services.provider_router import provider_router
+
+class AdmissionRejected(Exception):
+    """Raised when a provider's wait queue is full or the wait deadline passes"""
+
+    def __init__(self, provider: str, reason: str, retry_after: int):
+        super().__init__(f"{provider} is overloaded: {reason}")
+        self.provider = provider
+        self.retry_after = retry_after
+
+class ProviderAdmission:
+    """Admits up to max_in_flight calls to one provider and queues a bounded number more"""
+
+    def __init__(self, provider: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_wait_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued call would be admitted"""
+        stats = provider_router.stats.get(AIProvider(self.provider))
+        latency_ms = stats.ewma_latency_ms if stats and stats.ewma_latency_ms else settings.AI_ROUTER_DEFAULT_LATENCY_MS
+        return max(1, math.ceil(latency_ms / 1000 * (self.waiting + 1) / self.max_in_flight))
+
+    def _publish(self):
+        metrics.set_gauge(f"ai_admission_in_flight.{self.provider}", self.in_flight)
+        metrics.set_gauge(f"ai_admission_queue_depth.{self.provider}", self.waiting)
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.inc(f"ai_admission_rejected_total.{self.provider}")
+        return AdmissionRejected(self.provider, reason, self.retry_after())
+
+    async def acquire(self):
+        """Take an in-flight slot, waiting in the bounded queue if necessary"""
+        if self.slots.locked() and self.waiting >= self.max_queue:
+            raise self._reject("wait queue is full")
+
+        started = time.monotonic()
+        self.waiting += 1
+        self._publish()
+        # wait_for can drop a permit its inner acquire got just as the wait timed out or was
+        # cancelled; the semaphore hands back a permit it is cancelled out of, and one that
+        # was granted but not kept is released here
+        acquired = False
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self.slots.acquire()
+                acquired = True
+        except BaseException as e:
+            if acquired:
+                self.slots.release()
+            if isinstance(e, TimeoutError):
+                raise self._reject(f"no slot within {self.queue_timeout:.0f}s")
+            raise
+        finally:
+            self.waiting -= 1
+            self._publish()
+
+        waited = time.monotonic() - started
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.in_flight += 1
+        metrics.inc(f"ai_admission_admitted_total.{self.provider}")
+        metrics.inc(f"ai_admission_wait_seconds_total.{self.provider}", waited)
+        metrics.set_gauge(f"ai_admission_max_wait_seconds.{self.provider}", round(self.max_wait_seconds, 3))
+        self._publish()
+
+    def release(self):
+        self.in_flight -= 1
+        self.slots.release()
+        self._publish()
+
+class AdmissionController:
+    """Admission state for every provider, created lazily from settings"""
+
+    def __init__(self):
+        self.providers: Dict[str, ProviderAdmission] = {}
+
+    def for_provider(self, provider: str) -> ProviderAdmission:
+        if provider not in self.providers:
+            self.providers[provider] = ProviderAdmission(
+                provider,
+                max_in_flight=settings.AI_ADMISSION_MAX_IN_FLIGHT.get(
+                    provider, settings.AI_ADMISSION_DEFAULT_MAX_IN_FLIGHT
+                ),
+                max_queue=settings.AI_ADMISSION_MAX_QUEUE,
+                queue_timeout=settings.AI_ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+        return self.providers[provider]
+
+    @asynccontextmanager
+    async def slot(self, provider: str) -> AsyncIterator[None]:
+        """Hold one in-flight slot for a provider call"""
+        admission = self.for_provider(provider)
+        await admission.acquire()
+        try:
+            yield
+        finally:
+            admission.release()
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,100 @@
+"""
+AI Client Registry for N8N-Sensei - Process-wide pooled clients for every AI provider
+"""
+
+import httpx
+import openai
+import anthropic
+from typing import Dict, Optional
+from config import settings
+from models import AIProvider
+
+# Providers we talk to over plain HTTP, keyed to their base URL
+HTTP_PROVIDERS = {
+    AIProvider.LLAMA: lambda: settings.llama_base_url,
+    AIProvider.OLLAMA: lambda: settings.ollama_base_url,
+    AIProvider.LM_STUDIO: lambda: settings.lm_studio_base_url,
+    AIProvider.OPENROUTER: lambda: settings.OPENROUTER_BASE_URL,
+}
+
+def provider_limits(provider: AIProvider) -> httpx.Limits:
+    """Connection pool limits for a provider, honouring per-provider overrides"""
+    max_connections = settings.AI_PROVIDER_POOL_LIMITS.get(provider.value, settings.AI_POOL_MAX_CONNECTIONS)
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_connections, settings.AI_POOL_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=settings.AI_POOL_KEEPALIVE_EXPIRY
+    )
+
+class AIClientRegistry:
+    """Holds one pooled client per AI provider for the lifetime of the process"""
+
+    def __init__(self):
+        self.http_clients: Dict[AIProvider, httpx.AsyncClient] = {}
+        self.openai_client: Optional[openai.AsyncOpenAI] = None
+        self.anthropic_client: Optional[anthropic.AsyncAnthropic] = None
+
+        for provider, base_url in HTTP_PROVIDERS.items():
+            headers = {}
+            if provider == AIProvider.OPENROUTER and settings.OPENROUTER_API_KEY:
+                headers["Authorization"] = f"Bearer {settings.OPENROUTER_API_KEY}"
+            self.http_clients[provider] = httpx.AsyncClient(
+                base_url=base_url(),
+                headers=headers,
+                timeout=settings.AI_HTTP_TIMEOUT,
+                limits=provider_limits(provider)
+            )
+
+        # Initialize SDK clients if API keys are available
+        if settings.OPENAI_API_KEY:
+            self.openai_client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=httpx.AsyncClient(
+                    timeout=settings.AI_HTTP_TIMEOUT,
+                    limits=provider_limits(AIProvider.OPENAI)
+                )
+            )
+
+        if settings.ANTHROPIC_API_KEY:
+            self.anthropic_client = anthropic.AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                http_client=httpx.AsyncClient(
+                    timeout=settings.AI_HTTP_TIMEOUT,
+                    limits=provider_limits(AIProvider.ANTHROPIC)
+                )
+            )
+
+    def http(self, provider: AIProvider) -> httpx.AsyncClient:
+        """Get the pooled HTTP client for an HTTP-based provider"""
+        return self.http_clients[provider]
+
+    async def close(self):
+        """Close every pooled client"""
+        for client in self.http_clients.values():
+            await client.aclose()
+        if self.openai_client:
+            await self.openai_client.close()
+        if self.anthropic_client:
+            await self.anthropic_client.close()
+
+
+# Shared registry, created in the lifespan hook
+_registry: Optional[AIClientRegistry] = None
+
+async def init_ai_clients() -> AIClientRegistry:
+    """Build the shared AI client registry"""
+    return get_ai_clients()
+
+async def close_ai_clients():
+    """Close the shared AI client registry at shutdown"""
+    global _registry
+    if _registry is not None:
+        await _registry.close()
+        _registry = None
+
+def get_ai_clients() -> AIClientRegistry:
+    """Get the shared AI client registry, building it on first use"""
+    global _registry
+    if _registry is None:
+        _registry = AIClientRegistry()
+    return _registry
@@ -2,57 +2,73 @@
 AI Service for N8N-Sensei - Handles all AI provider integrations
 """
 
+import asyncio
 import httpx
 import json
-from typing import Dict, Any, Optional, List
+import time
+from typing import Dict, Any, Optional, List, AsyncIterator, Awaitable, Callable, Tuple
 from config import settings
-from models import AIProvider, AIMessage
-import openai
-import anthropic
+from models import AIProvider, AIMessage, ChatResult
+from services.ai_clients import AIClientRegistry, get_ai_clients
+from services.response_cache import response_cache, cache_key
+from services.semantic_cache import semantic_cache
+from services.provider_router import provider_router
+from services.provider_health import provider_health
+from services.metrics import metrics
+from services.admission import admission_controller, AdmissionRejected
 from datetime import datetime
 
+TEMPERATURE = 0.7
+
+# Local backends that can answer for each other when hedging is enabled
+HEDGE_PARTNERS = {
+    AIProvider.OLLAMA: AIProvider.LM_STUDIO,
+    AIProvider.LM_STUDIO: AIProvider.OLLAMA,
+}
+
 class AIService:
-    def __init__(self):
-        self.openai_client = None
-        self.anthropic_client = None
-        
-        # Initialize clients if API keys are available
-        if settings.OPENAI_API_KEY:
-            self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        if settings.ANTHROPIC_API_KEY:
-            self.anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+    def __init__(self, clients: Optional[AIClientRegistry] = None):
+        self.clients = clients or get_ai_clients()
+        self.openai_client = self.clients.openai_client
+        self.anthropic_client = self.clients.anthropic_client
     
-    async def check_all_providers(self) -> Dict[str, bool]:
-        """Check availability of all AI providers"""
-        providers = {}
+    async def check_all_providers(self, deadline: Optional[float] = None) -> Dict[str, bool]:
+        """Probe all AI providers concurrently, giving up on any still pending at the deadline"""
+        probes = {
+            # Local AI providers
+            "llama": self._check_local_ai(AIProvider.LLAMA),
+            "lm_studio": self._check_local_ai(AIProvider.LM_STUDIO),
+            "ollama": self._check_local_ai(AIProvider.OLLAMA),
+            # Cloud providers
+            "openai": self._check_openai(),
+            "anthropic": self._check_anthropic(),
+            "openrouter": self._check_openrouter(),
+        }
+        tasks = {name: asyncio.create_task(probe) for name, probe in probes.items()}
         
-        # Check local AI providers
-        providers["llama"] = await self._check_local_ai(settings.llama_base_url, "llama")
-        providers["lm_studio"] = await self._check_local_ai(settings.lm_studio_base_url, "lm_studio")
-        providers["ollama"] = await self._check_local_ai(settings.ollama_base_url, "ollama")
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline or settings.AI_HEALTH_DEADLINE)
+        for task in pending:
+            task.cancel()
         
-        # Check cloud providers
-        providers["openai"] = await self._check_openai()
-        providers["anthropic"] = await self._check_anthropic()
-        providers["openrouter"] = await self._check_openrouter()
-        
-        return providers
+        return {
+            name: task in done and not task.cancelled() and task.exception() is None and task.result()
+            for name, task in tasks.items()
+        }
     
-    async def _check_local_ai(self, base_url: str, provider_type: str) -> bool:
+    async def _check_local_ai(self, provider: AIProvider) -> bool:
         """Check if local AI provider is available"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                if provider_type == "lm_studio":
-                    # LM Studio uses OpenAI-compatible API
-                    response = await client.get(f"{base_url}/v1/models")
-                elif provider_type in ["llama", "ollama"]:
-                    # Ollama/LLama API
-                    response = await client.get(f"{base_url}/api/tags")
-                else:
-                    response = await client.get(f"{base_url}/health")
-                
-                return response.status_code == 200
+            client = self.clients.http(provider)
+            if provider == AIProvider.LM_STUDIO:
+                # LM Studio uses OpenAI-compatible API
+                response = await client.get("/v1/models", timeout=settings.AI_HEALTH_PROBE_TIMEOUT)
+            elif provider in [AIProvider.LLAMA, AIProvider.OLLAMA]:
+                # Ollama/LLama API
+                response = await client.get("/api/tags", timeout=settings.AI_HEALTH_PROBE_TIMEOUT)
+            else:
+                response = await client.get("/health", timeout=settings.AI_HEALTH_PROBE_TIMEOUT)
+            
+            return response.status_code == 200
         except Exception:
             return False
     
@@ -61,23 +77,24 @@ class AIService:
         if not self.openai_client:
             return False
         try:
-            models = await self.openai_client.models.list()
+            client = self.openai_client.with_options(timeout=settings.AI_HEALTH_PROBE_TIMEOUT)
+            models = await client.models.list()
             return len(models.data) > 0
         except Exception:
             return False
     
     async def _check_anthropic(self) -> bool:
-        """Check Anthropic API availability"""
+        """Check Anthropic API availability without a billable request"""
         if not self.anthropic_client:
             return False
         try:
-            # Simple test message
-            response = await self.anthropic_client.messages.create(
-                model=settings.ANTHROPIC_MODEL,
-                max_tokens=10,
-                messages=[{"role": "user", "content": "test"}]
+            # Listing models is free, unlike sending a test message
+            response = await self.anthropic_client.get(
+                "/v1/models",
+                cast_to=httpx.Response,
+                options={"timeout": settings.AI_HEALTH_PROBE_TIMEOUT}
             )
-            return bool(response)
+            return response.status_code == 200
         except Exception:
             return False
     
@@ -86,19 +103,15 @@ class AIService:
         if not settings.OPENROUTER_API_KEY:
             return False
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://openrouter.ai/api/v1/models",
-                    headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"}
-                )
-                return response.status_code == 200
+            response = await self.clients.http(AIProvider.OPENROUTER).get(
+                "/models", timeout=settings.AI_HEALTH_PROBE_TIMEOUT
+            )
+            return response.status_code == 200
         except Exception:
             return False
     
-    async def chat(self, message: str, provider: AIProvider, context: Optional[str] = None) -> str:
-        """Send chat message to specified AI provider"""
-        
-        # Prepare system prompt for N8N workflow context
+    def _build_system_prompt(self, context: Optional[str] = None) -> str:
+        """Prepare system prompt for N8N workflow context"""
         system_prompt = """You are N8N-Sensei, an AI assistant specialized in N8N workflow automation. 
         You help users create, modify, and optimize N8N workflows. You can:
         1. Generate new workflows from descriptions
@@ -112,127 +125,562 @@ class AIService:
         if context:
             system_prompt += f"\n\nCurrent context: {context}"
         
+        return system_prompt
+    
+    def _provider_model(self, provider: AIProvider) -> str:
+        """Model name configured for a provider"""
+        return {
+            AIProvider.OPENAI: settings.OPENAI_MODEL,
+            AIProvider.ANTHROPIC: settings.ANTHROPIC_MODEL,
+            AIProvider.OPENROUTER: settings.OPENROUTER_MODEL,
+            AIProvider.LLAMA: settings.LLAMA_MODEL,
+            AIProvider.OLLAMA: settings.OLLAMA_MODEL,
+            AIProvider.LM_STUDIO: settings.LM_STUDIO_MODEL,
+        }.get(provider, "")
+    
+    def _cache_keys(self, provider: AIProvider, system_prompt: str, message: str, cache_extra: Optional[Any]) -> Tuple[str, str]:
+        """Exact-match key and semantic scope of a prompt sent to a provider"""
+        model = self._provider_model(provider)
+        key = cache_key(provider.value, model, TEMPERATURE, system_prompt, message, cache_extra)
+        # Near-duplicates are only matched against prompts with the same provider, model and system prompt
+        scope = cache_key(provider.value, model, TEMPERATURE, system_prompt, "", cache_extra)
+        return key, scope
+    
+    async def chat(self, message: str, provider: AIProvider, context: Optional[str] = None) -> str:
+        """Send chat message to specified AI provider"""
+        result = await self.complete(message, provider, context)
+        return result.text
+    
+    async def complete(
+        self,
+        message: str,
+        provider: AIProvider,
+        context: Optional[str] = None,
+        cache_ttl: int = 0,
+        cache_extra: Optional[Any] = None,
+        semantic: bool = False,
+        history: Optional[List[AIMessage]] = None
+    ) -> ChatResult:
+        """Send chat message to specified AI provider, answering repeats from the response caches"""
+        if provider == AIProvider.AUTO:
+            return await self._complete_auto(message, context, cache_ttl, cache_extra, semantic, history)
+        
+        system_prompt = self._build_system_prompt(context)
+        model = self._provider_model(provider)
+        if history:
+            # The same message means something else after a different conversation
+            cache_extra = [cache_extra, [[turn.role, turn.content] for turn in history]]
+        key, scope = self._cache_keys(provider, system_prompt, message, cache_extra)
+        use_semantic = semantic and semantic_cache is not None and not history
+        
+        if cache_ttl > 0:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return ChatResult(text=cached, provider=provider.value, model=model, cache_hit=True)
+        
+        if use_semantic:
+            match = await semantic_cache.lookup(scope, message)
+            if match is not None:
+                text, similarity = match
+                return ChatResult(
+                    text=text, provider=provider.value, model=model, cache_hit=True, similarity=similarity
+                )
+        
         try:
-            if provider == AIProvider.OPENAI:
-                return await self._chat_openai(message, system_prompt)
-            elif provider == AIProvider.ANTHROPIC:
-                return await self._chat_anthropic(message, system_prompt)
-            elif provider == AIProvider.OPENROUTER:
-                return await self._chat_openrouter(message, system_prompt)
-            elif provider in [AIProvider.LLAMA, AIProvider.OLLAMA]:
-                return await self._chat_ollama(message, system_prompt, provider)
-            elif provider == AIProvider.LM_STUDIO:
-                return await self._chat_lm_studio(message, system_prompt)
-            else:
-                raise ValueError(f"Unsupported AI provider: {provider}")
+            answered_by, text = await self._hedged_dispatch(message, system_prompt, provider, history)
+        except AdmissionRejected:
+            # Overload is reported to the caller as such, not as a provider error
+            raise
         except Exception as e:
-            return f"Error communicating with {provider}: {str(e)}"
+            return ChatResult(
+                text=f"Error communicating with {provider}: {str(e)}",
+                provider=provider.value,
+                model=model,
+                error=True
+            )
+        
+        if answered_by != provider:
+            # A hedge partner's answer is cached as that provider's, so hits report who really answered
+            key, scope = self._cache_keys(answered_by, system_prompt, message, cache_extra)
+        await response_cache.set(key, text, cache_ttl)
+        if use_semantic:
+            await semantic_cache.store(scope, message, text, settings.AI_SEMANTIC_CACHE_TTL)
+        return ChatResult(text=text, provider=answered_by.value, model=self._provider_model(answered_by))
+    
+    async def _complete_auto(
+        self,
+        message: str,
+        context: Optional[str],
+        cache_ttl: int,
+        cache_extra: Optional[Any],
+        semantic: bool,
+        history: Optional[List[AIMessage]] = None
+    ) -> ChatResult:
+        """Try providers in routing order, failing over until one answers within the latency budget"""
+        deadline = time.monotonic() + settings.AI_ROUTER_LATENCY_BUDGET_SECONDS
+        candidates = provider_router.candidates(provider_health.statuses)
+        result = ChatResult(
+            text="Error communicating with auto: no AI provider available", provider=AIProvider.AUTO.value, model="", error=True
+        )
+        
+        rejected: Optional[AdmissionRejected] = None
+        for index, candidate in enumerate(candidates):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            is_last = index == len(candidates) - 1
+            timeout = remaining if is_last else min(remaining, settings.AI_ROUTER_ATTEMPT_TIMEOUT_SECONDS)
+            try:
+                result = await asyncio.wait_for(
+                    self.complete(message, candidate, context, cache_ttl, cache_extra, semantic, history),
+                    timeout=timeout
+                )
+            except AdmissionRejected as e:
+                rejected = e
+                continue
+            except asyncio.TimeoutError:
+                provider_router.record(candidate, timeout * 1000, ok=False)
+                result = ChatResult(
+                    text=f"Error communicating with {candidate}: timed out after {timeout:.1f}s",
+                    provider=candidate.value,
+                    model=self._provider_model(candidate),
+                    error=True
+                )
+                continue
+            if not result.error:
+                return result
+        
+        if rejected is not None and result.provider == AIProvider.AUTO.value:
+            # Every candidate was overloaded
+            raise rejected
+        return result
+    
+    async def _timed_dispatch(
+        self, message: str, system_prompt: str, provider: AIProvider, history: Optional[List[AIMessage]] = None
+    ) -> str:
+        """Dispatch a chat message under admission control and feed its latency and outcome to the provider router"""
+        async with admission_controller.slot(provider.value):
+            started = time.monotonic()
+            try:
+                text = await self._dispatch(message, system_prompt, provider, history)
+            except Exception:
+                provider_router.record(provider, (time.monotonic() - started) * 1000, ok=False)
+                raise
+            provider_router.record(provider, (time.monotonic() - started) * 1000, ok=True)
+            return text
     
-    async def _chat_openai(self, message: str, system_prompt: str) -> str:
+    def _hedge_partner(self, provider: AIProvider) -> Optional[AIProvider]:
+        """The backend to hedge a request to, if hedging applies to this provider"""
+        if not settings.AI_HEDGE_ENABLED:
+            return None
+        return HEDGE_PARTNERS.get(provider)
+    
+    async def _race_hedged(
+        self,
+        provider: AIProvider,
+        secondary: AIProvider,
+        delay: float,
+        attempt: Callable[[AIProvider], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Tuple[AIProvider, Any]:
+        """Run an attempt on the primary, add one on the secondary after the delay, keep the first success"""
+        metrics.inc("ai_hedge_eligible_total")
+        tasks = {asyncio.create_task(attempt(provider)): provider}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            metrics.inc("ai_hedge_fired_total")
+            tasks[asyncio.create_task(attempt(secondary))] = secondary
+        
+        pending = set(tasks)
+        winner: Optional[asyncio.Task] = None
+        error: Optional[BaseException] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        error = task.exception()
+        finally:
+            # Cancel the loser and release anything a late finisher produced
+            for task in pending:
+                task.cancel()
+            for task in tasks:
+                if task is not winner and task.done() and not task.cancelled() and task.exception() is None and discard:
+                    await discard(task.result())
+        
+        if winner is None:
+            raise error
+        if len(tasks) > 1:
+            metrics.inc("ai_hedge_secondary_wins_total" if tasks[winner] == secondary else "ai_hedge_primary_wins_total")
+        return tasks[winner], winner.result()
+    
+    async def _hedged_dispatch(
+        self, message: str, system_prompt: str, provider: AIProvider, history: Optional[List[AIMessage]] = None
+    ) -> Tuple[AIProvider, str]:
+        """Dispatch a chat message, hedging a stalled local backend onto its partner"""
+        secondary = self._hedge_partner(provider)
+        if secondary is None:
+            return provider, await self._timed_dispatch(message, system_prompt, provider, history)
+        
+        return await self._race_hedged(
+            provider,
+            secondary,
+            provider_router.hedge_delay(provider),
+            lambda candidate: self._timed_dispatch(message, system_prompt, candidate, history)
+        )
+    
+    def _chat_messages(
+        self, message: str, system_prompt: str, history: Optional[List[AIMessage]] = None
+    ) -> List[Dict[str, str]]:
+        """System prompt, earlier turns and the new message in chat-completions form"""
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in history or []:
+            if turn.role == "system":
+                # Summaries of older turns extend the system prompt
+                messages[0]["content"] += f"\n\n{turn.content}"
+            else:
+                messages.append({"role": turn.role, "content": turn.content})
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def _split_system(self, messages: List[Dict[str, str]]) -> Tuple[str, List[Dict[str, str]]]:
+        """Separate the system prompt for APIs that take it as its own parameter"""
+        return messages[0]["content"], messages[1:]
+    
+    def _ollama_prompt(self, messages: List[Dict[str, str]]) -> str:
+        """Flatten chat messages into Ollama's generate prompt format"""
+        labels = {"system": "System", "user": "User", "assistant": "Assistant"}
+        turns = [f"{labels[item['role']]}: {item['content']}" for item in messages]
+        return "\n\n".join(turns) + "\n\nAssistant:"
+    
+    async def _dispatch(
+        self, message: str, system_prompt: str, provider: AIProvider, history: Optional[List[AIMessage]] = None
+    ) -> str:
+        """Route a chat message to the provider implementation"""
+        messages = self._chat_messages(message, system_prompt, history)
+        if provider == AIProvider.OPENAI:
+            return await self._chat_openai(messages)
+        elif provider == AIProvider.ANTHROPIC:
+            return await self._chat_anthropic(messages)
+        elif provider == AIProvider.OPENROUTER:
+            return await self._chat_openrouter(messages)
+        elif provider in [AIProvider.LLAMA, AIProvider.OLLAMA]:
+            return await self._chat_ollama(messages, provider)
+        elif provider == AIProvider.LM_STUDIO:
+            return await self._chat_lm_studio(messages)
+        else:
+            raise ValueError(f"Unsupported AI provider: {provider}")
+    
+    async def _chat_openai(self, messages: List[Dict[str, str]]) -> str:
         """Chat with OpenAI"""
         if not self.openai_client:
             raise ValueError("OpenAI client not initialized")
         
         response = await self.openai_client.chat.completions.create(
             model=settings.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message}
-            ],
+            messages=messages,
             max_tokens=1000,
-            temperature=0.7
+            temperature=TEMPERATURE
         )
         
         return response.choices[0].message.content
     
-    async def _chat_anthropic(self, message: str, system_prompt: str) -> str:
+    async def _chat_anthropic(self, messages: List[Dict[str, str]]) -> str:
         """Chat with Anthropic Claude"""
         if not self.anthropic_client:
             raise ValueError("Anthropic client not initialized")
         
+        system_prompt, turns = self._split_system(messages)
         response = await self.anthropic_client.messages.create(
             model=settings.ANTHROPIC_MODEL,
             max_tokens=1000,
             system=system_prompt,
-            messages=[{"role": "user", "content": message}]
+            messages=turns
         )
         
         return response.content[0].text
     
-    async def _chat_openrouter(self, message: str, system_prompt: str) -> str:
+    async def _chat_openrouter(self, messages: List[Dict[str, str]]) -> str:
         """Chat with OpenRouter"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": settings.OPENROUTER_MODEL,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": message}
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.7
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
-            else:
-                raise Exception(f"OpenRouter API error: {response.status_code}")
+        response = await self.clients.http(AIProvider.OPENROUTER).post(
+            "/chat/completions",
+            json={
+                "model": settings.OPENROUTER_MODEL,
+                "messages": messages,
+                "max_tokens": 1000,
+                "temperature": TEMPERATURE
+            }
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return data["choices"][0]["message"]["content"]
+        else:
+            raise Exception(f"OpenRouter API error: {response.status_code}")
     
-    async def _chat_ollama(self, message: str, system_prompt: str, provider: AIProvider) -> str:
+    async def _chat_ollama(self, messages: List[Dict[str, str]], provider: AIProvider) -> str:
         """Chat with Ollama/LLama"""
-        base_url = settings.llama_base_url if provider == AIProvider.LLAMA else settings.ollama_base_url
         model = settings.LLAMA_MODEL if provider == AIProvider.LLAMA else settings.OLLAMA_MODEL
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{base_url}/api/generate",
-                json={
-                    "model": model,
-                    "prompt": f"System: {system_prompt}\n\nUser: {message}\n\nAssistant:",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9
-                    }
+        response = await self.clients.http(provider).post(
+            "/api/generate",
+            json={
+                "model": model,
+                "prompt": self._ollama_prompt(messages),
+                "stream": False,
+                "options": {
+                    "temperature": TEMPERATURE,
+                    "top_p": 0.9
                 }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("response", "No response generated")
-            else:
-                raise Exception(f"Ollama API error: {response.status_code}")
+            }
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return data.get("response", "No response generated")
+        else:
+            raise Exception(f"Ollama API error: {response.status_code}")
     
-    async def _chat_lm_studio(self, message: str, system_prompt: str) -> str:
+    async def _chat_lm_studio(self, messages: List[Dict[str, str]]) -> str:
         """Chat with LM Studio (OpenAI-compatible)"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.lm_studio_base_url}/v1/chat/completions",
-                json={
-                    "model": settings.LM_STUDIO_MODEL,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": message}
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.7
-                }
+        response = await self.clients.http(AIProvider.LM_STUDIO).post(
+            "/v1/chat/completions",
+            json={
+                "model": settings.LM_STUDIO_MODEL,
+                "messages": messages,
+                "max_tokens": 1000,
+                "temperature": TEMPERATURE
+            }
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return data["choices"][0]["message"]["content"]
+        else:
+            raise Exception(f"LM Studio API error: {response.status_code}")
+    
+    async def chat_stream(
+        self,
+        message: str,
+        provider: AIProvider,
+        context: Optional[str] = None,
+        history: Optional[List[AIMessage]] = None,
+        on_provider: Optional[Callable[[AIProvider], None]] = None
+    ) -> AsyncIterator[str]:
+        """Stream chat response tokens from specified AI provider
+        
+        on_provider is called with the provider that serves the stream once its first token arrives.
+        """
+        if provider == AIProvider.AUTO:
+            async for token in self._chat_stream_auto(message, context, history, on_provider):
+                yield token
+            return
+        
+        messages = self._chat_messages(message, self._build_system_prompt(context), history)
+        secondary = self._hedge_partner(provider)
+        if secondary is not None:
+            async for token in self._chat_stream_hedged(messages, provider, secondary, on_provider):
+                yield token
+            return
+        
+        reported = False
+        async for token in self._provider_stream(messages, provider):
+            if not reported and on_provider:
+                on_provider(provider)
+            reported = True
+            yield token
+    
+    async def _chat_stream_hedged(
+        self,
+        messages: List[Dict[str, str]],
+        provider: AIProvider,
+        secondary: AIProvider,
+        on_provider: Optional[Callable[[AIProvider], None]] = None
+    ) -> AsyncIterator[str]:
+        """Stream from whichever local backend produces the first token, hedging after a p95 delay"""
+        
+        async def first_token(candidate: AIProvider):
+            started = time.monotonic()
+            stream = self._provider_stream(messages, candidate)
+            try:
+                token = await stream.__anext__()
+            except StopAsyncIteration:
+                token = None
+            except BaseException:
+                await stream.aclose()
+                raise
+            provider_router.record_first_token(candidate, (time.monotonic() - started) * 1000)
+            return stream, token
+        
+        async def discard(result):
+            await result[0].aclose()
+        
+        answered_by, (stream, first) = await self._race_hedged(
+            provider, secondary, provider_router.hedge_delay(provider, first_token=True), first_token, discard
+        )
+        if first is None:
+            return
+        if on_provider:
+            on_provider(answered_by)
+        yield first
+        async for token in stream:
+            yield token
+    
+    async def _provider_stream(self, messages: List[Dict[str, str]], provider: AIProvider) -> AsyncIterator[str]:
+        """Stream non-empty tokens from one provider implementation, holding an admission slot throughout
+        
+        Completed and failed streams feed the provider router like other calls; streams closed early
+        by a lost hedge or a failover timeout say nothing about the provider and are not recorded.
+        """
+        if provider == AIProvider.OPENAI:
+            stream = self._stream_openai(messages)
+        elif provider == AIProvider.ANTHROPIC:
+            stream = self._stream_anthropic(messages)
+        elif provider == AIProvider.OPENROUTER:
+            stream = self._stream_openai_compatible(
+                AIProvider.OPENROUTER, "/chat/completions", settings.OPENROUTER_MODEL, messages
+            )
+        elif provider in [AIProvider.LLAMA, AIProvider.OLLAMA]:
+            stream = self._stream_ollama(messages, provider)
+        elif provider == AIProvider.LM_STUDIO:
+            stream = self._stream_openai_compatible(
+                AIProvider.LM_STUDIO, "/v1/chat/completions", settings.LM_STUDIO_MODEL, messages
             )
+        else:
+            raise ValueError(f"Unsupported AI provider: {provider}")
+        
+        async with admission_controller.slot(provider.value):
+            started = time.monotonic()
+            try:
+                async for token in stream:
+                    if token:
+                        yield token
+            except Exception:
+                provider_router.record(provider, (time.monotonic() - started) * 1000, ok=False)
+                raise
+            provider_router.record(provider, (time.monotonic() - started) * 1000, ok=True)
+    
+    async def _chat_stream_auto(
+        self,
+        message: str,
+        context: Optional[str],
+        history: Optional[List[AIMessage]] = None,
+        on_provider: Optional[Callable[[AIProvider], None]] = None
+    ) -> AsyncIterator[str]:
+        """Stream from the best provider, failing over only until the first token arrives"""
+        last_error: Optional[Exception] = None
+        
+        for candidate in provider_router.candidates(provider_health.statuses):
+            stream = self.chat_stream(message, candidate, context, history, on_provider)
+            started = time.monotonic()
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), timeout=settings.AI_ROUTER_ATTEMPT_TIMEOUT_SECONDS)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError as e:
+                # Provider errors are recorded by the stream itself; a timeout only cancels it
+                provider_router.record(candidate, (time.monotonic() - started) * 1000, ok=False)
+                last_error = e
+                continue
+            except Exception as e:
+                last_error = e
+                continue
             
-            if response.status_code == 200:
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
-            else:
-                raise Exception(f"LM Studio API error: {response.status_code}")
+            yield first
+            async for token in stream:
+                yield token
+            return
+        
+        raise Exception(f"No AI provider available: {last_error}")
     
-    async def generate_workflow(self, description: str, provider: AIProvider) -> Dict[str, Any]:
+    async def _stream_openai(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream tokens from OpenAI"""
+        if not self.openai_client:
+            raise ValueError("OpenAI client not initialized")
+        
+        stream = await self.openai_client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            max_tokens=1000,
+            temperature=TEMPERATURE,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+    
+    async def _stream_anthropic(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream tokens from Anthropic Claude"""
+        if not self.anthropic_client:
+            raise ValueError("Anthropic client not initialized")
+        
+        system_prompt, turns = self._split_system(messages)
+        stream = await self.anthropic_client.messages.create(
+            model=settings.ANTHROPIC_MODEL,
+            max_tokens=1000,
+            system=system_prompt,
+            messages=turns,
+            stream=True
+        )
+        
+        async for event in stream:
+            if event.type == "content_block_delta":
+                yield event.delta.text
+    
+    async def _stream_openai_compatible(
+        self, provider: AIProvider, path: str, model: str, messages: List[Dict[str, str]]
+    ) -> AsyncIterator[str]:
+        """Stream tokens from an OpenAI-compatible SSE endpoint (OpenRouter, LM Studio)"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": 1000,
+            "temperature": TEMPERATURE,
+            "stream": True
+        }
+        
+        async with self.clients.http(provider).stream("POST", path, json=payload) as response:
+            if response.status_code != 200:
+                raise Exception(f"{provider.value} API error: {response.status_code}")
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                yield choices[0].get("delta", {}).get("content")
+    
+    async def _stream_ollama(self, messages: List[Dict[str, str]], provider: AIProvider) -> AsyncIterator[str]:
+        """Stream tokens from Ollama/LLama"""
+        model = settings.LLAMA_MODEL if provider == AIProvider.LLAMA else settings.OLLAMA_MODEL
+        payload = {
+            "model": model,
+            "prompt": self._ollama_prompt(messages),
+            "stream": True,
+            "options": {
+                "temperature": TEMPERATURE,
+                "top_p": 0.9
+            }
+        }
+        
+        async with self.clients.http(provider).stream("POST", "/api/generate", json=payload) as response:
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code}")
+            
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                yield data.get("response")
+                if data.get("done"):
+                    break
+    
+    async def generate_workflow(self, description: str, provider: AIProvider, cache_ttl: int = 0) -> Dict[str, Any]:
         """Generate N8N workflow from description"""
         prompt = f"""Generate a complete N8N workflow based on this description: {description}
 
@@ -251,8 +699,54 @@ Please return a valid N8N workflow JSON with the following structure:
 
 Make sure to include proper node types, parameters, and connections. Use realistic node IDs and ensure the workflow is functional."""
 
-        response = await self.chat(prompt, provider)
+        result = await self.complete(prompt, provider, cache_ttl=cache_ttl)
+        if result.error:
+            # Otherwise the error text would become the explanation of an empty workflow
+            raise Exception(result.text)
+        response = result.text
+        
+        workflow = self._parse_generated_workflow(response, description)
+        workflow["ai_cache_hit"] = result.cache_hit
+        return workflow
+    
+    async def optimize_workflow(
+        self,
+        workflow: Dict[str, Any],
+        analysis: Dict[str, Any],
+        optimization_goals: List[str],
+        provider: AIProvider,
+        cache_ttl: int = 0
+    ) -> ChatResult:
+        """Ask for optimization suggestions for an existing N8N workflow"""
+        optimization_prompt = f"""
+        Analyze and optimize this N8N workflow:
+        
+        Workflow: {workflow['name']}
+        Current Performance: {analysis['performance']}
+        Nodes: {len(analysis['nodes'])} nodes
         
+        Optimization Goals: {', '.join(optimization_goals)}
+        
+        Current Workflow Structure:
+        {workflow}
+        
+        Please provide:
+        1. Specific optimization recommendations
+        2. Updated workflow JSON (if changes needed)
+        3. Expected performance improvements
+        4. Risk assessment of changes
+        """
+        
+        return await self.complete(
+            message=optimization_prompt,
+            provider=provider,
+            context=f"Optimizing workflow {workflow.get('id')}",
+            cache_ttl=cache_ttl,
+            cache_extra=workflow.get("updatedAt")
+        )
+    
+    def _parse_generated_workflow(self, response: str, description: str) -> Dict[str, Any]:
+        """Extract workflow JSON from an AI response"""
         # Try to extract JSON from response
         try:
             # Look for JSON in the response
@@ -279,4 +773,9 @@ Make sure to include proper node types, parameters, and connections. Use realist
                 "active": True,
                 "settings": {},
                 "ai_explanation": response
-            }
\ No newline at end of file
+            }
+
+
+def get_ai_service() -> AIService:
+    """Dependency to get an AI service backed by the shared client registry"""
+    return AIService(get_ai_clients())
@@ -0,0 +1,186 @@
+"""
+Conversation Context for N8N-Sensei - Token-budgeted multi-turn history for chat sessions
+"""
+
+import math
+import re
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import AIConversation
+from models import AIMessage, AIProvider
+from services.metrics import metrics
+from services.write_behind import write_behind
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators added by chat templates
+SUMMARY_SNIPPET_WORDS = 24
+
+class HeuristicTokenCounter:
+    """Dependency-free estimate close to BPE tokenizers: one token per ~4 characters of a word, one per symbol"""
+
+    def count(self, text: str) -> int:
+        return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PATTERN.findall(text))
+
+class TiktokenCounter:
+    """Exact counts from a local tiktoken encoding"""
+
+    def __init__(self, encoding: str):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+def build_token_counter():
+    """Use the configured tiktoken encoding when it is installed, otherwise the heuristic"""
+    if settings.AI_CONTEXT_TOKENIZER:
+        try:
+            return TiktokenCounter(settings.AI_CONTEXT_TOKENIZER)
+        except Exception:
+            pass
+    return HeuristicTokenCounter()
+
+def summary_line(user_message: str) -> str:
+    """One short line standing in for a trimmed turn"""
+    words = user_message.split()
+    snippet = " ".join(words[:SUMMARY_SNIPPET_WORDS])
+    if len(words) > SUMMARY_SNIPPET_WORDS:
+        snippet += " ..."
+    return f"- The user asked: {snippet}"
+
+class SessionContext:
+    """Recent turns of one session with their token counts, plus lines summarizing older turns"""
+
+    def __init__(self, counter, max_turns: int):
+        self.counter = counter
+        self.turns: Deque[Tuple[AIMessage, AIMessage, int]] = deque()
+        self.trimmed: Deque[Tuple[str, int]] = deque(maxlen=max_turns)
+        self.max_turns = max_turns
+        self.windows: Dict[int, List[AIMessage]] = {}
+
+    def add(self, user_message: str, ai_response: str):
+        """Append one finished turn, counting its tokens once"""
+        tokens = (
+            self.counter.count(user_message) + self.counter.count(ai_response) + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        self.turns.append((
+            AIMessage(role="user", content=user_message),
+            AIMessage(role="assistant", content=ai_response),
+            tokens
+        ))
+        if len(self.turns) > self.max_turns:
+            self._trim(self.turns.popleft())
+        self.windows = {}
+
+    def _trim(self, turn: Tuple[AIMessage, AIMessage, int]):
+        line = summary_line(turn[0].content)
+        self.trimmed.append((line, self.counter.count(line) + 1))
+
+    def _summary(self, lines: List[Tuple[str, int]], budget: int) -> Optional[AIMessage]:
+        """Summary of trimmed turns, keeping the most recent lines that fit the budget"""
+        kept = []
+        used = MESSAGE_OVERHEAD_TOKENS + 8  # heading line
+        for line, tokens in reversed(lines):
+            if used + tokens > budget:
+                break
+            kept.append(line)
+            used += tokens
+        if not kept:
+            return None
+        return AIMessage(role="system", content="Earlier in this conversation:\n" + "\n".join(reversed(kept)))
+
+    def window(self, budget: int) -> List[AIMessage]:
+        """Newest turns that fit the token budget, preceded by a summary of anything left out"""
+        if budget in self.windows:
+            return list(self.windows[budget])
+
+        turns = list(self.turns)
+        summary_budget = min(settings.AI_CONTEXT_SUMMARY_TOKENS, budget // 4)
+        # Reserve room for the summary only when something has to be left out
+        fits = not self.trimmed and sum(tokens for _, _, tokens in turns) <= budget
+        available = budget if fits else budget - summary_budget
+
+        kept = []
+        used = 0
+        for user, assistant, tokens in reversed(turns):
+            if used + tokens > available:
+                break
+            kept.append((user, assistant))
+            used += tokens
+
+        left_out = turns[:len(turns) - len(kept)]
+        lines = list(self.trimmed) + [
+            (line, self.counter.count(line) + 1) for line in (summary_line(user.content) for user, _, _ in left_out)
+        ]
+        messages: List[AIMessage] = []
+        summary = self._summary(lines, summary_budget) if lines else None
+        if summary is not None:
+            messages.append(summary)
+        for user, assistant in reversed(kept):
+            messages += [user, assistant]
+
+        self.windows[budget] = messages
+        return list(messages)
+
+class ContextBuilder:
+    """Assembles chat history per session and keeps it cached so new turns are appended, not reloaded"""
+
+    def __init__(self, counter=None, max_turns: int = None, max_sessions: int = None):
+        self.counter = counter or build_token_counter()
+        self.max_turns = max_turns or settings.AI_CONTEXT_MAX_TURNS
+        self.max_sessions = max_sessions or settings.AI_CONTEXT_CACHE_SESSIONS
+        self.sessions: "OrderedDict[Tuple[Optional[str], str], SessionContext]" = OrderedDict()
+
+    def budget(self, provider: AIProvider) -> int:
+        """History token budget for a provider's model"""
+        return settings.AI_CONTEXT_TOKEN_BUDGETS.get(provider.value, settings.AI_CONTEXT_DEFAULT_TOKEN_BUDGET)
+
+    async def _load(self, db: AsyncSession, user_id: Optional[str], session_id: str) -> SessionContext:
+        """Read a session's most recent turns, including ones still waiting in the write-behind buffer"""
+        result = await db.execute(
+            select(AIConversation.id, AIConversation.user_message, AIConversation.ai_response, AIConversation.created_at)
+            .where(AIConversation.session_id == session_id, AIConversation.user_id == user_id)
+            .order_by(AIConversation.created_at.desc(), AIConversation.id.desc())
+            .limit(self.max_turns)
+        )
+        rows = {row.id: row for row in result.all()}
+        for row in write_behind.pending(AIConversation, session_id=session_id, user_id=user_id):
+            rows.setdefault(row.id, row)
+
+        context = SessionContext(self.counter, self.max_turns)
+        for row in sorted(rows.values(), key=lambda row: (row.created_at, row.id)):
+            context.add(row.user_message, row.ai_response)
+        return context
+
+    async def history(
+        self, db: AsyncSession, user_id: Optional[str], session_id: str, provider: AIProvider
+    ) -> List[AIMessage]:
+        """Earlier turns of a session trimmed to the provider's token budget"""
+        key = (user_id, session_id)
+        context = self.sessions.get(key)
+        if context is None:
+            metrics.inc("ai_context_cache_misses_total")
+            context = await self._load(db, user_id, session_id)
+            self.sessions[key] = context
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            metrics.inc("ai_context_cache_hits_total")
+        self.sessions.move_to_end(key)
+        return context.window(self.budget(provider))
+
+    def append(self, user_id: Optional[str], session_id: str, user_message: str, ai_response: str):
+        """Add a finished turn to a cached session; uncached sessions pick it up on their next load"""
+        context = self.sessions.get((user_id, session_id))
+        if context is not None:
+            context.add(user_message, ai_response)
+
+    def clear(self):
+        self.sessions.clear()
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,310 @@
+"""
+Execution Stats for N8N-Sensei - Per-workflow execution aggregates kept current by incremental syncs
+"""
+
+import asyncio
+import math
+import time
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select
+from config import settings
+from database import AsyncSessionLocal, WorkflowExecution, WorkflowStats, WorkflowStatsDaily
+from services.metrics import metrics
+from services.workflow_catalog import parse_timestamp
+
+SUCCESS_STATUSES = {"success"}
+UNFINISHED_STATUSES = {"new", "running", "waiting"}  # "unknown" is how N8N reports a crashed run
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+class DurationSketch:
+    """Log-bucketed durations with bounded relative error; sketches merge by adding bucket counts"""
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None, zeros: int = 0):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = dict(buckets or {})
+        self.zeros = zeros
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.buckets.values())
+
+    def add(self, value: float):
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "DurationSketch"):
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q, within the relative accuracy of the true value"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            name: (round(value, 1) if value is not None else None)
+            for name, value in ((name, self.quantile(q)) for name, q in QUANTILES.items())
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"zeros": self.zeros, "buckets": {str(index): count for index, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "DurationSketch":
+        data = data or {}
+        return cls(buckets={int(index): count for index, count in (data.get("buckets") or {}).items()}, zeros=data.get("zeros", 0))
+
+def execution_outcome(execution: Dict[str, Any]) -> Optional[str]:
+    """Whether an execution succeeded or failed, or None while it has not finished"""
+    status = execution.get("status")
+    if status:
+        if status in UNFINISHED_STATUSES:
+            return None
+        return "success" if status in SUCCESS_STATUSES else "failed"
+    # Older N8N versions only report finished and stoppedAt
+    if execution.get("finished"):
+        return "success"
+    return "failed" if execution.get("stoppedAt") else None
+
+def execution_duration_ms(execution: Dict[str, Any]) -> Optional[float]:
+    started, stopped = parse_timestamp(execution.get("startedAt")), parse_timestamp(execution.get("stoppedAt"))
+    if started is None or stopped is None:
+        return None
+    return max(0.0, (stopped - started).total_seconds() * 1000)
+
+def rate(successful: int, finished: int) -> float:
+    return (successful / finished * 100) if finished > 0 else 0
+
+class ExecutionStatsStore:
+    """All-time and daily execution aggregates per workflow, read in O(1) and advanced from an execution id cursor"""
+
+    def __init__(self, session_factory=None, sync_interval: float = None, max_staleness: float = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.sync_interval = sync_interval or settings.EXECUTION_STATS_SYNC_INTERVAL
+        self.max_staleness = max_staleness or settings.EXECUTION_STATS_MAX_STALENESS
+        self.page_size = settings.EXECUTION_STATS_PAGE_SIZE
+        self.enabled = settings.EXECUTION_STATS_ENABLED
+        self.synced: Dict[str, float] = {}  # workflow id -> monotonic time of the last sync here
+        self.watched: Dict[str, float] = {}  # workflow id -> monotonic time it was last read
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._syncer: Optional[asyncio.Task] = None
+
+    async def _execution(self, n8n_service, execution_id: str) -> Dict[str, Any]:
+        execution = await n8n_service.get_execution(execution_id)
+        # N8N 1.x wraps a single execution as {"data": {...}}
+        return execution["data"] if isinstance(execution.get("data"), dict) else execution
+
+    async def _new_executions(self, n8n_service, workflow_id: str, cursor: Optional[int]) -> List[Dict[str, Any]]:
+        """Every execution after the cursor, paging backwards from the newest with lastId"""
+        executions: List[Dict[str, Any]] = []
+        last_id: Optional[int] = None
+        while True:
+            page = await n8n_service.get_executions_page(workflow_id, first_id=cursor, last_id=last_id, limit=self.page_size)
+            # Versions without firstId/lastId return the newest page again; keep only what is new
+            page = [
+                execution for execution in page
+                if (cursor is None or int(execution["id"]) > cursor) and (last_id is None or int(execution["id"]) < last_id)
+            ]
+            executions.extend(page)
+            if len(page) < self.page_size:
+                return executions
+            last_id = min(int(execution["id"]) for execution in page)
+
+    async def _fold(
+        self,
+        workflow_id: str,
+        executions: List[Dict[str, Any]],
+        cursor: Optional[int] = None,
+        resolved: List[str] = ()
+    ) -> int:
+        """Count finished executions into the aggregates in one transaction; unfinished ones are kept pending"""
+        async with self.session_factory() as db:
+            stats = await db.get(WorkflowStats, workflow_id)
+            if stats is None:
+                stats = WorkflowStats(workflow_id=workflow_id, total=0, successful=0, failed=0, running=0)
+                db.add(stats)
+            pending = [execution_id for execution_id in stats.pending_execution_ids or [] if execution_id not in resolved]
+            finished = [execution for execution in executions if execution_outcome(execution)]
+            pending += [str(execution["id"]) for execution in executions if not execution_outcome(execution)]
+            # Another worker may have counted these already
+            counted = set((await db.execute(
+                select(WorkflowExecution.n8n_execution_id)
+                .where(WorkflowExecution.n8n_execution_id.in_([str(execution["id"]) for execution in finished]))
+            )).scalars()) if finished else set()
+
+            sketch = DurationSketch.from_dict(stats.duration_sketch)
+            days: Dict[date, WorkflowStatsDaily] = {}
+            day_sketches: Dict[date, DurationSketch] = {}
+            added = 0
+            for execution in finished:
+                if str(execution["id"]) in counted:
+                    continue
+                outcome = execution_outcome(execution)
+                started = parse_timestamp(execution.get("startedAt"))
+                day = (started or datetime.utcnow()).date()
+                if day not in days:
+                    daily = await db.get(WorkflowStatsDaily, (workflow_id, day))
+                    if daily is None:
+                        daily = WorkflowStatsDaily(workflow_id=workflow_id, day=day, total=0, successful=0, failed=0)
+                        db.add(daily)
+                    days[day] = daily
+                    day_sketches[day] = DurationSketch.from_dict(daily.duration_sketch)
+
+                for aggregate in (stats, days[day]):
+                    aggregate.total += 1
+                    if outcome == "success":
+                        aggregate.successful += 1
+                    else:
+                        aggregate.failed += 1
+                duration = execution_duration_ms(execution)
+                if duration is not None:
+                    sketch.add(duration)
+                    day_sketches[day].add(duration)
+                if started and (stats.last_execution_at is None or started > stats.last_execution_at):
+                    stats.last_execution_at = started
+
+                db.add(WorkflowExecution(
+                    n8n_execution_id=str(execution["id"]),
+                    workflow_id=workflow_id,
+                    status="success" if outcome == "success" else "error",
+                    started_at=started,
+                    finished_at=parse_timestamp(execution.get("stoppedAt"))
+                ))
+                added += 1
+
+            if cursor is not None:
+                stats.last_execution_id = str(cursor)
+            stats.pending_execution_ids = pending
+            stats.running = len(pending)
+            stats.duration_sketch = sketch.to_dict()
+            for day, daily in days.items():
+                daily.duration_sketch = day_sketches[day].to_dict()
+            stats.synced_at = datetime.utcnow()
+            # The unique n8n_execution_id makes a concurrent sync from another worker fail here instead of double counting
+            await db.commit()
+            return added
+
+    async def sync(self, n8n_service, workflow_id: str) -> int:
+        """Fold executions finished since the last sync into the aggregates; returns how many were added"""
+        lock = self._locks.setdefault(workflow_id, asyncio.Lock())
+        async with lock:
+            async with self.session_factory() as db:
+                stats = await db.get(WorkflowStats, workflow_id)
+                cursor = int(stats.last_execution_id) if stats and stats.last_execution_id else None
+                pending = list(stats.pending_execution_ids or []) if stats else []
+
+            added = 0
+            if pending:
+                # Unfinished at an earlier sync; the ones that ended since are counted now
+                checked = await asyncio.gather(
+                    *(self._execution(n8n_service, execution_id) for execution_id in pending), return_exceptions=True
+                )
+                ended = [execution for execution in checked if isinstance(execution, dict) and execution_outcome(execution)]
+                added += await self._fold(workflow_id, ended, resolved=[str(execution["id"]) for execution in ended])
+
+            # N8N lists newest first, so the cursor only moves once the whole range down to it is in
+            executions = sorted(
+                await self._new_executions(n8n_service, workflow_id, cursor),
+                key=lambda execution: int(execution["id"])
+            )
+            if executions:
+                added += await self._fold(workflow_id, executions, cursor=int(executions[-1]["id"]))
+
+            self.synced[workflow_id] = time.monotonic()
+            metrics.inc("execution_stats_syncs_total")
+            metrics.inc("execution_stats_executions_added_total", added)
+            return added
+
+    async def statistics(self, n8n_service, workflow_id: str, window_days: int = 7) -> Dict[str, Any]:
+        """All-time and last-window_days statistics, syncing first when this worker's view is stale"""
+        self.watched[workflow_id] = time.monotonic()
+        synced = self.synced.get(workflow_id)
+        if synced is None or time.monotonic() - synced >= self.max_staleness:
+            try:
+                await self.sync(n8n_service, workflow_id)
+            except Exception as e:
+                print(f"⚠️ Execution stats sync failed for {workflow_id}: {e}")
+
+        since = datetime.utcnow().date() - timedelta(days=window_days - 1)
+        async with self.session_factory() as db:
+            stats = await db.get(WorkflowStats, workflow_id)
+            if stats is None:
+                raise Exception(f"No execution statistics for workflow {workflow_id}")
+            daily = (await db.execute(
+                select(WorkflowStatsDaily)
+                .where(WorkflowStatsDaily.workflow_id == workflow_id, WorkflowStatsDaily.day >= since)
+            )).scalars().all()
+
+        window_sketch = DurationSketch()
+        for row in daily:
+            window_sketch.merge(DurationSketch.from_dict(row.duration_sketch))
+        window_successful = sum(row.successful for row in daily)
+        window_total = sum(row.total for row in daily)
+
+        return {
+            "total_executions": stats.total + stats.running,
+            "successful": stats.successful,
+            "failed": stats.failed,
+            "running": stats.running,
+            "success_rate": rate(stats.successful, stats.total),
+            "duration_ms": DurationSketch.from_dict(stats.duration_sketch).summary(),
+            "last_execution_at": stats.last_execution_at.isoformat() if stats.last_execution_at else None,
+            "synced_at": stats.synced_at.isoformat() if stats.synced_at else None,
+            "window": {
+                "days": window_days,
+                "total_executions": window_total,
+                "successful": window_successful,
+                "failed": sum(row.failed for row in daily),
+                "success_rate": rate(window_successful, window_total),
+                "duration_ms": window_sketch.summary()
+            }
+        }
+
+    async def _sync_loop(self, n8n_service):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            idle_before = time.monotonic() - settings.EXECUTION_STATS_IDLE_SECONDS
+            for workflow_id in [workflow_id for workflow_id, read_at in self.watched.items() if read_at < idle_before]:
+                del self.watched[workflow_id]
+            for workflow_id in list(self.watched):
+                try:
+                    await self.sync(n8n_service, workflow_id)
+                except Exception as e:
+                    print(f"⚠️ Execution stats sync failed for {workflow_id}: {e}")
+
+    def start(self, n8n_service):
+        """Keep recently read workflows synced in the background"""
+        if not self.enabled:
+            return
+        if self._syncer is None or self._syncer.done():
+            self._syncer = asyncio.create_task(self._sync_loop(n8n_service))
+
+    async def stop(self):
+        """Stop the background sync"""
+        if self._syncer is not None and not self._syncer.done():
+            self._syncer.cancel()
+            try:
+                await self._syncer
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._syncer = None
+
+
+execution_stats = ExecutionStatsStore()
@@ -0,0 +1,307 @@
+"""
+Job Service for N8N-Sensei - Background workers for long-running AI workflow jobs
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Any, List, Optional, AsyncIterator, Callable, Awaitable
+from config import settings
+from sqlalchemy import select
+from database import AsyncSessionLocal, AIJob, AIConversation
+from models import AIProvider, JobResponse, JobStatus
+from services.ai_service import get_ai_service
+from services.n8n_service import get_n8n_service, request_memo
+from services.write_behind import write_behind
+from services.quota import quota_manager
+
+TERMINAL_STATUSES = {JobStatus.SUCCEEDED.value, JobStatus.FAILED.value}
+# Job types that create something in N8N; running one again after an interruption could create it twice
+CREATING_JOB_TYPES = {"generate_workflow"}
+
+async def run_generate_workflow(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate a workflow with AI and create it in N8N"""
+    ai_service = get_ai_service()
+    n8n_service = get_n8n_service()
+    provider = AIProvider(payload["ai_provider"])
+
+    workflow_data = await ai_service.generate_workflow(
+        description=payload["description"],
+        provider=provider,
+        cache_ttl=settings.AI_CACHE_TTL_GENERATE
+    )
+    workflow_data.pop("ai_cache_hit", None)
+    ai_explanation = workflow_data.pop("ai_explanation", "Workflow generated successfully")
+
+    validation = await n8n_service.validate_workflow(workflow_data)
+    if not validation["valid"]:
+        raise Exception(f"Generated workflow is invalid: {validation['errors']}")
+
+    created_workflow = await n8n_service.create_workflow(workflow_data)
+
+    conversation = AIConversation(
+        session_id=str(uuid.uuid4()),
+        user_message=f"Generate workflow: {payload['description']}",
+        ai_response=ai_explanation,
+        ai_provider=provider.value,
+        workflow_id=created_workflow["id"],
+        action_taken="workflow_created",
+        created_at=datetime.utcnow()
+    )
+    await write_behind.add(conversation)
+
+    return {
+        "workflow": created_workflow,
+        "ai_explanation": ai_explanation,
+        "confidence_score": 0.8
+    }
+
+async def run_optimize_workflow(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Ask AI for optimization suggestions for an existing workflow"""
+    ai_service = get_ai_service()
+    n8n_service = get_n8n_service()
+    workflow_id = payload["workflow_id"]
+
+    with request_memo():
+        workflow, analysis = await asyncio.gather(
+            n8n_service.get_workflow(workflow_id),
+            n8n_service.analyze_workflow_for_ai(workflow_id)
+        )
+    result = await ai_service.optimize_workflow(
+        workflow=workflow,
+        analysis=analysis,
+        optimization_goals=payload["optimization_goals"],
+        provider=AIProvider(payload["ai_provider"]),
+        cache_ttl=settings.AI_CACHE_TTL_OPTIMIZE
+    )
+    if result.error:
+        raise Exception(result.text)
+
+    conversation = AIConversation(
+        session_id=str(uuid.uuid4()),
+        user_message=f"Optimize workflow {workflow_id}",
+        ai_response=result.text,
+        ai_provider=result.provider,
+        workflow_id=workflow_id,
+        action_taken="workflow_optimized",
+        created_at=datetime.utcnow()
+    )
+    await write_behind.add(conversation)
+
+    return {
+        "workflow_id": workflow_id,
+        "optimization_suggestions": result.text,
+        "current_performance": analysis["performance"],
+        "ai_provider": result.provider
+    }
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+    "generate_workflow": run_generate_workflow,
+    "optimize_workflow": run_optimize_workflow,
+}
+
+def job_to_response(job: AIJob) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        job_type=job.job_type,
+        status=job.status,
+        ai_provider=job.ai_provider,
+        result=job.result,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+class JobManager:
+    """Database-backed job queue drained by a bounded pool of async workers"""
+
+    def __init__(self, session_factory=None, workers: int = None, handlers: Dict[str, Callable] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.worker_count = workers or settings.AI_JOB_WORKERS
+        self.handlers = handlers or JOB_HANDLERS
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.provider_slots: Dict[str, asyncio.Semaphore] = {}
+        # Jobs taken off the queue while their provider was saturated, oldest first
+        self.parked: Dict[str, Deque[str]] = {}
+        self.watchers: Dict[str, List[asyncio.Queue]] = {}
+
+    def _provider_slot(self, provider: str) -> asyncio.Semaphore:
+        """Per-provider concurrency limit shared by all workers"""
+        if provider not in self.provider_slots:
+            limit = settings.AI_JOB_PROVIDER_CONCURRENCY.get(provider, settings.AI_JOB_DEFAULT_PROVIDER_CONCURRENCY)
+            self.provider_slots[provider] = asyncio.Semaphore(limit)
+        return self.provider_slots[provider]
+
+    async def submit(
+        self, job_type: str, provider: AIProvider, payload: Dict[str, Any], user_id: Optional[str] = None
+    ) -> JobResponse:
+        """Persist a new job for a user and queue it for a worker"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unsupported job type: {job_type}")
+
+        async with self.session_factory() as db:
+            job = AIJob(
+                job_type=job_type,
+                user_id=user_id,
+                status=JobStatus.QUEUED.value,
+                ai_provider=provider.value,
+                request_data=payload,
+                created_at=datetime.utcnow()
+            )
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+            response = job_to_response(job)
+
+        # Without running workers the job stays queued in the database until start()
+        if self.queue is not None:
+            self.queue.put_nowait(response.id)
+        return response
+
+    async def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[JobResponse]:
+        """Current state of a job, or None if it does not exist or belongs to another user"""
+        async with self.session_factory() as db:
+            job = await db.get(AIJob, job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            return job_to_response(job)
+
+    async def watch(self, job_id: str) -> AsyncIterator[JobResponse]:
+        """Yield the job's state now and after every change until it finishes"""
+        updates: asyncio.Queue = asyncio.Queue()
+        # Register before reading so no transition can slip in between
+        self.watchers.setdefault(job_id, []).append(updates)
+        try:
+            job = await self.get(job_id)
+            while job is not None:
+                yield job
+                if job.status.value in TERMINAL_STATUSES:
+                    return
+                job = await updates.get()
+        finally:
+            self.watchers[job_id].remove(updates)
+            if not self.watchers[job_id]:
+                del self.watchers[job_id]
+
+    async def _update(self, job_id: str, **fields) -> Optional[JobResponse]:
+        """Write job fields and notify watchers"""
+        async with self.session_factory() as db:
+            job = await db.get(AIJob, job_id)
+            if job is None:
+                return None
+            for name, value in fields.items():
+                setattr(job, name, value)
+            await db.commit()
+            response = job_to_response(job)
+
+        for updates in self.watchers.get(job_id, []):
+            updates.put_nowait(response)
+        return response
+
+    def _unpark(self, provider: str):
+        """Queue the oldest job parked on a provider once one of its slots frees up"""
+        parked = self.parked.get(provider)
+        if parked:
+            self.queue.put_nowait(parked.popleft())
+            # The parked job's original queue entry was never marked done; close it so join() counts it once
+            self.queue.task_done()
+
+    async def _run(self, job_id: str) -> bool:
+        """Run one job under its provider's concurrency limit
+        
+        Returns True when the provider was saturated and the job was parked instead, so
+        the worker can move on to jobs for other providers.
+        """
+        async with self.session_factory() as db:
+            job = await db.get(AIJob, job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return False
+            job_type, provider, payload, user_id = job.job_type, job.ai_provider, job.request_data, job.user_id
+            attempts = (job.attempts or 0) + 1
+
+        slot = self._provider_slot(provider)
+        if slot.locked():
+            self.parked.setdefault(provider, deque()).append(job_id)
+            return True
+
+        try:
+            async with slot:
+                await self._update(job_id, status=JobStatus.RUNNING.value, started_at=datetime.utcnow(), attempts=attempts)
+                try:
+                    result = await self.handlers[job_type](payload)
+                except Exception as e:
+                    # The submit endpoint charged the quota; a job that produced nothing gives it back
+                    if user_id:
+                        quota_manager.refund(user_id)
+                    await self._update(job_id, status=JobStatus.FAILED.value, error=str(e), finished_at=datetime.utcnow())
+                else:
+                    await self._update(job_id, status=JobStatus.SUCCEEDED.value, result=result, finished_at=datetime.utcnow())
+        finally:
+            self._unpark(provider)
+        return False
+
+    async def _worker(self):
+        """Take job ids off the queue until cancelled"""
+        while True:
+            job_id = await self.queue.get()
+            parked = False
+            try:
+                parked = await self._run(job_id)
+            except Exception as e:
+                print(f"❌ Job {job_id} crashed: {e}")
+            finally:
+                if not parked:
+                    self.queue.task_done()
+
+    async def _requeue_unfinished(self):
+        """Queue jobs left over from a previous process
+        
+        Interrupted jobs that create something in N8N are failed instead, since they may
+        have got as far as creating it.
+        """
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(AIJob)
+                .where(AIJob.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]))
+                .order_by(AIJob.created_at)
+            )
+            jobs = []
+            for job in result.scalars().all():
+                if job.status == JobStatus.RUNNING.value and job.job_type in CREATING_JOB_TYPES:
+                    job.status = JobStatus.FAILED.value
+                    job.error = "Interrupted by a restart; not run again because it may already have created the workflow"
+                    job.finished_at = datetime.utcnow()
+                    continue
+                job.status = JobStatus.QUEUED.value
+                job.started_at = None
+                jobs.append(job)
+            await db.commit()
+            for job in jobs:
+                self.queue.put_nowait(job.id)
+
+    async def start(self):
+        """Recover unfinished jobs and start the worker pool"""
+        if self.workers:
+            return
+        self.queue = asyncio.Queue()
+        self.provider_slots = {}
+        self.parked = {}
+        await self._requeue_unfinished()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Stop the workers; interrupted and parked jobs are picked up again on next start"""
+        for task in self.workers:
+            task.cancel()
+        for task in self.workers:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self.workers = []
+
+
+job_manager = JobManager()
@@ -0,0 +1,40 @@
+"""
+Metrics for N8N-Sensei - In-process counters and gauges exposed by the health API
+"""
+
+import threading
+from typing import Dict, Any
+
+class Metrics:
+    """Named counters and gauges"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1):
+        """Increment a counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Set a gauge to its current value"""
+        with self.lock:
+            self.gauges[name] = value
+
+    def get(self, name: str) -> float:
+        return self.counters.get(name, self.gauges.get(name, 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of every counter and gauge"""
+        with self.lock:
+            return {"counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+
+
+metrics = Metrics()
@@ -2,105 +2,317 @@
 N8N Service for N8N-Sensei - Handles all N8N API interactions
 """
 
+import asyncio
 import httpx
 import json
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
 from config import settings
 from models import N8NWorkflow, WorkflowStatus, ExecutionStatus
 from datetime import datetime
+from services.workflow_catalog import workflow_catalog
+from services.execution_stats import execution_stats, execution_outcome, rate
+from services.metrics import metrics
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 support in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def create_n8n_client() -> httpx.AsyncClient:
+    """Create a pooled keep-alive HTTP client for the N8N API"""
+    return httpx.AsyncClient(
+        base_url=settings.n8n_base_url,
+        timeout=settings.N8N_HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=settings.N8N_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.N8N_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.N8N_HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=settings.N8N_HTTP2 and HTTP2_AVAILABLE
+    )
+
+STATISTICS_EXECUTIONS = 100  # executions behind get_workflow_statistics
+RECENT_EXECUTIONS = 5  # executions included in AI analysis
+
+# Reads made during the current request or job, so the same resource is fetched once
+_request_memo: ContextVar[Optional[Dict[Tuple, asyncio.Future]]] = ContextVar("n8n_request_memo", default=None)
+
+@contextmanager
+def request_memo():
+    """Share N8N reads within one request or job; nested scopes reuse the outer memo"""
+    if _request_memo.get() is not None:
+        yield
+        return
+    token = _request_memo.set({})
+    try:
+        yield
+    finally:
+        _request_memo.reset(token)
+
+async def n8n_request_memo():
+    """Dependency scoping the N8N read memo to one request"""
+    with request_memo():
+        yield
+
+def execution_statistics(executions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Success and failure counts over a page of executions, classified like the stats store"""
+    outcomes = [execution_outcome(ex) for ex in executions]
+    successful = outcomes.count("success")
+    failed = outcomes.count("failed")
+    
+    return {
+        "total_executions": len(executions),
+        "successful": successful,
+        "failed": failed,
+        "running": outcomes.count(None),
+        "success_rate": rate(successful, successful + failed)
+    }
+
+def has_tag(workflow: Dict[str, Any], tag: str) -> bool:
+    """Case-insensitive match against a workflow's tag names"""
+    wanted = tag.lower()
+    for workflow_tag in workflow.get("tags") or []:
+        name = workflow_tag.get("name") if isinstance(workflow_tag, dict) else workflow_tag
+        if isinstance(name, str) and name.lower() == wanted:
+            return True
+    return False
 
 class N8NService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.base_url = settings.n8n_base_url
         self.api_key = settings.N8N_API_KEY
         self.headers = {}
+        self.client = client or create_n8n_client()
+        self.catalog = None  # local WorkflowCatalog mirror, attached for the shared service
+        self.stats_store = None  # ExecutionStatsStore, attached for the shared service
+        # GET responses N8N sent with an ETag: key -> (etag, body), revalidated with If-None-Match
+        self.validated: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        # Upstream GETs in flight by URL, shared by concurrent identical callers
+        self.inflight: Dict[str, asyncio.Future] = {}
         
         if self.api_key:
             self.headers["X-N8N-API-KEY"] = self.api_key
     
+    async def _mirror(self, apply, *args):
+        """Apply a successful write to the local catalog; N8N stays the source of truth if this fails"""
+        if apply is None:
+            return
+        try:
+            await apply(*args)
+        except Exception as e:
+            print(f"⚠️ Workflow catalog update failed: {e}")
+    
+    async def _memoized(self, key: Tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fetch once per key within a request_memo scope; concurrent callers share the same future"""
+        memo = _request_memo.get()
+        if memo is None:
+            return await fetch()
+        key = (id(self),) + key
+        future = memo.get(key)
+        if future is None:
+            future = memo[key] = asyncio.ensure_future(fetch())
+        else:
+            metrics.inc("n8n_request_memo_hits_total")
+        return await future
+    
+    async def _shared_get(self, path: str, params: Optional[Dict[str, Any]] = None, revalidate: bool = False) -> httpx.Response:
+        """GET coalesced with identical ones in flight: one upstream request, its response or error fanned out to every caller"""
+        key = str(httpx.URL(path, params=params))
+        future = self.inflight.get(key)
+        if future is None:
+            if revalidate:
+                future = asyncio.ensure_future(self._conditional_get(key, path, params))
+            else:
+                future = asyncio.ensure_future(self.client.get(path, headers=self.headers, params=params))
+            self.inflight[key] = future
+            future.add_done_callback(lambda done: self._settle(key, done))
+            metrics.inc("n8n_upstream_gets_total")
+        else:
+            metrics.inc("n8n_coalesced_gets_total")
+        # A caller that gives up must not cancel the request the others are waiting on
+        return await asyncio.shield(future)
+    
+    def _settle(self, key: str, future: asyncio.Future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        if not future.cancelled():
+            future.exception()  # retrieved here so an error nobody awaited is not logged as unhandled
+    
+    async def _conditional_get(self, key: str, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """GET that revalidates a remembered response; a 304 from N8N is answered from memory as a 200"""
+        cached = self.validated.get(key)
+        headers = {**self.headers, "If-None-Match": cached[0]} if cached else self.headers
+        response = await self.client.get(path, headers=headers, params=params)
+        
+        if response.status_code == 304 and cached:
+            self.validated.move_to_end(key)
+            metrics.inc("n8n_not_modified_total")
+            return httpx.Response(200, content=cached[1], headers={"content-type": "application/json"}, request=response.request)
+        
+        etag = response.headers.get("etag")
+        if response.status_code == 200 and etag:
+            self.validated[key] = (etag, response.content)
+            self.validated.move_to_end(key)
+            while len(self.validated) > settings.N8N_CONDITIONAL_CACHE_ENTRIES:
+                self.validated.popitem(last=False)
+        else:
+            self.validated.pop(key, None)
+        return response
+    
+    async def close(self):
+        """Close the underlying HTTP client and its pooled connections"""
+        await self.client.aclose()
+    
     async def check_connection(self) -> bool:
         """Check if N8N is accessible"""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/rest/active-workflows", headers=self.headers)
-                return response.status_code == 200
+            response = await self.client.get("/rest/active-workflows", headers=self.headers, timeout=5.0)
+            return response.status_code == 200
         except Exception:
             return False
     
     async def get_workflows_count(self) -> int:
         """Get total number of workflows"""
         try:
+            if self.catalog is not None and await self.catalog.ensure_fresh(self):
+                return await self.catalog.count()
             workflows = await self.get_workflows()
             return len(workflows)
         except Exception:
             return 0
     
-    async def get_workflows(self) -> List[Dict[str, Any]]:
-        """Get all workflows from N8N"""
+    async def _fetch_workflows(self, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Workflows from /rest/workflows and the total count, which only paginating N8N versions report"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/rest/workflows", headers=self.headers)
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"N8N API error: {response.status_code}")
+            response = await self._shared_get("/rest/workflows", params)
+            
+            if response.status_code == 200:
+                data = response.json()
+                # Newer N8N versions wrap the list as {"data": [...], "count": n}
+                if isinstance(data, dict):
+                    return data.get("data", []), data.get("count")
+                return data, None
+            else:
+                raise Exception(f"N8N API error: {response.status_code}")
         except Exception as e:
             raise Exception(f"Failed to get workflows: {str(e)}")
     
+    async def get_workflows(self) -> List[Dict[str, Any]]:
+        """Get all workflows from N8N"""
+        workflows, _ = await self._fetch_workflows({})
+        return workflows
+    
+    async def list_workflows(
+        self,
+        active: Optional[bool] = None,
+        tag: Optional[str] = None,
+        select: Optional[List[str]] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """One page of workflows and the offset of the next page, or None on the last page"""
+        if self.catalog is not None and await self.catalog.ensure_fresh(self):
+            return await self.catalog.list_workflows(active, tag, select, limit, offset)
+        
+        params: Dict[str, Any] = {"skip": offset, "take": limit}
+        query_filter: Dict[str, Any] = {}
+        if active is not None:
+            query_filter["active"] = active
+        if tag:
+            query_filter["tags"] = [tag]
+        if query_filter:
+            params["filter"] = json.dumps(query_filter)
+        if select:
+            params["select"] = json.dumps(select)
+        
+        workflows, count = await self._fetch_workflows(params)
+        if count is not None:
+            # N8N filtered and paged the list itself
+            next_offset = offset + len(workflows)
+            return workflows, next_offset if workflows and next_offset < count else None
+        
+        # Older versions ignore filter, select and paging and return every workflow
+        matching = [
+            workflow for workflow in workflows
+            if (active is None or bool(workflow.get("active")) == active) and (not tag or has_tag(workflow, tag))
+        ]
+        next_offset = offset + limit
+        return matching[offset:next_offset], next_offset if next_offset < len(matching) else None
+    
     async def get_workflow(self, workflow_id: str) -> Dict[str, Any]:
-        """Get specific workflow by ID"""
+        """Get specific workflow by ID, from the local catalog when it is fresh"""
+        return await self._memoized(("workflow", workflow_id), lambda: self._load_workflow(workflow_id))
+    
+    async def _load_workflow(self, workflow_id: str) -> Dict[str, Any]:
+        if self.catalog is not None and await self.catalog.ensure_fresh(self):
+            workflow = await self.catalog.get(workflow_id)
+            if workflow is not None:
+                return workflow
+            # Created in N8N since the last sync, or unknown
+            workflow = await self._fetch_workflow(workflow_id)
+            await self._mirror(self.catalog.upsert, workflow)
+            return workflow
+        return await self._fetch_workflow(workflow_id)
+    
+    async def _fetch_workflow(self, workflow_id: str) -> Dict[str, Any]:
+        """Get a workflow from N8N itself"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/rest/workflows/{workflow_id}", headers=self.headers)
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"Workflow not found: {workflow_id}")
+            response = await self._shared_get(f"/rest/workflows/{workflow_id}", revalidate=True)
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(f"Workflow not found: {workflow_id}")
         except Exception as e:
             raise Exception(f"Failed to get workflow: {str(e)}")
     
     async def create_workflow(self, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new workflow in N8N"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/rest/workflows",
-                    headers=self.headers,
-                    json=workflow_data
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"Failed to create workflow: {response.status_code}")
+            response = await self.client.post(
+                "/rest/workflows",
+                headers=self.headers,
+                json=workflow_data
+            )
+            
+            if response.status_code == 200:
+                workflow = response.json()
+                await self._mirror(self.catalog and self.catalog.upsert, workflow)
+                return workflow
+            else:
+                raise Exception(f"Failed to create workflow: {response.status_code}")
         except Exception as e:
             raise Exception(f"Failed to create workflow: {str(e)}")
     
     async def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update existing workflow"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.put(
-                    f"{self.base_url}/rest/workflows/{workflow_id}",
-                    headers=self.headers,
-                    json=workflow_data
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"Failed to update workflow: {response.status_code}")
+            response = await self.client.put(
+                f"/rest/workflows/{workflow_id}",
+                headers=self.headers,
+                json=workflow_data
+            )
+            
+            if response.status_code == 200:
+                workflow = response.json()
+                await self._mirror(self.catalog and self.catalog.upsert, workflow)
+                return workflow
+            else:
+                raise Exception(f"Failed to update workflow: {response.status_code}")
         except Exception as e:
             raise Exception(f"Failed to update workflow: {str(e)}")
     
     async def delete_workflow(self, workflow_id: str) -> bool:
         """Delete workflow"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.delete(f"{self.base_url}/rest/workflows/{workflow_id}", headers=self.headers)
-                return response.status_code == 200
+            response = await self.client.delete(f"/rest/workflows/{workflow_id}", headers=self.headers)
+            if response.status_code == 200:
+                await self._mirror(self.catalog and self.catalog.remove, workflow_id)
+            return response.status_code == 200
         except Exception:
             return False
     
@@ -111,90 +323,98 @@ class N8NService:
             if input_data:
                 payload["inputData"] = input_data
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/rest/workflows/{workflow_id}/execute",
-                    headers=self.headers,
-                    json=payload
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"Failed to execute workflow: {response.status_code}")
+            response = await self.client.post(
+                f"/rest/workflows/{workflow_id}/execute",
+                headers=self.headers,
+                json=payload
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(f"Failed to execute workflow: {response.status_code}")
         except Exception as e:
             raise Exception(f"Failed to execute workflow: {str(e)}")
     
     async def get_executions(self, workflow_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
         """Get workflow executions"""
+        return await self._memoized(("executions", workflow_id, limit), lambda: self._fetch_executions(workflow_id, limit))
+    
+    async def _fetch_executions(self, workflow_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
         try:
             params = {"limit": limit}
             if workflow_id:
                 params["workflowId"] = workflow_id
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/rest/executions",
-                    headers=self.headers,
-                    params=params
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("data", [])
-                else:
-                    raise Exception(f"Failed to get executions: {response.status_code}")
+            response = await self._shared_get("/rest/executions", params, revalidate=True)
+            
+            if response.status_code == 200:
+                data = response.json().get("data", [])
+                return data.get("results", []) if isinstance(data, dict) else data
+            else:
+                raise Exception(f"Failed to get executions: {response.status_code}")
         except Exception as e:
             raise Exception(f"Failed to get executions: {str(e)}")
     
+    async def get_executions_page(
+        self,
+        workflow_id: str,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Executions newest first, limited to first_id < id < last_id on N8N versions that support the bounds"""
+        params: Dict[str, Any] = {"workflowId": workflow_id, "limit": limit}
+        if first_id is not None:
+            params["firstId"] = first_id
+        if last_id is not None:
+            params["lastId"] = last_id
+        response = await self._shared_get("/rest/executions", params)
+        if response.status_code != 200:
+            raise Exception(f"Failed to get executions: {response.status_code}")
+        data = response.json().get("data", [])
+        # N8N 1.x nests the page as {"results": [...], "count": n}
+        return data.get("results", []) if isinstance(data, dict) else data
+    
     async def get_execution(self, execution_id: str) -> Dict[str, Any]:
         """Get specific execution details"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/rest/executions/{execution_id}", headers=self.headers)
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    raise Exception(f"Execution not found: {execution_id}")
+            response = await self._shared_get(f"/rest/executions/{execution_id}")
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                raise Exception(f"Execution not found: {execution_id}")
         except Exception as e:
             raise Exception(f"Failed to get execution: {str(e)}")
     
     async def activate_workflow(self, workflow_id: str) -> bool:
         """Activate workflow"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(f"{self.base_url}/rest/workflows/{workflow_id}/activate", headers=self.headers)
-                return response.status_code == 200
+            response = await self.client.post(f"/rest/workflows/{workflow_id}/activate", headers=self.headers)
+            if response.status_code == 200:
+                await self._mirror(self.catalog and self.catalog.set_active, workflow_id, True)
+            return response.status_code == 200
         except Exception:
             return False
     
     async def deactivate_workflow(self, workflow_id: str) -> bool:
         """Deactivate workflow"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(f"{self.base_url}/rest/workflows/{workflow_id}/deactivate", headers=self.headers)
-                return response.status_code == 200
+            response = await self.client.post(f"/rest/workflows/{workflow_id}/deactivate", headers=self.headers)
+            if response.status_code == 200:
+                await self._mirror(self.catalog and self.catalog.set_active, workflow_id, False)
+            return response.status_code == 200
         except Exception:
             return False
     
-    async def get_workflow_statistics(self, workflow_id: str) -> Dict[str, Any]:
-        """Get workflow execution statistics"""
+    async def get_workflow_statistics(self, workflow_id: str, window_days: int = 7) -> Dict[str, Any]:
+        """Get workflow execution statistics, all-time from the stats store when attached, else over recent executions"""
         try:
-            executions = await self.get_executions(workflow_id, limit=100)
-            
-            total_executions = len(executions)
-            successful = sum(1 for ex in executions if ex.get("finished") and not ex.get("stoppedAt"))
-            failed = sum(1 for ex in executions if ex.get("stoppedAt"))
-            running = sum(1 for ex in executions if not ex.get("finished") and not ex.get("stoppedAt"))
-            
-            return {
-                "total_executions": total_executions,
-                "successful": successful,
-                "failed": failed,
-                "running": running,
-                "success_rate": (successful / total_executions * 100) if total_executions > 0 else 0
-            }
+            if self.stats_store is not None:
+                return await self.stats_store.statistics(self, workflow_id, window_days)
+            executions = await self.get_executions(workflow_id, limit=STATISTICS_EXECUTIONS)
+            return execution_statistics(executions)
         except Exception as e:
             return {
                 "total_executions": 0,
@@ -208,9 +428,21 @@ class N8NService:
     async def analyze_workflow_for_ai(self, workflow_id: str) -> Dict[str, Any]:
         """Analyze workflow and prepare data for AI processing"""
         try:
-            workflow = await self.get_workflow(workflow_id)
-            stats = await self.get_workflow_statistics(workflow_id)
-            recent_executions = await self.get_executions(workflow_id, limit=5)
+            if self.stats_store is not None:
+                # All-time numbers come from the store; the page is only for the most recent runs
+                workflow, recent_executions, stats = await asyncio.gather(
+                    self.get_workflow(workflow_id),
+                    self.get_executions(workflow_id, limit=RECENT_EXECUTIONS),
+                    self.stats_store.statistics(self, workflow_id)
+                )
+            else:
+                # One execution page serves both the statistics and the most recent runs
+                workflow, executions = await asyncio.gather(
+                    self.get_workflow(workflow_id),
+                    self.get_executions(workflow_id, limit=STATISTICS_EXECUTIONS)
+                )
+                stats = execution_statistics(executions)
+                recent_executions = executions[:RECENT_EXECUTIONS]
             
             # Extract key information for AI analysis
             analysis = {
@@ -267,4 +499,37 @@ class N8NService:
             if not node.get("name"):
                 validation_result["warnings"].append(f"Node {i} is missing name")
         
-        return validation_result
\ No newline at end of file
+        return validation_result
+
+def create_shared_service() -> N8NService:
+    """N8N service backed by the local workflow catalog and execution stats store when they are enabled"""
+    service = N8NService()
+    if workflow_catalog.enabled:
+        service.catalog = workflow_catalog
+    if execution_stats.enabled:
+        service.stats_store = execution_stats
+    return service
+
+# Shared app-lifetime service, created in the lifespan hook
+_n8n_service: Optional[N8NService] = None
+
+async def init_n8n_service() -> N8NService:
+    """Create the shared N8N service and its pooled HTTP client"""
+    global _n8n_service
+    if _n8n_service is None:
+        _n8n_service = create_shared_service()
+    return _n8n_service
+
+async def close_n8n_service():
+    """Close the shared N8N service at shutdown"""
+    global _n8n_service
+    if _n8n_service is not None:
+        await _n8n_service.close()
+        _n8n_service = None
+
+def get_n8n_service() -> N8NService:
+    """Dependency to get the shared N8N service"""
+    global _n8n_service
+    if _n8n_service is None:
+        _n8n_service = create_shared_service()
+    return _n8n_service
@@ -0,0 +1,86 @@
+"""
+Provider Health Monitor for N8N-Sensei - Cached AI provider status kept warm in the background
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, Optional
+from config import settings
+
+class ProviderHealthMonitor:
+    """TTL'd in-memory provider status table refreshed by a background task"""
+
+    def __init__(self, ttl_seconds: float = None, refresh_interval: float = None):
+        self.ttl_seconds = ttl_seconds or settings.AI_HEALTH_TTL_SECONDS
+        self.refresh_interval = refresh_interval or settings.AI_HEALTH_REFRESH_INTERVAL
+        self.statuses: Dict[str, bool] = {}
+        self.checked_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        """Whether the cached statuses are younger than the TTL"""
+        return self.checked_at is not None and time.monotonic() - self.checked_at < self.ttl_seconds
+
+    async def _probe(self) -> Dict[str, bool]:
+        """Run one concurrent probe of every provider and store the results"""
+        from services.ai_service import AIService  # imported here to avoid an import cycle
+
+        statuses = await AIService().check_all_providers()
+        self.statuses = statuses
+        self.checked_at = time.monotonic()
+        return statuses
+
+    def refresh(self) -> asyncio.Task:
+        """Start a probe, or join the one already in flight"""
+        task = self._refreshing
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._refreshing = asyncio.create_task(self._probe())
+        return self._refreshing
+
+    async def get_statuses(self) -> Dict[str, bool]:
+        """Get provider statuses, never waiting on probes once the table is populated"""
+        if self.checked_at is None:
+            return await asyncio.shield(self.refresh())
+        if not self.is_fresh():
+            # Serve the last known state and revalidate in the background
+            self.refresh()
+        return dict(self.statuses)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cached statuses with their age, for status endpoints"""
+        age = time.monotonic() - self.checked_at if self.checked_at is not None else None
+        return {
+            "providers": dict(self.statuses),
+            "age_seconds": round(age, 3) if age is not None else None,
+            "stale": not self.is_fresh()
+        }
+
+    async def _refresh_loop(self):
+        """Keep the status table warm"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start the background refresher"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresher"""
+        for task in (self._refresher, self._refreshing):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresher = None
+        self._refreshing = None
+
+
+provider_health = ProviderHealthMonitor()
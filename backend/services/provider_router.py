@@ -0,0 +1,133 @@
+"""
+Provider Router for N8N-Sensei - Latency-aware AI provider selection for AIProvider.AUTO
+"""
+
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+from config import settings
+from models import AIProvider
+
+class ProviderStats:
+    """EWMA latency and error rate of one provider, learned from real calls"""
+
+    def __init__(self, window: int = 200):
+        self.ewma_latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.error_rate_at = time.monotonic()
+        self.calls = 0
+        self.failures = 0
+        self.last_call_at: Optional[float] = None
+        # Recent raw samples for tail percentiles, which an EWMA cannot give
+        self.latencies: "deque[float]" = deque(maxlen=window)
+        self.first_token_latencies: "deque[float]" = deque(maxlen=window)
+
+    def current_error_rate(self, half_life: float) -> float:
+        """Error rate decayed toward zero since it was last updated, so a provider that
+        stopped getting traffic after failing is tried again"""
+        elapsed = time.monotonic() - self.error_rate_at
+        return self.error_rate * 0.5 ** (elapsed / half_life) if half_life > 0 else self.error_rate
+
+    def record(self, latency_ms: float, ok: bool, alpha: float, half_life: float):
+        self.calls += 1
+        self.last_call_at = time.time()
+        if not ok:
+            self.failures += 1
+        # Failed calls only say the provider is unhealthy, not how fast it is
+        if ok:
+            self.latencies.append(latency_ms)
+            if self.ewma_latency_ms is None:
+                self.ewma_latency_ms = latency_ms
+            else:
+                self.ewma_latency_ms = alpha * latency_ms + (1 - alpha) * self.ewma_latency_ms
+        self.error_rate = alpha * (0.0 if ok else 1.0) + (1 - alpha) * self.current_error_rate(half_life)
+        self.error_rate_at = time.monotonic()
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile of a non-empty sample"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ProviderRouter:
+    """Ranks providers by expected latency, penalizing recent errors"""
+
+    def __init__(self, alpha: float = None, error_half_life: float = None):
+        self.alpha = alpha or settings.AI_ROUTER_EWMA_ALPHA
+        self.error_half_life = error_half_life or settings.AI_ROUTER_ERROR_HALF_LIFE_SECONDS
+        self.stats: Dict[AIProvider, ProviderStats] = {
+            provider: ProviderStats() for provider in AIProvider if provider != AIProvider.AUTO
+        }
+
+    def record(self, provider: AIProvider, latency_ms: float, ok: bool):
+        """Feed the outcome of a real provider call into its statistics"""
+        if provider in self.stats:
+            self.stats[provider].record(latency_ms, ok, self.alpha, self.error_half_life)
+
+    def record_first_token(self, provider: AIProvider, latency_ms: float):
+        """Feed the time to first streamed token of a provider call"""
+        if provider in self.stats:
+            self.stats[provider].first_token_latencies.append(latency_ms)
+
+    def error_rate(self, provider: AIProvider) -> float:
+        return self.stats[provider].current_error_rate(self.error_half_life)
+
+    def hedge_delay(self, provider: AIProvider, first_token: bool = False) -> float:
+        """Seconds to wait on a provider before hedging, from its recent latency percentile"""
+        stats = self.stats[provider]
+        samples = stats.first_token_latencies if first_token else stats.latencies
+        if len(samples) < settings.AI_HEDGE_MIN_SAMPLES:
+            delay_ms = settings.AI_HEDGE_DEFAULT_DELAY_MS
+        else:
+            delay_ms = percentile(samples, settings.AI_HEDGE_PERCENTILE)
+        return max(delay_ms, settings.AI_HEDGE_MIN_DELAY_MS) / 1000
+
+    def is_configured(self, provider: AIProvider) -> bool:
+        """Cloud providers need an API key; local providers are always candidates"""
+        if provider == AIProvider.OPENAI:
+            return bool(settings.OPENAI_API_KEY)
+        if provider == AIProvider.ANTHROPIC:
+            return bool(settings.ANTHROPIC_API_KEY)
+        if provider == AIProvider.OPENROUTER:
+            return bool(settings.OPENROUTER_API_KEY)
+        return True
+
+    def is_healthy(self, provider: AIProvider, statuses: Dict[str, bool]) -> bool:
+        """Healthy unless the health probe says it is down or it has been failing"""
+        if statuses.get(provider.value) is False:
+            return False
+        return self.error_rate(provider) < settings.AI_ROUTER_MAX_ERROR_RATE
+
+    def score(self, provider: AIProvider) -> float:
+        """Expected latency in ms, inflated by the recent error rate"""
+        stats = self.stats[provider]
+        latency = stats.ewma_latency_ms if stats.ewma_latency_ms is not None else settings.AI_ROUTER_DEFAULT_LATENCY_MS
+        return latency * (1 + settings.AI_ROUTER_ERROR_PENALTY * self.error_rate(provider))
+
+    def candidates(self, statuses: Optional[Dict[str, bool]] = None) -> List[AIProvider]:
+        """Configured providers, healthy ones first, each group ordered by score"""
+        statuses = statuses or {}
+        configured = [provider for provider in self.stats if self.is_configured(provider)]
+        healthy = sorted((p for p in configured if self.is_healthy(p, statuses)), key=self.score)
+        unhealthy = sorted((p for p in configured if not self.is_healthy(p, statuses)), key=self.score)
+        return healthy + unhealthy
+
+    def routing_table(self, statuses: Optional[Dict[str, bool]] = None) -> List[Dict[str, Any]]:
+        """Current routing order with the statistics behind it"""
+        statuses = statuses or {}
+        return [
+            {
+                "provider": provider.value,
+                "rank": rank,
+                "healthy": self.is_healthy(provider, statuses),
+                "score_ms": round(self.score(provider), 1),
+                "ewma_latency_ms": round(self.stats[provider].ewma_latency_ms, 1)
+                if self.stats[provider].ewma_latency_ms is not None else None,
+                "error_rate": round(self.error_rate(provider), 3),
+                "calls": self.stats[provider].calls,
+                "failures": self.stats[provider].failures
+            }
+            for rank, provider in enumerate(self.candidates(statuses), start=1)
+        ]
+
+
+provider_router = ProviderRouter()
@@ -0,0 +1,164 @@
+"""
+Quota Manager for N8N-Sensei - In-memory API quota accounting flushed to the users table in batches
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import update, select, bindparam, func
+from config import settings
+from database import AsyncSessionLocal, User
+from services.metrics import metrics
+
+class QuotaExceeded(Exception):
+    """Raised when a user has used up their API quota"""
+
+    def __init__(self, user_id: str, used: int, limit: int):
+        super().__init__(f"API quota exceeded ({used}/{limit})")
+        self.user_id = user_id
+        self.used = used
+        self.limit = limit
+
+@dataclass
+class QuotaEntry:
+    used: int  # last value read from the database, including other workers' usage
+    limit: Optional[int]
+    pending: int = 0  # charged here but not written yet
+    flushing: int = 0  # being written by the current flush
+    last_used: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.used + self.pending + self.flushing
+
+class QuotaManager:
+    """Per-user counters checked in memory and written as relative UPDATEs so workers never overwrite each other"""
+
+    def __init__(self, session_factory=None, flush_interval: float = None, idle_seconds: float = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.flush_interval = flush_interval or settings.QUOTA_FLUSH_INTERVAL
+        self.idle_seconds = idle_seconds or settings.QUOTA_IDLE_SECONDS
+        self.entries: Dict[str, QuotaEntry] = {}
+        self.persist = True  # write usage to the users table; off, counters stay in memory
+        # Called with (user_id, used, limit) for every user re-read by a flush, whose bulk UPDATE skips ORM events
+        self.flush_listeners: List[Callable[[str, int, Optional[int]], None]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _entry(self, user: User) -> QuotaEntry:
+        entry = self.entries.get(user.id)
+        if entry is None:
+            entry = QuotaEntry(used=user.api_quota_used or 0, limit=user.api_quota_limit)
+            self.entries[user.id] = entry
+        return entry
+
+    def consume(self, user: User, amount: int = 1):
+        """Charge a call to the user's quota, raising QuotaExceeded when it is used up"""
+        entry = self._entry(user)
+        entry.last_used = time.monotonic()
+        if entry.limit is not None and entry.total + amount > entry.limit:
+            metrics.inc("quota_rejected_total")
+            raise QuotaExceeded(user.id, entry.total, entry.limit)
+        entry.pending += amount
+        metrics.inc("quota_consumed_total", amount)
+
+    def refund(self, user_id: str, amount: int = 1):
+        """Give back a charge for a call that produced no answer"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            # Not charged by this worker, e.g. a job charged before a restart
+            return
+        # May go below zero if the charge was already flushed; the next flush writes it as a negative delta
+        entry.pending -= amount
+        metrics.inc("quota_refunded_total", amount)
+
+    def usage(self, user: User) -> Tuple[int, Optional[int]]:
+        """Current (used, limit) including increments not written yet"""
+        entry = self.entries.get(user.id)
+        if entry is None:
+            return user.api_quota_used or 0, user.api_quota_limit
+        return entry.total, entry.limit
+
+    async def flush(self):
+        """Write pending increments in one batch and refresh every tracked user from the database"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self.entries:
+                return
+            batch = []
+            for user_id, entry in self.entries.items():
+                if entry.pending:
+                    entry.flushing, entry.pending = entry.pending, 0
+                    batch.append({"user_id": user_id, "delta": entry.flushing})
+
+            try:
+                async with self.session_factory() as db:
+                    conn = await db.connection()
+                    if batch:
+                        users = User.__table__
+                        await conn.execute(
+                            update(users)
+                            .where(users.c.id == bindparam("user_id"))
+                            .values(api_quota_used=func.coalesce(users.c.api_quota_used, 0) + bindparam("delta")),
+                            batch
+                        )
+                    rows = (await conn.execute(
+                        select(User.id, User.api_quota_used, User.api_quota_limit)
+                        .where(User.id.in_(list(self.entries)))
+                    )).all()
+                    await db.commit()
+            except Exception as e:
+                for item in batch:
+                    entry = self.entries[item["user_id"]]
+                    entry.pending += entry.flushing
+                    entry.flushing = 0
+                print(f"❌ Quota flush failed, will retry: {e}")
+                return
+
+            for user_id, used, limit in rows:
+                entry = self.entries[user_id]
+                entry.used, entry.limit, entry.flushing = used or 0, limit, 0
+                for listener in self.flush_listeners:
+                    listener(user_id, used or 0, limit)
+            metrics.inc("quota_flushes_total")
+            metrics.inc("quota_rows_flushed_total", len(batch))
+
+            idle_before = time.monotonic() - self.idle_seconds
+            for user_id in [user_id for user_id, entry in self.entries.items() if not entry.pending and entry.last_used < idle_before]:
+                del self.entries[user_id]
+            metrics.set_gauge("quota_tracked_users", len(self.entries))
+
+    async def _flush_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Quota flush failed: {e}")
+
+    def start(self):
+        """Start the background flusher"""
+        if not self.persist:
+            return
+        self._flush_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flusher and write out pending increments"""
+        if self._flusher is not None:
+            self._stopping.set()
+            await self._flusher
+            self._flusher = None
+        if self.persist:
+            await self.flush()
+
+
+quota_manager = QuotaManager()
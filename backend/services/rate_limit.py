@@ -0,0 +1,155 @@
+"""
+Rate Limit Stores for N8N-Sensei - Token buckets kept in memory, SQLite or Redis
+"""
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Tuple
+from config import settings
+
+def refill(tokens: float, updated_at: float, capacity: float, rate: float, now: float) -> float:
+    """Tokens in a bucket after refilling it for the time since its last update"""
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+class BucketStore(ABC):
+    """Interface for token bucket storage"""
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, rate: float, now: float) -> bool:
+        """Take one token from a bucket holding up to capacity tokens refilled at rate per second"""
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+class MemoryBucketStore(BucketStore):
+    """Per-process buckets in recency order; buckets that have refilled completely are evicted"""
+
+    def __init__(self):
+        # key -> (tokens, updated_at, full_at)
+        self.buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> bool:
+        with self.lock:
+            self._evict_idle(now)
+            bucket = self.buckets.pop(key, None)
+            tokens = refill(bucket[0], bucket[1], capacity, rate, now) if bucket else capacity
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return allowed
+
+    def _evict_idle(self, now: float):
+        # A full bucket behaves exactly like a missing one, so dropping it loses nothing
+        while self.buckets:
+            key, (_, _, full_at) = next(iter(self.buckets.items()))
+            if full_at > now:
+                break
+            del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in a SQLite file, shared by every worker on one host"""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> bool:
+        with closing(self._connect()) as conn:
+            # The write lock up front makes read-modify-write atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = refill(row[0], row[1], capacity, rate, now) if row else capacity
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (capacity - tokens) / rate)
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed
+
+    def clear(self):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM rate_limit_buckets")
+
+class RedisBucketStore(BucketStore):
+    """Buckets in Redis or any server speaking its protocol; keys expire once their bucket is full"""
+
+    TAKE_SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = capacity
+    if bucket[1] then
+        tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+    end
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1)
+    return allowed
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> bool:
+        return bool(self.take_script(keys=[f"ratelimit:{key}"], args=[capacity, rate, now]))
+
+    def clear(self):
+        for key in self.client.scan_iter("ratelimit:*"):
+            self.client.delete(key)
+
+def build_bucket_store() -> BucketStore:
+    """Build the configured store, falling back to memory when it is unavailable"""
+    if settings.RATE_LIMIT_STORE == "redis":
+        try:
+            return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+        except Exception as e:
+            print(f"⚠️ Redis rate limit store unavailable, limits are per process: {e}")
+    elif settings.RATE_LIMIT_STORE == "sqlite":
+        try:
+            return SQLiteBucketStore(settings.RATE_LIMIT_SQLITE_PATH)
+        except Exception as e:
+            print(f"⚠️ SQLite rate limit store unavailable, limits are per process: {e}")
+    return MemoryBucketStore()
+
+
+bucket_store = build_bucket_store()
@@ -0,0 +1,178 @@
+"""
+Response Cache for N8N-Sensei - Exact-match cache for AI chat completions
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, List, Optional, Tuple
+from config import settings
+
+def cache_key(
+    provider: str,
+    model: str,
+    temperature: float,
+    system_prompt: str,
+    message: str,
+    extra: Optional[Any] = None
+) -> str:
+    """Hash everything that determines a completion into a cache key"""
+    material = json.dumps(
+        [provider, model, temperature, system_prompt, message, extra],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class CacheBackend(ABC):
+    """Interface for response cache storage tiers"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, expires_at) for a live entry"""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float):
+        pass
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU tier bounded by the total size of cached responses"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return value, expires_at
+
+    async def set(self, key: str, value: str, ttl: float):
+        if ttl <= 0:
+            return
+        size = len(key) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (value, time.time() + ttl, size)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    async def clear(self):
+        self.entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.size_bytes -= size
+
+class SQLiteCacheBackend(CacheBackend):
+    """Optional on-disk tier that survives restarts and is shared by workers on one host"""
+
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _get(self, key: str) -> Optional[Tuple[str, float]]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _set(self, key: str, value: str, ttl: float):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM response_cache")
+
+    async def get(self, key: str) -> Optional[Tuple[str, float]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+class ResponseCache:
+    """Tiered response cache: the first tier is checked first and warmed from the others"""
+
+    def __init__(self, backends: List[CacheBackend]):
+        self.backends = backends
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        for index, backend in enumerate(self.backends):
+            try:
+                entry = await backend.get(key)
+            except Exception:
+                continue
+            if entry is not None:
+                value, expires_at = entry
+                self.hits += 1
+                for upper in self.backends[:index]:
+                    await upper.set(key, value, expires_at - time.time())
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: float):
+        if ttl <= 0:
+            return
+        for backend in self.backends:
+            try:
+                await backend.set(key, value, ttl)
+            except Exception:
+                pass
+
+    async def clear(self):
+        for backend in self.backends:
+            await backend.clear()
+
+def build_response_cache() -> ResponseCache:
+    """Build the response cache tiers from settings"""
+    backends: List[CacheBackend] = [MemoryCacheBackend(settings.AI_CACHE_MAX_BYTES)]
+    if settings.AI_CACHE_SQLITE_PATH:
+        backends.append(SQLiteCacheBackend(settings.AI_CACHE_SQLITE_PATH))
+    return ResponseCache(backends)
+
+
+response_cache = build_response_cache()
@@ -0,0 +1,168 @@
+"""
+Semantic Cache for N8N-Sensei - Answers near-duplicate chat prompts from earlier responses
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from config import settings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _stable_hash(text: str) -> int:
+    """Process-independent 64-bit hash (the builtin hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+class HashingVectorizer:
+    """Pure NumPy feature-hashing embedder over words, word bigrams and character trigrams"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                hashed = _stable_hash(feature)
+                sign = 1.0 if hashed & 1 else -1.0
+                vectors[row, (hashed >> 1) % self.dim] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, loaded from the local model cache only"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu", local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+def build_embedder():
+    """Use the configured local model when it is installed, otherwise the hashing fallback"""
+    if settings.AI_SEMANTIC_CACHE_MODEL:
+        try:
+            return SentenceTransformerEmbedder(settings.AI_SEMANTIC_CACHE_MODEL)
+        except Exception:
+            pass
+    return HashingVectorizer(settings.AI_SEMANTIC_CACHE_DIM)
+
+class SemanticCache:
+    """Embedding cache backed by one contiguous float32 matrix with LRU-by-size eviction"""
+
+    def __init__(self, embedder=None, threshold: float = None, max_bytes: int = None, initial_capacity: int = 64):
+        self.embedder = embedder or build_embedder()
+        self.threshold = threshold if threshold is not None else settings.AI_SEMANTIC_CACHE_THRESHOLD
+        self.max_bytes = max_bytes or settings.AI_SEMANTIC_CACHE_MAX_BYTES
+        self.dim = self.embedder.dim
+
+        self.vectors = np.zeros((initial_capacity, self.dim), dtype=np.float32)
+        self.scopes = np.zeros(initial_capacity, dtype=np.uint64)
+        self.expires_at = np.zeros(initial_capacity, dtype=np.float64)  # 0 marks a free slot
+        self.responses: List[Optional[str]] = [None] * initial_capacity
+        self.free_slots: List[int] = list(range(initial_capacity - 1, -1, -1))
+        self.lru: "OrderedDict[int, int]" = OrderedDict()  # slot -> size in bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _entry_size(self, prompt: str, response: str) -> int:
+        return self.dim * 4 + len(prompt.encode("utf-8")) + len(response.encode("utf-8"))
+
+    def _grow(self):
+        capacity = len(self.responses)
+        self.vectors = np.vstack([self.vectors, np.zeros((capacity, self.dim), dtype=np.float32)])
+        self.scopes = np.concatenate([self.scopes, np.zeros(capacity, dtype=np.uint64)])
+        self.expires_at = np.concatenate([self.expires_at, np.zeros(capacity, dtype=np.float64)])
+        self.responses.extend([None] * capacity)
+        self.free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _evict(self, slot: int):
+        self.size_bytes -= self.lru.pop(slot)
+        self.expires_at[slot] = 0.0
+        self.responses[slot] = None
+        self.free_slots.append(slot)
+
+    def _evict_expired(self, now: float):
+        """Free every slot whose entry has expired, so dead rows never count against max_bytes"""
+        for slot in np.flatnonzero((self.expires_at > 0) & (self.expires_at <= now)):
+            self._evict(int(slot))
+
+    def _lookup(self, scope: str, prompt: str) -> Optional[Tuple[str, float]]:
+        if not self.lru:
+            return None
+        query = self.embedder.embed([prompt])[0]
+        with self.lock:
+            self._evict_expired(time.time())
+            similarities = self.vectors @ query
+            live = (self.scopes == np.uint64(_stable_hash(scope))) & (self.expires_at > 0)
+            similarities[~live] = -1.0
+
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.threshold:
+                return None
+            self.lru.move_to_end(slot)
+            return self.responses[slot], similarity
+
+    def _store(self, scope: str, prompt: str, response: str, ttl: float):
+        size = self._entry_size(prompt, response)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        vector = self.embedder.embed([prompt])[0]
+        with self.lock:
+            now = time.time()
+            self._evict_expired(now)
+            while self.lru and self.size_bytes + size > self.max_bytes:
+                self._evict(next(iter(self.lru)))
+            if not self.free_slots:
+                self._grow()
+
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.scopes[slot] = np.uint64(_stable_hash(scope))
+            self.expires_at[slot] = now + ttl
+            self.responses[slot] = response
+            self.lru[slot] = size
+            self.size_bytes += size
+
+    async def lookup(self, scope: str, prompt: str) -> Optional[Tuple[str, float]]:
+        """Find a cached response for a prompt in the same scope above the similarity threshold"""
+        result = await asyncio.to_thread(self._lookup, scope, prompt)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def store(self, scope: str, prompt: str, response: str, ttl: float):
+        """Remember a response for later near-duplicate prompts"""
+        await asyncio.to_thread(self._store, scope, prompt, response, ttl)
+
+    def clear(self):
+        with self.lock:
+            for slot in list(self.lru):
+                self._evict(slot)
+
+
+semantic_cache: Optional[SemanticCache] = SemanticCache() if settings.AI_SEMANTIC_CACHE_ENABLED else None
@@ -0,0 +1,280 @@
+"""
+Workflow Catalog for N8N-Sensei - Local mirror of N8N workflows synced incrementally by updatedAt
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from config import settings
+from database import AsyncSessionLocal
+from database_models import Workflow
+from services.metrics import metrics
+
+# Enough to decide what changed without pulling nodes and connections for every workflow
+SUMMARY_FIELDS = ["id", "name", "active", "tags", "createdAt", "updatedAt"]
+SYNC_PAGE_SIZE = 250
+SYNC_CONCURRENCY = 8
+SYNC_RETRY_SECONDS = 5.0  # minimum gap between on-demand syncs after a failure
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """N8N ISO timestamp as naive UTC, matching the other DateTime columns"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def tag_names(tags: Optional[List[Any]]) -> str:
+    names = [(tag.get("name") if isinstance(tag, dict) else tag) for tag in tags or []]
+    return "|" + "|".join(str(name).lower() for name in names if name) + "|"
+
+class WorkflowCatalog:
+    """Workflow mirror in the workflows table, refreshed in the background and on our own writes
+
+    Each row keeps the workflow exactly as N8N returned it in n8n_data; the other catalog
+    columns only exist to filter and order in SQL.
+    """
+
+    def __init__(self, session_factory=None, sync_interval: float = None, max_staleness: float = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.sync_interval = sync_interval or settings.WORKFLOW_CATALOG_SYNC_INTERVAL
+        self.max_staleness = max_staleness or settings.WORKFLOW_CATALOG_MAX_STALENESS
+        self.enabled = settings.WORKFLOW_CATALOG_ENABLED
+        self.synced_at: Optional[float] = None
+        self.failed_at: Optional[float] = None
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._wake = asyncio.Event()
+        self._syncer: Optional[asyncio.Task] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        """Whether the last successful sync is within the freshness bound"""
+        return self.synced_at is not None and time.monotonic() - self.synced_at < self.max_staleness
+
+    def _row_values(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "n8n_workflow_id": str(workflow["id"]),
+            "n8n_data": workflow,
+            "name": workflow.get("name") or "",
+            "status": "active" if workflow.get("active") else "inactive",
+            "tag_names": tag_names(workflow.get("tags")),
+            "created_at": parse_timestamp(workflow.get("createdAt")) or datetime.utcnow(),
+            "n8n_updated_at": parse_timestamp(workflow.get("updatedAt")),
+            "synced_at": datetime.utcnow(),
+        }
+
+    async def _store(self, workflows: List[Dict[str, Any]]):
+        """Insert or update full workflows in one transaction"""
+        if not workflows:
+            return
+        async with self.session_factory() as db:
+            ids = [str(workflow["id"]) for workflow in workflows]
+            existing = {
+                row.n8n_workflow_id: row
+                for row in (await db.execute(select(Workflow).where(Workflow.n8n_workflow_id.in_(ids)))).scalars()
+            }
+            for workflow in workflows:
+                values = self._row_values(workflow)
+                row = existing.get(values["n8n_workflow_id"])
+                if row is None:
+                    db.add(Workflow(**values))
+                else:
+                    for name, value in values.items():
+                        setattr(row, name, value)
+            await db.commit()
+
+    async def _list_upstream(self, n8n_service) -> List[Dict[str, Any]]:
+        """Summaries of every workflow in N8N, following its pages until the reported count is reached"""
+        summaries: Dict[str, Dict[str, Any]] = {}
+        while True:
+            page, count = await n8n_service._fetch_workflows({
+                "select": json.dumps(SUMMARY_FIELDS), "skip": len(summaries), "take": SYNC_PAGE_SIZE
+            })
+            if count is None:
+                # Older versions ignore paging and return every workflow at once
+                return page
+            for summary in page:
+                summaries[str(summary["id"])] = summary
+            if len(summaries) >= count:
+                return list(summaries.values())
+            if not page:
+                # Deleting on a short listing would drop workflows that still exist
+                raise Exception(f"Workflow listing ended at {len(summaries)} of {count}")
+    
+    async def sync(self, n8n_service) -> int:
+        """Fetch workflow summaries, then full bodies only for workflows whose updatedAt changed"""
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        async with self._sync_lock:
+            # Raises unless the listing is complete, so removals below never see a partial one
+            summaries = await self._list_upstream(n8n_service)
+            async with self.session_factory() as db:
+                rows = (await db.execute(
+                    select(Workflow.n8n_workflow_id, Workflow.n8n_updated_at, Workflow.n8n_data.is_(None))
+                )).all()
+            known = {workflow_id: updated_at for workflow_id, updated_at, _ in rows}
+            # Rows written before the full N8N JSON was kept are fetched again
+            incomplete = {workflow_id for workflow_id, _, missing in rows if missing}
+
+            changed = [
+                summary for summary in summaries
+                if str(summary["id"]) not in known
+                or str(summary["id"]) in incomplete
+                or known[str(summary["id"])] != parse_timestamp(summary.get("updatedAt"))
+            ]
+            slots = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+            async def full(summary: Dict[str, Any]) -> Dict[str, Any]:
+                # Versions that ignore select already sent the whole workflow
+                if "nodes" in summary:
+                    return summary
+                async with slots:
+                    return await n8n_service._fetch_workflow(str(summary["id"]))
+
+            await self._store(list(await asyncio.gather(*(full(summary) for summary in changed))))
+
+            upstream = {str(summary["id"]) for summary in summaries}
+            removed = [workflow_id for workflow_id in known if workflow_id not in upstream]
+            if removed:
+                async with self.session_factory() as db:
+                    await db.execute(delete(Workflow).where(Workflow.n8n_workflow_id.in_(removed)))
+                    await db.commit()
+
+            self.synced_at = time.monotonic()
+            self.failed_at = None
+            metrics.inc("workflow_catalog_syncs_total")
+            metrics.inc("workflow_catalog_changed_total", len(changed) + len(removed))
+            return len(changed) + len(removed)
+
+    def _retrying_too_soon(self) -> bool:
+        return self.failed_at is not None and time.monotonic() - self.failed_at < SYNC_RETRY_SECONDS
+    
+    async def _sync_logged(self, n8n_service) -> bool:
+        try:
+            await self.sync(n8n_service)
+            return True
+        except Exception as e:
+            self.failed_at = time.monotonic()
+            print(f"⚠️ Workflow catalog sync failed: {e}")
+            return False
+    
+    def _request_sync(self, n8n_service):
+        """Have the background task sync now, or start a one-off sync when it is not running"""
+        if self._retrying_too_soon():
+            return
+        if self._syncer is not None and not self._syncer.done():
+            self._wake.set()
+        elif self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self._sync_logged(n8n_service))
+    
+    async def ensure_fresh(self, n8n_service) -> bool:
+        """Whether reads can be served locally; False means callers should go to N8N
+        
+        Within max_staleness the catalog is served, and once it is older than the sync
+        interval a background sync is requested. Past max_staleness, or before the first
+        sync, reads wait for a sync and go to N8N if it fails.
+        """
+        if self.is_fresh():
+            if time.monotonic() - self.synced_at >= self.sync_interval:
+                self._request_sync(n8n_service)
+            return True
+        if self._retrying_too_soon():
+            return False
+        return await self._sync_logged(n8n_service)
+
+    async def upsert(self, workflow: Dict[str, Any]):
+        """Mirror a workflow we just created, updated or fetched"""
+        await self._store([workflow])
+
+    async def remove(self, workflow_id: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(Workflow).where(Workflow.n8n_workflow_id == workflow_id))
+            await db.commit()
+
+    async def set_active(self, workflow_id: str, active: bool):
+        """Reflect activation now; the next sync picks up N8N's new updatedAt"""
+        async with self.session_factory() as db:
+            row = (await db.execute(select(Workflow).where(Workflow.n8n_workflow_id == workflow_id))).scalar_one_or_none()
+            if row is not None:
+                row.status = "active" if active else "inactive"
+                row.n8n_data = {**(row.n8n_data or {}), "active": active}
+                await db.commit()
+
+    async def get(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """The workflow as N8N last returned it"""
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(Workflow.n8n_data).where(Workflow.n8n_workflow_id == workflow_id, Workflow.n8n_data.isnot(None))
+            )).scalar_one_or_none()
+
+    async def list_workflows(
+        self,
+        active: Optional[bool] = None,
+        tag: Optional[str] = None,
+        select_fields: Optional[List[str]] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """One page of workflows and the offset of the next page, filtered and paged in SQL"""
+        query = select(Workflow.n8n_data).where(Workflow.n8n_data.isnot(None))
+        if active is not None:
+            query = query.where(Workflow.status == ("active" if active else "inactive"))
+        if tag:
+            query = query.where(Workflow.tag_names.contains(f"|{tag.lower()}|", autoescape=True))
+        query = query.order_by(Workflow.name, Workflow.n8n_workflow_id).offset(offset).limit(limit + 1)
+
+        async with self.session_factory() as db:
+            rows = list((await db.execute(query)).scalars())
+        if select_fields:
+            rows = [{field: value for field, value in row.items() if field == "id" or field in select_fields} for row in rows]
+        if len(rows) > limit:
+            return rows[:limit], offset + limit
+        return rows, None
+
+    async def count(self) -> int:
+        async with self.session_factory() as db:
+            return (await db.execute(
+                select(func.count()).select_from(Workflow).where(Workflow.n8n_data.isnot(None))
+            )).scalar_one()
+
+    async def _sync_loop(self, n8n_service):
+        while True:
+            await self._sync_logged(n8n_service)
+            # Reads that found the catalog stale while this sync ran are served by it
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, n8n_service):
+        """Start the background sync"""
+        if not self.enabled:
+            return
+        self._sync_lock = asyncio.Lock()
+        if self._syncer is None or self._syncer.done():
+            self._syncer = asyncio.create_task(self._sync_loop(n8n_service))
+
+    async def stop(self):
+        """Stop the background sync"""
+        for task in (self._syncer, self._refresh):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._syncer = self._refresh = None
+
+
+workflow_catalog = WorkflowCatalog()
@@ -0,0 +1,115 @@
+"""
+Write-Behind Writer for N8N-Sensei - Batches request-path inserts into multi-row transactions
+"""
+
+import asyncio
+import uuid
+from typing import Any, List, Optional, Type
+from config import settings
+from database import AsyncSessionLocal
+from services.metrics import metrics
+
+class WriteBehindWriter:
+    """Bounded buffer of ORM rows flushed by size or time from a background task"""
+
+    def __init__(self, session_factory=None, batch_size: int = None, flush_interval: float = None, max_buffer: int = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.WRITE_BEHIND_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.WRITE_BEHIND_MAX_BUFFER
+        self.buffer: List[Any] = []
+        self.flushing: List[Any] = []  # taken from the buffer but not committed yet
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def _ensure_primitives(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+
+    async def add(self, row: Any):
+        """Queue a new row for insertion, flushing inline when the buffer is full"""
+        self._ensure_primitives()
+        # Assign the primary key now so buffered rows can be read back and deduplicated
+        if getattr(row, "id", None) is None:
+            row.id = str(uuid.uuid4())
+        while len(self.buffer) >= self.max_buffer:
+            metrics.inc("write_behind_backpressure_total")
+            await self.flush()
+        self.buffer.append(row)
+        metrics.set_gauge("write_behind_buffered", len(self.buffer))
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self, model: Type, **filters) -> List[Any]:
+        """Rows of a model that are buffered or being flushed, for read-your-writes"""
+        return [
+            row for row in self.flushing + self.buffer
+            if isinstance(row, model) and all(getattr(row, name) == value for name, value in filters.items())
+        ]
+
+    async def _write(self, rows: List[Any]):
+        async with self.session_factory() as db:
+            db.add_all(rows)
+            await db.commit()
+
+    async def flush(self):
+        """Insert everything buffered so far in one transaction"""
+        self._ensure_primitives()
+        async with self._flush_lock:
+            if not self.buffer:
+                return
+            self.flushing, self.buffer = self.buffer, []
+            metrics.set_gauge("write_behind_buffered", 0)
+            try:
+                await self._write(self.flushing)
+                metrics.inc("write_behind_rows_total", len(self.flushing))
+            except Exception as e:
+                # One bad row must not take the rest of the batch down with it
+                print(f"❌ Write-behind batch of {len(self.flushing)} rows failed, retrying one by one: {e}")
+                for row in self.flushing:
+                    try:
+                        await self._write([row])
+                        metrics.inc("write_behind_rows_total")
+                    except Exception as row_error:
+                        metrics.inc("write_behind_dropped_total")
+                        print(f"❌ Dropped {type(row).__name__} {row.id}: {row_error}")
+            finally:
+                self.flushing = []
+            metrics.inc("write_behind_flushes_total")
+
+    async def _flush_loop(self):
+        """Flush when a batch fills up or the flush interval passes"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Write-behind flush failed: {e}")
+
+    def start(self):
+        """Start the background flusher"""
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the background flusher and write out whatever is still buffered"""
+        if self._flusher is not None:
+            # Let an in-progress flush commit instead of cancelling it halfway
+            self._stopping = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+
+
+write_behind = WriteBehindWriter()
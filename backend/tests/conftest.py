@@ -8,11 +8,16 @@ import asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from main import app
-from database import get_db, Base
+from database import get_db, get_async_db, Base
 from config import Settings
+from services.write_behind import write_behind
+from services.quota import quota_manager
+from services.workflow_catalog import workflow_catalog
+from services.execution_stats import execution_stats
 
 # Test database setup
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -31,7 +36,23 @@ def override_get_db():
     finally:
         db.close()
 
+# Async sessions for the request path, on the same test database file
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+write_behind.session_factory = TestingAsyncSessionLocal
+quota_manager.session_factory = TestingAsyncSessionLocal
+quota_manager.persist = False  # API tests charge stand-in users that have no rows to flush into
+workflow_catalog.session_factory = TestingAsyncSessionLocal
+workflow_catalog.enabled = False  # API tests talk to their mocked N8N directly
+execution_stats.session_factory = TestingAsyncSessionLocal
+execution_stats.enabled = False
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -0,0 +1,99 @@
+"""
+N8N-Sensei Admission Control Tests
+Tests for per-provider in-flight limits and load shedding
+"""
+
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from services.admission import ProviderAdmission, AdmissionRejected
+from services.metrics import metrics
+
+@pytest.mark.asyncio
+async def test_in_flight_calls_are_bounded():
+    """No more than max_in_flight calls run at once; the rest wait their turn."""
+    admission = ProviderAdmission("ollama", max_in_flight=2, max_queue=10, queue_timeout=1)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        await admission.acquire()
+        try:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+        finally:
+            admission.release()
+
+    await asyncio.gather(*(call() for _ in range(8)))
+    assert peak == 2
+    assert admission.in_flight == 0
+    assert metrics.get("ai_admission_admitted_total.ollama") >= 8
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_immediately():
+    """Once the wait queue is full, new calls fail fast with a retry hint."""
+    admission = ProviderAdmission("lm_studio", max_in_flight=1, max_queue=1, queue_timeout=5)
+    await admission.acquire()
+    queued = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire()
+    assert rejected.value.retry_after >= 1
+    assert admission.waiting == 1
+
+    admission.release()
+    await queued
+    admission.release()
+
+@pytest.mark.asyncio
+async def test_queue_wait_has_a_deadline():
+    """Waiting callers give up once the queue deadline passes."""
+    admission = ProviderAdmission("llama", max_in_flight=1, max_queue=5, queue_timeout=0.05)
+    await admission.acquire()
+
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire()
+    assert admission.waiting == 0
+    admission.release()
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_keep_its_slot():
+    """A waiter cancelled just as a slot is handed to it gives the slot back."""
+    admission = ProviderAdmission("openai", max_in_flight=1, max_queue=5, queue_timeout=5)
+    await admission.acquire()
+    waiter = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+
+    admission.release()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    await asyncio.wait_for(admission.acquire(), timeout=1)
+    assert admission.in_flight == 1
+    admission.release()
+
+def test_chat_returns_503_with_retry_after(client: TestClient):
+    """An overloaded provider is reported as 503 instead of a chat failure."""
+    from main import app
+    from auth import get_current_user
+    from database import User
+
+    async def overloaded(self, *args, **kwargs):
+        raise AdmissionRejected("ollama", "wait queue is full", retry_after=7)
+
+    app.dependency_overrides[get_current_user] = lambda: User(id="busy-user", email="b@example.com")
+    try:
+        with patch('services.ai_service.AIService.complete', overloaded):
+            response = client.post("/api/ai/chat", json={"message": "hi", "ai_provider": "ollama"})
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
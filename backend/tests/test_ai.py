@@ -3,6 +3,7 @@ N8N-Sensei AI API Tests
 Tests for AI integration functionality
 """
 
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
@@ -152,4 +153,37 @@ def test_test_ai_provider_connection(mock_test, client: TestClient):
     
     data = response.json()
     assert data["status"] == "connected"
-    assert "response_time" in data
\ No newline at end of file
+    assert "response_time" in data
+
+def test_ai_chat_stream_relays_tokens(client: TestClient, db_session):
+    """Test SSE streaming chat relays tokens and ends with a done event."""
+    from main import app
+    from auth import get_current_user
+    from database import User
+
+    from models import AIProvider
+
+    async def fake_stream(self, message, provider, context=None, history=None, on_provider=None):
+        on_provider(AIProvider.LM_STUDIO)
+        for token in ["You can ", "create workflow ", "nodes."]:
+            yield token
+
+    app.dependency_overrides[get_current_user] = lambda: User(id="stream-user", email="s@example.com")
+    try:
+        with patch('services.ai_service.AIService.chat_stream', fake_stream):
+            response = client.post("/api/ai/chat/stream", json={"message": "hi", "ai_provider": "auto"})
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+    assert events == ["event: start", "event: token", "event: token", "event: token", "event: done"]
+    assert '"workflow_action": "create_suggested"' in response.text
+
+    session_id = json.loads(response.text.split("\n")[1][len("data: "):])["session_id"]
+    history = client.get(f"/api/ai/conversation-history/{session_id}").json()
+    assert [turn["ai_response"] for turn in history] == ["You can create workflow nodes."]
+    assert history[0]["ai_provider"] == "lm_studio"
+    assert '"ai_provider": "lm_studio"' in response.text.split("event: done")[1]
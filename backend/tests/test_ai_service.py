@@ -0,0 +1,109 @@
+"""
+N8N-Sensei AI Service Tests
+Tests for AI service internals that do not need a live provider
+"""
+
+import asyncio
+import json
+import time
+import pytest
+import httpx
+
+from config import settings
+from models import AIProvider
+from services.ai_clients import AIClientRegistry, get_ai_clients, provider_limits
+from services.ai_service import AIService, get_ai_service
+from services.provider_health import ProviderHealthMonitor
+
+def test_ai_services_share_client_registry():
+    """Every AI service handed out by the dependency reuses the same clients."""
+    first = get_ai_service()
+    second = get_ai_service()
+
+    assert first.clients is get_ai_clients()
+    assert first.clients is second.clients
+    assert first.clients.http(AIProvider.OLLAMA) is second.clients.http(AIProvider.OLLAMA)
+
+def test_provider_pool_limit_override(monkeypatch):
+    """Per-provider pool limits override the global default."""
+    monkeypatch.setattr(settings, "AI_PROVIDER_POOL_LIMITS", {"ollama": 3})
+
+    assert provider_limits(AIProvider.OLLAMA).max_connections == 3
+    assert provider_limits(AIProvider.OLLAMA).max_keepalive_connections == 3
+    assert provider_limits(AIProvider.LM_STUDIO).max_connections == settings.AI_POOL_MAX_CONNECTIONS
+
+@pytest.mark.asyncio
+async def test_registry_close_releases_clients():
+    """Closing the registry closes its pooled HTTP clients."""
+    registry = AIClientRegistry()
+    await registry.close()
+
+    assert registry.http(AIProvider.OLLAMA).is_closed
+
+@pytest.mark.asyncio
+async def test_chat_stream_parses_ollama_ndjson():
+    """Ollama NDJSON chunks are relayed token by token."""
+    def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        assert body["stream"] is True
+        lines = [
+            json.dumps({"response": "Hello", "done": False}),
+            json.dumps({"response": " world", "done": False}),
+            json.dumps({"response": "", "done": True}),
+        ]
+        return httpx.Response(200, content="\n".join(lines).encode())
+
+    registry = AIClientRegistry()
+    registry.http_clients[AIProvider.OLLAMA] = httpx.AsyncClient(
+        base_url="http://ollama.test", transport=httpx.MockTransport(handler)
+    )
+
+    tokens = [token async for token in AIService(registry).chat_stream("hi", AIProvider.OLLAMA)]
+
+    assert tokens == ["Hello", " world"]
+    await registry.close()
+
+@pytest.mark.asyncio
+async def test_check_all_providers_runs_concurrently_under_deadline(monkeypatch):
+    """Slow probes run in parallel and are cut off at the global deadline."""
+    async def slow_probe(*args):
+        await asyncio.sleep(10)
+        return True
+
+    async def fast_probe(*args):
+        return True
+
+    service = AIService()
+    monkeypatch.setattr(service, "_check_local_ai", slow_probe)
+    monkeypatch.setattr(service, "_check_openai", fast_probe)
+    monkeypatch.setattr(service, "_check_anthropic", fast_probe)
+    monkeypatch.setattr(service, "_check_openrouter", fast_probe)
+
+    started = time.monotonic()
+    providers = await service.check_all_providers(deadline=0.2)
+
+    assert time.monotonic() - started < 1.0
+    assert providers == {
+        "llama": False, "lm_studio": False, "ollama": False,
+        "openai": True, "anthropic": True, "openrouter": True
+    }
+
+@pytest.mark.asyncio
+async def test_provider_health_serves_stale_table_while_revalidating(monkeypatch):
+    """Once populated, the status table never blocks a caller on probes."""
+    calls = []
+
+    async def probe(self, deadline=None):
+        calls.append(1)
+        if len(calls) > 1:
+            await asyncio.sleep(10)
+        return {"ollama": True}
+
+    monkeypatch.setattr(AIService, "check_all_providers", probe)
+    monitor = ProviderHealthMonitor(ttl_seconds=0.01)
+
+    assert await monitor.get_statuses() == {"ollama": True}
+    await asyncio.sleep(0.02)
+    assert await asyncio.wait_for(monitor.get_statuses(), timeout=0.1) == {"ollama": True}
+    assert monitor.snapshot()["stale"] is True
+    await monitor.stop()
@@ -2,17 +2,26 @@
 Test suite for N8N-Sensei authentication system
 """
 
+import asyncio
+import threading
+import time
 import pytest
+import pytest_asyncio
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import datetime, timedelta
 
 from main import app
-from database import User
+from database import Base, User
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    authenticate_user, create_user, UserCreate
+    authenticate_user, create_user, authenticate_user_async, create_user_async, UserCreate, TokenData, PasswordHasher, pwd_context, user_cache
 )
+from services.metrics import metrics
 
 client = TestClient(app)
 
@@ -27,6 +36,54 @@ class TestPasswordHashing:
         assert hashed != password
         assert verify_password(password, hashed) is True
         assert verify_password("wrong_password", hashed) is False
+    
+    @pytest.mark.asyncio
+    async def test_hashing_runs_on_the_dedicated_pool(self, monkeypatch):
+        """Test bcrypt runs on the password-hash threads, not the event loop"""
+        threads = []
+        def fake_hash(password):
+            threads.append(threading.current_thread().name)
+            return "hashed"
+        monkeypatch.setattr(pwd_context, "hash", fake_hash)
+        
+        hasher = PasswordHasher(workers=1, max_pending=4)
+        try:
+            assert await hasher.hash("secret") == "hashed"
+        finally:
+            hasher.shutdown()
+        assert threads[0].startswith("password-hash")
+    
+    @pytest.mark.asyncio
+    async def test_verify_returns_new_hash_when_cost_changes(self):
+        """Test hashes made with another bcrypt cost are flagged for rehash"""
+        old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+        hasher = PasswordHasher(workers=1, max_pending=4)
+        try:
+            valid, new_hash = await hasher.verify_and_update("secret", old_hash)
+            assert valid is True
+            assert new_hash is not None and pwd_context.verify("secret", new_hash)
+            assert await hasher.verify_and_update("secret", new_hash) == (True, None)
+            assert (await hasher.verify_and_update("wrong", old_hash))[0] is False
+        finally:
+            hasher.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_login_storm_is_shed(self, monkeypatch):
+        """Test hashing beyond the pending cap is rejected instead of queued"""
+        release = threading.Event()
+        monkeypatch.setattr(pwd_context, "hash", lambda password: release.wait(5) and "hashed")
+        
+        hasher = PasswordHasher(workers=1, max_pending=2)
+        try:
+            running = [asyncio.create_task(hasher.hash("a")), asyncio.create_task(hasher.hash("b"))]
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as rejected:
+                await hasher.hash("c")
+            assert rejected.value.status_code == 503
+            release.set()
+            assert await asyncio.gather(*running) == ["hashed", "hashed"]
+        finally:
+            hasher.shutdown()
 
 class TestJWTTokens:
     """Test JWT token creation and verification"""
@@ -48,6 +105,54 @@ class TestJWTTokens:
         assert isinstance(token, str)
         assert len(token) > 0
 
+class TestUserCache:
+    """Test the authenticated-user cache"""
+    
+    def setup_method(self):
+        user_cache.clear()
+        metrics.reset()
+    
+    def login_headers(self, db_session: Session) -> dict:
+        user = create_user(db_session, UserCreate(
+            email="cached@example.com", password="test_password", full_name="Cached User"
+        ))
+        token = create_access_token(data={"sub": user.id, "role": user.role})
+        return {"Authorization": f"Bearer {token}"}
+    
+    def test_repeat_requests_are_served_from_cache(self, client: TestClient, db_session: Session):
+        """Test only the first request with a token looks the user up"""
+        headers = self.login_headers(db_session)
+        for _ in range(3):
+            response = client.get("/api/auth/me", headers=headers)
+            assert response.status_code == 200
+            assert response.json()["email"] == "cached@example.com"
+        
+        assert metrics.get("auth_user_cache_misses_total") == 1
+        assert metrics.get("auth_user_cache_hits_total") == 2
+    
+    def test_profile_update_and_deactivation_invalidate(self, client: TestClient, db_session: Session):
+        """Test PUT /me and ORM changes to a user drop its cached snapshot"""
+        headers = self.login_headers(db_session)
+        client.get("/api/auth/me", headers=headers)
+        
+        response = client.put("/api/auth/me", headers=headers, json={"full_name": "Renamed"})
+        assert response.json()["full_name"] == "Renamed"
+        assert client.get("/api/auth/me", headers=headers).json()["full_name"] == "Renamed"
+        
+        user = db_session.query(User).filter(User.email == "cached@example.com").first()
+        user.is_active = False
+        db_session.commit()
+        assert client.get("/api/auth/me", headers=headers).status_code == 400
+    
+    def test_entries_expire_with_the_token(self, db_session: Session):
+        """Test snapshots are not served past the token's exp claim"""
+        user = create_user(db_session, UserCreate(
+            email="expiring@example.com", password="test_password", full_name="Expiring User"
+        ))
+        token_data = TokenData(user_id=user.id, role=user.role, expires_at=time.time() - 1)
+        user_cache.put("expired-token", token_data, user)
+        assert user_cache.get("expired-token") is None
+
 class TestUserAuthentication:
     """Test user authentication functionality"""
     
@@ -85,6 +190,50 @@ class TestUserAuthentication:
         authenticated_user = authenticate_user(db_session, "nonexistent@example.com", "password")
         assert authenticated_user is None
 
+@pytest_asyncio.fixture
+async def async_db():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        yield db
+    await engine.dispose()
+
+class TestAsyncUserAuthentication:
+    """Test the async authentication used by the login and register endpoints"""
+    
+    @pytest.mark.asyncio
+    async def test_authenticate_user_success(self, async_db):
+        """Test a user created through the async path can log in"""
+        await create_user_async(async_db, UserCreate(
+            email="async@example.com", password="test_password", full_name="Async User"
+        ))
+        authenticated_user = await authenticate_user_async(async_db, "async@example.com", "test_password")
+        assert authenticated_user is not None
+        assert authenticated_user.email == "async@example.com"
+    
+    @pytest.mark.asyncio
+    async def test_authenticate_user_wrong_password(self, async_db):
+        """Test authentication with wrong password"""
+        await create_user_async(async_db, UserCreate(
+            email="async2@example.com", password="test_password", full_name="Async User 2"
+        ))
+        assert await authenticate_user_async(async_db, "async2@example.com", "wrong_password") is None
+    
+    @pytest.mark.asyncio
+    async def test_authenticate_user_nonexistent(self, async_db):
+        """Test authentication with non-existent user"""
+        assert await authenticate_user_async(async_db, "nonexistent@example.com", "password") is None
+    
+    @pytest.mark.asyncio
+    async def test_create_user_duplicate_email(self, async_db):
+        """Test registering an email twice is rejected"""
+        user_data = UserCreate(email="async3@example.com", password="test_password", full_name="Async User 3")
+        await create_user_async(async_db, user_data)
+        with pytest.raises(HTTPException) as error:
+            await create_user_async(async_db, user_data)
+        assert error.value.status_code == 400
+
 class TestUserRegistration:
     """Test user registration endpoints"""
     
@@ -0,0 +1,100 @@
+"""
+N8N-Sensei Conversation Context Tests
+Tests for token-budgeted multi-turn chat history
+"""
+
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, AIConversation
+from models import AIMessage, AIProvider
+from services.ai_service import AIService
+from services.conversation_context import ContextBuilder, HeuristicTokenCounter, SessionContext
+
+class WordCounter:
+    """One token per word keeps the budgets in these tests easy to reason about"""
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+def test_heuristic_counter_tracks_text_length():
+    """The local estimate grows with the text and counts punctuation."""
+    counter = HeuristicTokenCounter()
+    assert counter.count("") == 0
+    assert counter.count("hello, world!") == 6
+    assert counter.count("workflow " * 100) > counter.count("workflow " * 10)
+
+def test_window_keeps_newest_turns_and_summarizes_the_rest():
+    """Turns beyond the budget are replaced by a summary line each, newest turns kept verbatim."""
+    context = SessionContext(WordCounter(), max_turns=10)
+    for index in range(6):
+        context.add(f"question {index} " + "word " * 10, f"answer {index} " + "word " * 10)
+
+    everything = context.window(10_000)
+    assert [message.role for message in everything] == ["user", "assistant"] * 6
+
+    trimmed = context.window(150)
+    assert trimmed[0].role == "system"
+    assert trimmed[-2].content.startswith("question 5")
+    kept_turns = (len(trimmed) - 1) // 2
+    assert 0 < kept_turns < 6
+    assert f"question {5 - kept_turns}" in trimmed[0].content
+
+def test_turns_past_the_limit_roll_into_the_summary():
+    """Appending past max_turns evicts the oldest turn into the summary."""
+    context = SessionContext(WordCounter(), max_turns=2)
+    for index in range(3):
+        context.add(f"question {index}", f"answer {index}")
+
+    window = context.window(10_000)
+    assert window[0].role == "system"
+    assert "question 0" in window[0].content
+    assert [message.content for message in window[1:]] == ["question 1", "answer 1", "question 2", "answer 2"]
+
+@pytest.mark.asyncio
+async def test_builder_loads_once_then_appends(session_factory):
+    """The first request reads the session from the database; later turns are appended to the cache."""
+    start = datetime(2024, 1, 1)
+    async with session_factory() as db:
+        db.add_all([
+            AIConversation(
+                session_id="chat", user_id="u1", user_message=f"question {index}",
+                ai_response=f"answer {index}", created_at=start + timedelta(seconds=index)
+            )
+            for index in range(3)
+        ] + [AIConversation(session_id="chat", user_id="u2", user_message="other user", ai_response="x", created_at=start)])
+        await db.commit()
+
+    builder = ContextBuilder(WordCounter(), max_turns=2)
+    async with session_factory() as db:
+        history = await builder.history(db, "u1", "chat", AIProvider.OLLAMA)
+    assert [message.content for message in history] == ["question 1", "answer 1", "question 2", "answer 2"]
+
+    builder.append("u1", "chat", "question 3", "answer 3")
+    # A closed session proves the cached context is used instead of the database
+    history = await builder.history(None, "u1", "chat", AIProvider.OLLAMA)
+    assert [message.content for message in history][-2:] == ["question 3", "answer 3"]
+    assert history[0].role == "system" and "question 1" in history[0].content
+
+def test_history_is_sent_between_system_prompt_and_message():
+    """Providers receive earlier turns in order, with summaries folded into the system prompt."""
+    history = [
+        AIMessage(role="system", content="Earlier in this conversation:\n- The user asked: hi"),
+        AIMessage(role="user", content="make a webhook"),
+        AIMessage(role="assistant", content="done"),
+    ]
+    messages = AIService()._chat_messages("now add email", "You are N8N-Sensei.", history)
+    assert [message["role"] for message in messages] == ["system", "user", "assistant", "user"]
+    assert messages[0]["content"].endswith("- The user asked: hi")
+    assert messages[-1]["content"] == "now add email"
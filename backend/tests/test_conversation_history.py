@@ -0,0 +1,65 @@
+"""
+N8N-Sensei Conversation History Tests
+Tests for keyset pagination, field projection and export of conversation history
+"""
+
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+from database import AIConversation
+from pagination import NEXT_CURSOR_HEADER
+from services.write_behind import write_behind
+
+def add_turns(db_session, session_id: str, count: int):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for index in range(count):
+        db_session.add(AIConversation(
+            id=f"turn-{index}",
+            session_id=session_id,
+            user_message=f"question {index}",
+            ai_response=f"answer {index}" * 50,
+            ai_provider="ollama",
+            # Two turns share each timestamp so the id tiebreaker is exercised
+            created_at=start + timedelta(seconds=index // 2)
+        ))
+    db_session.commit()
+
+def test_history_pages_follow_the_cursor(client: TestClient, db_session):
+    """Following X-Next-Cursor visits every turn exactly once, in order."""
+    add_turns(db_session, "paged", 5)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/ai/conversation-history/paged", params=params)
+        assert response.status_code == 200
+        seen += [turn["id"] for turn in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    assert seen == [f"turn-{index}" for index in range(5)]
+
+def test_history_field_projection_skips_large_columns(client: TestClient, db_session):
+    """Requested fields are returned along with the cursor key columns only."""
+    add_turns(db_session, "projected", 1)
+
+    response = client.get("/api/ai/conversation-history/projected", params={"fields": "user_message"})
+    assert response.json() == [{"id": "turn-0", "user_message": "question 0", "created_at": "2024-01-01T12:00:00"}]
+    assert client.get("/api/ai/conversation-history/projected", params={"fields": "secret"}).status_code == 400
+
+def test_history_export_streams_stored_and_buffered_turns(client: TestClient, db_session):
+    """The export holds every stored turn followed by ones not flushed yet."""
+    add_turns(db_session, "exported", 3)
+    buffered = AIConversation(
+        id="turn-buffered", session_id="exported", user_message="late", created_at=datetime(2024, 1, 2)
+    )
+    write_behind.buffer.append(buffered)
+    try:
+        response = client.get("/api/ai/conversation-history/exported/export", params={"fields": "user_message"})
+    finally:
+        write_behind.buffer.remove(buffered)
+
+    assert response.headers["content-type"].startswith("application/json")
+    assert [turn["id"] for turn in response.json()] == ["turn-0", "turn-1", "turn-2", "turn-buffered"]
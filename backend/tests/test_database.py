@@ -0,0 +1,62 @@
+"""
+N8N-Sensei Database Tests
+Tests for database engine configuration and the SQLite profile
+"""
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database_models
+from config import settings
+from database import Base, async_database_url, async_engine_options, configure_sqlite, add_missing_columns, create_missing_indexes
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./bridge.db", "sqlite+aiosqlite:///./bridge.db"),
+    ("postgresql://user:pass@db/sensei", "postgresql+asyncpg://user:pass@db/sensei"),
+    ("postgresql+psycopg2://user:pass@db/sensei", "postgresql+asyncpg://user:pass@db/sensei"),
+    ("sqlite+aiosqlite:///./bridge.db", "sqlite+aiosqlite:///./bridge.db"),
+])
+def test_async_database_url_swaps_driver(url, expected):
+    """Sync database URLs map to their asyncio drivers."""
+    assert async_database_url(url) == expected
+
+def test_in_memory_sqlite_skips_pool_options():
+    """A pooled in-memory database would give every connection its own empty database."""
+    assert async_engine_options("sqlite+aiosqlite://") == {}
+    assert async_engine_options("sqlite+aiosqlite:///:memory:") == {}
+    assert "pool_size" in async_engine_options("sqlite+aiosqlite:///./bridge.db")
+
+@pytest.mark.asyncio
+async def test_sqlite_profile_applied_to_new_connections(tmp_path):
+    """Every pooled connection gets WAL, synchronous=NORMAL and the busy timeout."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}")
+    configure_sqlite(engine.sync_engine)
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+            assert (await conn.exec_driver_sql("PRAGMA synchronous")).scalar() == 1
+            assert (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+    finally:
+        await engine.dispose()
+
+def test_health_reports_database_settings(client):
+    """The health check exposes the settings read back at startup."""
+    response = client.get("/api/health")
+    assert response.json()["database_settings"]["dialect"] == "sqlite"
+
+def test_missing_columns_are_added_to_existing_tables(tmp_path):
+    """A workflows table created before the catalog columns gets them at startup, and a second run is a no-op."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id VARCHAR PRIMARY KEY)")
+        conn.exec_driver_sql("CREATE TABLE workflows (id VARCHAR PRIMARY KEY, n8n_workflow_id VARCHAR, name VARCHAR NOT NULL)")
+        Base.metadata.create_all(conn)
+        database_models.Base.metadata.create_all(conn)
+        for _ in range(2):
+            add_missing_columns(conn)
+            create_missing_indexes(conn)
+
+    columns = {column["name"] for column in inspect(engine).get_columns("workflows")}
+    assert {"n8n_data", "tag_names", "n8n_updated_at", "synced_at"} <= columns
+    engine.dispose()
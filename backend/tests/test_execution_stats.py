@@ -0,0 +1,171 @@
+"""
+N8N-Sensei Execution Stats Tests
+Tests for incremental execution statistics and the duration sketch
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from services.n8n_service import N8NService
+from services.execution_stats import DurationSketch, ExecutionStatsStore
+
+def execution(execution_id: int, status: str = "success", days_ago: int = 0, duration_ms: int = 1000):
+    started = datetime.utcnow().replace(microsecond=0) - timedelta(days=days_ago)
+    stopped = None if status == "running" else started + timedelta(milliseconds=duration_ms)
+    return {
+        "id": str(execution_id), "status": status, "finished": status == "success",
+        "startedAt": started.isoformat() + "Z",
+        "stoppedAt": stopped.isoformat() + "Z" if stopped else None,
+    }
+
+class FakeExecutions:
+    """N8N executions API: lists are newest first, bounded by firstId and lastId, then limited; single executions are wrapped in data."""
+
+    def __init__(self, executions):
+        self.executions = executions
+        self.requests = []
+
+    def handler(self, request: httpx.Request):
+        if request.url.path != "/rest/executions":
+            execution_id = request.url.path.rsplit("/", 1)[-1]
+            return httpx.Response(200, json={"data": next(item for item in self.executions if item["id"] == execution_id)})
+        params = request.url.params
+        self.requests.append(dict(params))
+        first_id, last_id = params.get("firstId"), params.get("lastId")
+        page = sorted(
+            (
+                item for item in self.executions
+                if (first_id is None or int(item["id"]) > int(first_id)) and (last_id is None or int(item["id"]) < int(last_id))
+            ),
+            key=lambda item: -int(item["id"])
+        )[:int(params["limit"])]
+        return httpx.Response(200, json={"data": {"results": page, "count": len(page)}})
+
+@pytest_asyncio.fixture
+async def store():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    store = ExecutionStatsStore(async_sessionmaker(engine, expire_on_commit=False), sync_interval=60, max_staleness=60)
+    store.page_size = 2
+    yield store
+    await engine.dispose()
+
+def make_service(fake: FakeExecutions) -> N8NService:
+    client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(fake.handler))
+    return N8NService(client=client)
+
+def test_sketch_quantiles_are_close_and_mergeable():
+    """Quantiles stay within the relative accuracy and merged sketches match one built from all values."""
+    first, second, combined = DurationSketch(), DurationSketch(), DurationSketch()
+    for value in range(1, 1001):
+        (first if value % 2 else second).add(value)
+        combined.add(value)
+    first.merge(second)
+
+    assert first.to_dict() == combined.to_dict()
+    assert abs(first.quantile(0.5) - 500) / 500 < 0.02
+    assert abs(first.quantile(0.99) - 990) / 990 < 0.02
+    assert DurationSketch.from_dict(first.to_dict()).quantile(0.9) == first.quantile(0.9)
+
+@pytest.mark.asyncio
+async def test_sync_counts_every_execution_once(store):
+    """All executions are counted across pages, and later syncs only add new ones."""
+    fake = FakeExecutions([execution(index, "error" if index % 4 == 0 else "success") for index in range(1, 8)])
+    service = make_service(fake)
+
+    assert await store.sync(service, "wf") == 7
+    fake.executions.append(execution(8, "error"))
+    fake.requests.clear()
+    assert await store.sync(service, "wf") == 1
+    assert fake.requests[0]["firstId"] == "7"
+
+    stats = await store.statistics(service, "wf")
+    assert stats["total_executions"] == 8
+    assert (stats["successful"], stats["failed"]) == (6, 2)
+    assert stats["success_rate"] == 75.0
+    assert stats["duration_ms"]["p50"] == pytest.approx(1000, rel=0.02)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_running_executions_are_counted_when_they_finish(store):
+    """An unfinished execution is rechecked on later syncs and counted once it finishes, without recounting later ones."""
+    fake = FakeExecutions([execution(1), execution(2, "running"), execution(3)])
+    service = make_service(fake)
+
+    assert await store.sync(service, "wf") == 2
+    stats = await store.statistics(service, "wf")
+    assert (stats["successful"], stats["running"]) == (2, 1)
+
+    fake.executions[1] = execution(2, "error")
+    assert await store.sync(service, "wf") == 1
+    store.synced.clear()
+    stats = await store.statistics(service, "wf")
+    assert (stats["total_executions"], stats["successful"], stats["failed"], stats["running"]) == (3, 2, 1, 0)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_window_covers_recent_days_only(store):
+    """Windowed numbers sum the daily buckets inside the window."""
+    fake = FakeExecutions([
+        execution(1, "error", days_ago=30),
+        execution(2, days_ago=3, duration_ms=2000),
+        execution(3, days_ago=0, duration_ms=2000),
+    ])
+    service = make_service(fake)
+
+    stats = await store.statistics(service, "wf", window_days=7)
+
+    assert stats["total_executions"] == 3
+    assert stats["window"]["total_executions"] == 2
+    assert stats["window"]["success_rate"] == 100.0
+    assert stats["window"]["duration_ms"]["p90"] == pytest.approx(2000, rel=0.02)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_bursts_longer_than_a_page_leave_no_gap(store):
+    """A first sync and a later burst spanning several pages are counted in full."""
+    fake = FakeExecutions([execution(index) for index in range(1, 6)])
+    service = make_service(fake)
+
+    assert await store.sync(service, "wf") == 5
+    fake.executions.extend(execution(index, "error") for index in range(6, 13))
+    assert await store.sync(service, "wf") == 7
+    assert await store.sync(service, "wf") == 0
+
+    store.synced.clear()
+    stats = await store.statistics(service, "wf")
+    assert (stats["total_executions"], stats["successful"], stats["failed"]) == (12, 5, 7)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_crashed_executions_are_terminal(store):
+    """N8N's "unknown" status counts as a failure instead of staying pending."""
+    fake = FakeExecutions([execution(1, "unknown"), execution(2)])
+    service = make_service(fake)
+
+    assert await store.sync(service, "wf") == 2
+    stats = await store.statistics(service, "wf")
+    assert (stats["failed"], stats["running"]) == (1, 0)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_analysis_uses_the_store_for_statistics(store):
+    """With a store attached, analysis reports all-time numbers and fetches only the recent runs."""
+    fake = FakeExecutions([execution(index, "error" if index == 3 else "success") for index in range(1, 8)])
+    service = make_service(fake)
+    service.stats_store = store
+    service.get_workflow = lambda workflow_id: asyncio.sleep(0, {"id": workflow_id, "name": "One"})
+
+    analysis = await service.analyze_workflow_for_ai("wf")
+
+    assert (analysis["performance"]["total_executions"], analysis["performance"]["failed"]) == (7, 1)
+    assert len(analysis["recent_executions"]) == 5
+    assert not any(request["limit"] == "100" for request in fake.requests)
+    await service.close()
@@ -0,0 +1,167 @@
+"""
+N8N-Sensei Job Service Tests
+Tests for the database-backed background job queue
+"""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from config import settings
+from database import Base, AIJob, User
+from models import AIProvider, JobStatus
+from services.job_service import JobManager
+from services.quota import quota_manager
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_job_runs_in_background_and_reports_result(session_factory):
+    """Submit returns immediately; watchers see every state until the job finishes."""
+    release = asyncio.Event()
+
+    async def handler(payload):
+        await release.wait()
+        return {"echo": payload["description"]}
+
+    manager = JobManager(session_factory, workers=2, handlers={"generate_workflow": handler})
+    await manager.start()
+    try:
+        job = await manager.submit("generate_workflow", AIProvider.OLLAMA, {"description": "hello"})
+        assert job.status == JobStatus.QUEUED
+
+        states = []
+
+        async def follow():
+            async for update in manager.watch(job.id):
+                states.append(update.status)
+
+        watcher = asyncio.create_task(follow())
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.wait_for(watcher, timeout=2)
+
+        assert states[-1] == JobStatus.SUCCEEDED
+        assert JobStatus.RUNNING in states
+        assert (await manager.get(job.id)).result == {"echo": "hello"}
+    finally:
+        await manager.stop()
+
+@pytest.mark.asyncio
+async def test_provider_concurrency_is_bounded(session_factory, monkeypatch):
+    """Workers never run more jobs for a provider than its configured limit."""
+    monkeypatch.setattr(settings, "AI_JOB_PROVIDER_CONCURRENCY", {"ollama": 1})
+    running = 0
+    peak = 0
+
+    async def handler(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return {}
+
+    manager = JobManager(session_factory, workers=4, handlers={"generate_workflow": handler})
+    await manager.start()
+    try:
+        jobs = [await manager.submit("generate_workflow", AIProvider.OLLAMA, {}) for _ in range(4)]
+        await asyncio.wait_for(manager.queue.join(), timeout=2)
+        assert peak == 1
+        assert all([(await manager.get(job.id)).status == JobStatus.SUCCEEDED for job in jobs])
+    finally:
+        await manager.stop()
+
+@pytest.mark.asyncio
+async def test_saturated_provider_does_not_hold_up_other_providers(session_factory, monkeypatch):
+    """A job waiting for a busy provider gives up its worker to jobs for other providers."""
+    monkeypatch.setattr(settings, "AI_JOB_PROVIDER_CONCURRENCY", {"ollama": 1})
+    release = asyncio.Event()
+
+    async def handler(payload):
+        if payload.get("wait"):
+            await release.wait()
+        return {}
+
+    manager = JobManager(session_factory, workers=2, handlers={"generate_workflow": handler})
+    await manager.start()
+    try:
+        slow = [await manager.submit("generate_workflow", AIProvider.OLLAMA, {"wait": True}) for _ in range(2)]
+        other = await manager.submit("generate_workflow", AIProvider.OPENAI, {})
+        for _ in range(50):
+            if (await manager.get(other.id)).status == JobStatus.SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        assert (await manager.get(other.id)).status == JobStatus.SUCCEEDED
+        assert (await manager.get(slow[1].id)).status == JobStatus.QUEUED
+
+        release.set()
+        await asyncio.wait_for(manager.queue.join(), timeout=2)
+        assert all([(await manager.get(job.id)).status == JobStatus.SUCCEEDED for job in slow])
+    finally:
+        await manager.stop()
+
+@pytest.mark.asyncio
+async def test_unfinished_jobs_resume_after_restart(session_factory):
+    """Jobs queued or running when the process stopped are run again on start, except interrupted generations."""
+    async with session_factory() as db:
+        db.add(AIJob(id="interrupted", job_type="optimize_workflow", status="running", ai_provider="ollama", request_data={}))
+        db.add(AIJob(id="queued", job_type="generate_workflow", status="queued", ai_provider="ollama", request_data={}))
+        db.add(AIJob(id="creating", job_type="generate_workflow", status="running", ai_provider="ollama", request_data={}))
+        await db.commit()
+    ran = []
+
+    async def handler(payload):
+        ran.append(payload)
+        raise Exception("n8n unavailable")
+
+    manager = JobManager(session_factory, workers=1, handlers={"generate_workflow": handler, "optimize_workflow": handler})
+    await manager.start()
+    try:
+        await asyncio.wait_for(manager.queue.join(), timeout=2)
+        assert len(ran) == 2
+        for job_id in ["interrupted", "queued"]:
+            job = await manager.get(job_id)
+            assert job.status == JobStatus.FAILED
+            assert job.error == "n8n unavailable"
+        creating = await manager.get("creating")
+        assert creating.status == JobStatus.FAILED
+        assert "Interrupted" in creating.error
+    finally:
+        await manager.stop()
+
+@pytest.mark.asyncio
+async def test_jobs_are_only_visible_to_their_owner(session_factory):
+    """A job read with another user's id looks like a job that does not exist."""
+    manager = JobManager(session_factory, workers=1, handlers={"generate_workflow": lambda payload: None})
+    job = await manager.submit("generate_workflow", AIProvider.OLLAMA, {}, user_id="owner")
+
+    assert (await manager.get(job.id, user_id="owner")).id == job.id
+    assert await manager.get(job.id, user_id="someone-else") is None
+
+@pytest.mark.asyncio
+async def test_failed_jobs_refund_their_quota(session_factory):
+    """The quota charged when a job was submitted is given back if the job fails."""
+    user = User(id="job-user", email="j@example.com", api_quota_used=0, api_quota_limit=5)
+    quota_manager.consume(user)
+
+    async def handler(payload):
+        raise Exception("provider down")
+
+    manager = JobManager(session_factory, workers=1, handlers={"generate_workflow": handler})
+    await manager.start()
+    try:
+        await manager.submit("generate_workflow", AIProvider.OLLAMA, {}, user_id="job-user")
+        await asyncio.wait_for(manager.queue.join(), timeout=2)
+        assert quota_manager.usage(user) == (0, 5)
+    finally:
+        await manager.stop()
+        quota_manager.entries.pop("job-user", None)
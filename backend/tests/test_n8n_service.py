@@ -0,0 +1,145 @@
+"""
+N8N-Sensei N8N Service Tests
+Tests for the N8N API client using a mocked transport
+"""
+
+import asyncio
+import pytest
+import httpx
+
+from services.n8n_service import N8NService, execution_statistics, get_n8n_service, request_memo
+
+def make_service(handler):
+    """Build an N8NService whose HTTP client is backed by a mock transport."""
+    client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(handler))
+    return N8NService(client=client)
+
+@pytest.mark.asyncio
+async def test_requests_share_one_client():
+    """All calls go through the same pooled client."""
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request.url.path)
+        if request.url.path == "/rest/workflows/1":
+            return httpx.Response(200, json={"id": "1", "name": "One"})
+        return httpx.Response(200, json={"data": []})
+
+    service = make_service(handler)
+    client = service.client
+
+    workflow = await service.get_workflow("1")
+    executions = await service.get_executions("1", limit=5)
+
+    assert workflow["name"] == "One"
+    assert executions == []
+    assert service.client is client
+    assert seen == ["/rest/workflows/1", "/rest/executions"]
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_list_workflows_asks_n8n_to_filter_and_page():
+    """Filters, projection and paging are sent upstream and the reported count ends the pages."""
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(dict(request.url.params))
+        return httpx.Response(200, json={"data": [{"id": "3", "active": True}], "count": 3})
+
+    service = make_service(handler)
+    page, next_offset = await service.list_workflows(active=True, tag="sales", select=["id", "active"], limit=1, offset=2)
+
+    assert page == [{"id": "3", "active": True}]
+    assert next_offset is None
+    assert seen == [{
+        "skip": "2", "take": "1",
+        "filter": '{"active": true, "tags": ["sales"]}',
+        "select": '["id", "active"]'
+    }]
+    await service.close()
+
+def test_get_n8n_service_returns_shared_instance():
+    """The dependency hands out the same service every time."""
+    assert get_n8n_service() is get_n8n_service()
+
+@pytest.mark.asyncio
+async def test_get_workflow_revalidates_upstream():
+    """Repeat reads send N8N's ETag back and a 304 is served from the remembered body."""
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == 'W/"abc"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"id": "1", "name": "One"}, headers={"ETag": 'W/"abc"'})
+
+    service = make_service(handler)
+    first = await service.get_workflow("1")
+    second = await service.get_workflow("1")
+
+    assert first == second == {"id": "1", "name": "One"}
+    assert seen == [None, 'W/"abc"']
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_analysis_fetches_each_resource_once():
+    """Analysis reads the workflow and one execution page, and repeat reads in the same scope are shared."""
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append((request.url.path, request.url.params.get("limit")))
+        if request.url.path == "/rest/workflows/1":
+            return httpx.Response(200, json={"id": "1", "name": "One", "nodes": [{"name": "Start"}]})
+        executions = [{"id": str(index), "finished": True} for index in range(8)]
+        return httpx.Response(200, json={"data": executions})
+
+    service = make_service(handler)
+    with request_memo():
+        workflow = await service.get_workflow("1")
+        analysis = await service.analyze_workflow_for_ai("1")
+
+    assert workflow["name"] == "One"
+    assert analysis["performance"]["total_executions"] == 8
+    assert [execution["id"] for execution in analysis["recent_executions"]] == ["0", "1", "2", "3", "4"]
+    assert sorted(seen) == [("/rest/executions", "100"), ("/rest/workflows/1", None)]
+    await service.close()
+
+def test_execution_statistics_reads_the_status():
+    """Successful runs with a stoppedAt count as successes and crashed runs as failures."""
+    stats = execution_statistics([
+        {"id": "1", "status": "success", "finished": True, "stoppedAt": "2024-01-01T00:00:01.000Z"},
+        {"id": "2", "status": "error", "finished": False, "stoppedAt": "2024-01-01T00:00:01.000Z"},
+        {"id": "3", "status": "unknown", "finished": False, "stoppedAt": None},
+        {"id": "4", "status": "running", "finished": False, "stoppedAt": None},
+    ])
+
+    assert (stats["successful"], stats["failed"], stats["running"]) == (1, 2, 1)
+    assert stats["success_rate"] == pytest.approx(100 / 3)
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_gets_share_one_request():
+    """Identical GETs in flight together make one upstream call and all see its result or error."""
+    calls = []
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request):
+        calls.append(request.url.path)
+        await release.wait()
+        if request.url.path == "/rest/workflows/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"id": "1", "name": "One"})
+
+    service = make_service(handler)
+    readers = [asyncio.ensure_future(service.get_workflow("1")) for _ in range(5)]
+    failing = [asyncio.ensure_future(service.get_workflow("missing")) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*readers)
+    errors = await asyncio.gather(*failing, return_exceptions=True)
+
+    assert sorted(calls) == ["/rest/workflows/1", "/rest/workflows/missing"]
+    assert all(result == {"id": "1", "name": "One"} for result in results)
+    assert results[0] is not results[1]
+    assert all("Workflow not found" in str(error) for error in errors)
+    assert service.inflight == {}
+    await service.close()
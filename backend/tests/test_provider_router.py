@@ -0,0 +1,163 @@
+"""
+N8N-Sensei Provider Router Tests
+Tests for latency-aware routing of ai_provider="auto" and hedged requests
+"""
+
+import asyncio
+import pytest
+
+from config import settings
+from models import AIProvider
+from services.ai_service import AIService
+from services.metrics import metrics
+from services.provider_router import ProviderRouter, provider_router
+
+def test_candidates_ordered_by_ewma_latency():
+    """Faster providers are tried first."""
+    router = ProviderRouter(alpha=0.5)
+    router.record(AIProvider.OLLAMA, 900.0, ok=True)
+    router.record(AIProvider.LM_STUDIO, 150.0, ok=True)
+    router.record(AIProvider.LLAMA, 400.0, ok=True)
+
+    candidates = router.candidates()
+    assert candidates.index(AIProvider.LM_STUDIO) < candidates.index(AIProvider.LLAMA)
+    assert candidates.index(AIProvider.LLAMA) < candidates.index(AIProvider.OLLAMA)
+    assert AIProvider.AUTO not in candidates
+
+def test_unhealthy_providers_are_tried_last():
+    """Probe failures and recent errors demote a provider behind healthy ones."""
+    router = ProviderRouter(alpha=0.5)
+    router.record(AIProvider.LM_STUDIO, 50.0, ok=True)
+    for _ in range(3):
+        router.record(AIProvider.LLAMA, 100.0, ok=False)
+
+    candidates = router.candidates({"lm_studio": False})
+    assert candidates[-2:] == [AIProvider.LM_STUDIO, AIProvider.LLAMA]
+    assert router.routing_table({"lm_studio": False})[0]["healthy"] is True
+
+def test_error_rate_decays_while_a_provider_is_idle():
+    """A provider demoted by failures becomes healthy again once its errors age out."""
+    router = ProviderRouter(alpha=0.5, error_half_life=60)
+    for _ in range(3):
+        router.record(AIProvider.LLAMA, 100.0, ok=False)
+    assert not router.is_healthy(AIProvider.LLAMA, {})
+
+    router.stats[AIProvider.LLAMA].error_rate_at -= 180
+    assert router.error_rate(AIProvider.LLAMA) == pytest.approx(0.875 / 8)
+    assert router.is_healthy(AIProvider.LLAMA, {})
+
+@pytest.mark.asyncio
+async def test_auto_fails_over_to_next_provider(monkeypatch):
+    """A failing or slow provider is skipped within the latency budget."""
+    order = [AIProvider.OLLAMA, AIProvider.LM_STUDIO, AIProvider.LLAMA]
+    calls = []
+
+    async def dispatch(self, message, system_prompt, provider, history=None):
+        calls.append(provider)
+        if provider == AIProvider.OLLAMA:
+            raise Exception("connection refused")
+        if provider == AIProvider.LM_STUDIO:
+            await asyncio.sleep(1)
+        return f"answer from {provider.value}"
+
+    monkeypatch.setattr(AIService, "_dispatch", dispatch)
+    monkeypatch.setattr(provider_router, "candidates", lambda statuses=None: order)
+    monkeypatch.setattr(settings, "AI_ROUTER_ATTEMPT_TIMEOUT_SECONDS", 0.05)
+    failures_before = provider_router.stats[AIProvider.OLLAMA].failures
+
+    result = await AIService().complete("hello", AIProvider.AUTO)
+
+    assert result.error is False
+    assert result.provider == "llama"
+    assert calls == order
+    assert provider_router.stats[AIProvider.OLLAMA].failures == failures_before + 1
+
+@pytest.mark.asyncio
+async def test_auto_stream_reports_and_records_the_answering_provider(monkeypatch):
+    """A streamed auto chat names the provider that answered and feeds both outcomes to the router."""
+    async def ollama_stream(self, messages, provider):
+        raise Exception("connection refused")
+        yield
+
+    async def lm_studio_stream(self, provider, path, model, messages):
+        for token in ["hel", "lo"]:
+            yield token
+
+    monkeypatch.setattr(AIService, "_stream_ollama", ollama_stream)
+    monkeypatch.setattr(AIService, "_stream_openai_compatible", lm_studio_stream)
+    monkeypatch.setattr(provider_router, "candidates", lambda statuses=None: [AIProvider.OLLAMA, AIProvider.LM_STUDIO])
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", False)
+    failures_before = provider_router.stats[AIProvider.OLLAMA].failures
+    calls_before = provider_router.stats[AIProvider.LM_STUDIO].calls
+    answered = []
+
+    tokens = [token async for token in AIService().chat_stream("hello", AIProvider.AUTO, on_provider=answered.append)]
+
+    assert tokens == ["hel", "lo"]
+    assert answered == [AIProvider.LM_STUDIO]
+    assert provider_router.stats[AIProvider.OLLAMA].failures == failures_before + 1
+    assert provider_router.stats[AIProvider.LM_STUDIO].calls == calls_before + 1
+
+@pytest.mark.asyncio
+async def test_hedged_request_cancels_stalled_primary(monkeypatch):
+    """A stalled local backend is hedged onto its partner and the loser is cancelled."""
+    cancelled = []
+
+    async def dispatch(self, message, system_prompt, provider, history=None):
+        if provider == AIProvider.OLLAMA:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(provider)
+                raise
+        return f"answer from {provider.value}"
+
+    monkeypatch.setattr(AIService, "_dispatch", dispatch)
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(provider_router, "hedge_delay", lambda provider, first_token=False: 0.02)
+    metrics.reset()
+
+    result = await AIService().complete("hello", AIProvider.OLLAMA)
+    await asyncio.sleep(0)
+
+    assert result.text == "answer from lm_studio"
+    assert result.provider == "lm_studio"
+    assert cancelled == [AIProvider.OLLAMA]
+    assert metrics.get("ai_hedge_fired_total") == 1
+    assert metrics.get("ai_hedge_secondary_wins_total") == 1
+
+@pytest.mark.asyncio
+async def test_hedged_answers_are_cached_as_the_partners(monkeypatch):
+    """A hedge partner's answer is cached under the partner, and hits report the partner."""
+    from services.response_cache import response_cache
+    calls = []
+
+    async def dispatch(self, message, system_prompt, provider, history=None):
+        calls.append(provider)
+        if provider == AIProvider.OLLAMA:
+            await asyncio.sleep(5)
+        return f"answer from {provider.value}"
+
+    monkeypatch.setattr(AIService, "_dispatch", dispatch)
+    monkeypatch.setattr(settings, "AI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(provider_router, "hedge_delay", lambda provider, first_token=False: 0.02)
+    await response_cache.clear()
+    service = AIService()
+
+    await service.complete("hello", AIProvider.OLLAMA, cache_ttl=60)
+    hit = await service.complete("hello", AIProvider.LM_STUDIO, cache_ttl=60)
+
+    assert hit.cache_hit is True
+    assert (hit.text, hit.provider, hit.model) == ("answer from lm_studio", "lm_studio", settings.LM_STUDIO_MODEL)
+    assert calls == [AIProvider.OLLAMA, AIProvider.LM_STUDIO]
+    await response_cache.clear()
+
+def test_hedge_delay_tracks_p95_latency(monkeypatch):
+    """The hedge delay follows the primary's recent tail latency once there are enough samples."""
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_SAMPLES", 10)
+    router = ProviderRouter()
+    assert router.hedge_delay(AIProvider.OLLAMA) == settings.AI_HEDGE_DEFAULT_DELAY_MS / 1000
+
+    for latency in range(100, 2100, 100):
+        router.record(AIProvider.OLLAMA, float(latency), ok=True)
+    assert router.hedge_delay(AIProvider.OLLAMA) == 2.0
@@ -0,0 +1,206 @@
+"""
+N8N-Sensei Quota Tests
+Tests for in-memory API quota accounting and batched flushes
+"""
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, User
+from services.quota import QuotaManager, QuotaExceeded, quota_manager
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add(User(id="u1", email="u1@example.com", hashed_password="x", full_name="U1", api_quota_used=0, api_quota_limit=5))
+        await db.commit()
+    yield factory
+    await engine.dispose()
+
+async def stored_usage(session_factory) -> int:
+    async with session_factory() as db:
+        return (await db.get(User, "u1")).api_quota_used
+
+@pytest.mark.asyncio
+async def test_calls_are_counted_in_memory_until_flushed(session_factory):
+    """Consuming quota touches no database rows until the batch flush."""
+    manager = QuotaManager(session_factory, flush_interval=60)
+    async with session_factory() as db:
+        user = await db.get(User, "u1")
+    for _ in range(3):
+        manager.consume(user)
+
+    assert manager.usage(user) == (3, 5)
+    assert await stored_usage(session_factory) == 0
+    await manager.flush()
+    assert await stored_usage(session_factory) == 3
+    assert manager.usage(user) == (3, 5)
+
+@pytest.mark.asyncio
+async def test_workers_reconcile_through_relative_updates(session_factory):
+    """Two workers charging the same user add up in the database and see each other's usage after a flush."""
+    first = QuotaManager(session_factory, flush_interval=60)
+    second = QuotaManager(session_factory, flush_interval=60)
+    async with session_factory() as db:
+        user = await db.get(User, "u1")
+
+    first.consume(user)
+    first.consume(user)
+    second.consume(user)
+    await first.flush()
+    await second.flush()
+    assert await stored_usage(session_factory) == 3
+
+    await first.flush()
+    assert first.usage(user) == (3, 5)
+    first.consume(user)
+    first.consume(user)
+    with pytest.raises(QuotaExceeded):
+        first.consume(user)
+
+@pytest.mark.asyncio
+async def test_refunds_undo_charges_flushed_or_not(session_factory):
+    """A refund cancels a pending charge, or is written back if the charge was already flushed."""
+    manager = QuotaManager(session_factory, flush_interval=60)
+    async with session_factory() as db:
+        user = await db.get(User, "u1")
+
+    manager.consume(user)
+    manager.consume(user)
+    manager.refund(user.id)
+    assert manager.usage(user) == (1, 5)
+    await manager.flush()
+    manager.refund(user.id)
+    await manager.flush()
+    assert await stored_usage(session_factory) == 0
+
+@pytest.mark.asyncio
+async def test_flush_updates_cached_users(session_factory):
+    """Cached user snapshots pick up the usage a flush wrote, which ORM events never see."""
+    from auth import TokenData, user_cache, _patch_cached_quota
+
+    manager = QuotaManager(session_factory, flush_interval=60)
+    manager.flush_listeners.append(_patch_cached_quota)
+    async with session_factory() as db:
+        user = await db.get(User, "u1")
+    user_cache.put("quota-token", TokenData(user_id="u1", role="user"), user)
+
+    manager.consume(user)
+    manager.consume(user)
+    await manager.flush()
+    cached = user_cache.get("quota-token")
+    user_cache.invalidate("u1")
+
+    assert (cached.api_quota_used, cached.api_quota_limit) == (2, 5)
+    assert _patch_cached_quota in quota_manager.flush_listeners
+
+def test_failed_chat_is_not_charged(client: TestClient):
+    """A chat the provider could not answer gives its charge back."""
+    from unittest.mock import patch
+    from main import app
+    from auth import get_current_user
+    from services.ai_service import ChatResult
+
+    async def failing(self, *args, **kwargs):
+        return ChatResult(text="Error communicating with ollama: down", provider="ollama", model="", error=True)
+
+    user = User(id="refund-user", email="r@example.com", api_quota_used=0, api_quota_limit=5)
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        with patch('services.ai_service.AIService.complete', failing):
+            response = client.post("/api/ai/chat", json={"message": "hi", "ai_provider": "ollama"})
+        usage = quota_manager.usage(user)
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+        quota_manager.entries.pop("refund-user", None)
+
+    assert response.status_code == 200
+    assert usage == (0, 5)
+
+def test_failed_chat_is_refunded_once_when_saving_fails(client: TestClient):
+    """A failed reply followed by a failing save gives back exactly one charge."""
+    from unittest.mock import patch
+    from main import app
+    from auth import get_current_user
+    from services.ai_service import ChatResult
+
+    async def failing(self, *args, **kwargs):
+        return ChatResult(text="Error communicating with ollama: down", provider="ollama", model="", error=True)
+
+    async def failing_save(conversation):
+        raise RuntimeError("queue closed")
+
+    user = User(id="double-refund-user", email="d@example.com", api_quota_used=0, api_quota_limit=5)
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        with patch('services.ai_service.AIService.complete', failing), \
+             patch('routers.ai.write_behind.add', failing_save):
+            response = client.post("/api/ai/chat", json={"message": "hi", "ai_provider": "ollama"})
+        usage = quota_manager.usage(user)
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+        quota_manager.entries.pop("double-refund-user", None)
+
+    assert response.status_code == 500
+    assert usage == (0, 5)
+
+def test_chat_usage_is_flushed_and_read_back(db_session, monkeypatch):
+    """With persistence on, the app's flusher writes chat usage and picks up other workers' usage."""
+    from unittest.mock import patch
+    from main import app
+    from auth import get_current_user
+    from services.ai_service import ChatResult
+
+    async def answer(self, *args, **kwargs):
+        return ChatResult(text="hello", provider="ollama", model="llama2")
+
+    db_session.add(User(id="flush-user", email="f@example.com", hashed_password="x", full_name="F", api_quota_used=0, api_quota_limit=10))
+    db_session.commit()
+    monkeypatch.setattr(quota_manager, "persist", True)
+    app.dependency_overrides[get_current_user] = lambda: User(id="flush-user", email="f@example.com", api_quota_used=0, api_quota_limit=10)
+
+    def chat(times: int):
+        # Leaving the client runs the app's shutdown, which flushes
+        with patch('services.ai_service.AIService.complete', answer), TestClient(app) as client:
+            for _ in range(times):
+                assert client.post("/api/ai/chat", json={"message": "hi", "ai_provider": "ollama"}).status_code == 200
+
+    def stored() -> int:
+        db_session.expire_all()
+        return db_session.get(User, "flush-user").api_quota_used
+
+    try:
+        chat(2)
+        assert stored() == 2
+        # Another worker's flush lands in between
+        db_session.get(User, "flush-user").api_quota_used += 3
+        db_session.commit()
+        chat(1)
+        assert stored() == 6
+        assert quota_manager.usage(User(id="flush-user")) == (6, 10)
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+        quota_manager.entries.pop("flush-user", None)
+
+def test_chat_is_rejected_once_the_quota_is_used(client: TestClient):
+    """AI endpoints answer 429 before calling any provider once the quota is exhausted."""
+    from main import app
+    from auth import get_current_user
+
+    user = User(id="quota-user", email="q@example.com", api_quota_used=5, api_quota_limit=5)
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        response = client.post("/api/ai/chat", json={"message": "hi", "ai_provider": "ollama"})
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+        quota_manager.entries.pop("quota-user", None)
+
+    assert response.status_code == 429
+    assert "quota" in response.json()["detail"]
@@ -0,0 +1,51 @@
+"""
+N8N-Sensei Rate Limit Tests
+Tests for token bucket rate limiting and its stores
+"""
+
+import pytest
+
+from auth import RateLimiter
+from services.rate_limit import BucketStore, MemoryBucketStore, SQLiteBucketStore
+
+def drain(store, key: str, attempts: int, now: float, capacity: float = 3, rate: float = 1.0):
+    return [store.take(key, capacity, rate, now) for _ in range(attempts)]
+
+def test_memory_bucket_allows_bursts_then_refills():
+    """A bucket allows capacity requests at once, then one more per refilled token."""
+    store = MemoryBucketStore()
+    assert drain(store, "u1", 4, now=100.0) == [True, True, True, False]
+    assert drain(store, "u1", 2, now=101.0) == [True, False]
+    # Other keys have their own bucket
+    assert store.take("u2", 3, 1.0, 101.0) is True
+
+def test_memory_store_evicts_refilled_buckets():
+    """Buckets that have refilled completely are dropped, keeping state to active keys."""
+    store = MemoryBucketStore()
+    for index in range(100):
+        store.take(f"idle-{index}", 3, 1.0, 100.0)
+    store.take("active", 3, 1.0, 110.0)
+    assert list(store.buckets) == ["active"]
+
+def test_incomplete_store_cannot_be_created():
+    """A store missing part of the interface fails at construction."""
+    class TakeOnlyStore(BucketStore):
+        def take(self, key, capacity, rate, now):
+            return True
+
+    with pytest.raises(TypeError):
+        TakeOnlyStore()
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    """Two processes opening the same file draw from the same buckets."""
+    path = str(tmp_path / "rate_limits.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert [first.take("u1", 3, 1.0, 100.0), second.take("u1", 3, 1.0, 100.0)] == [True, True]
+    assert [first.take("u1", 3, 1.0, 100.0), second.take("u1", 3, 1.0, 100.0)] == [True, False]
+    assert second.take("u1", 3, 1.0, 102.0) is True
+
+def test_rate_limiter_keeps_its_interface():
+    """RateLimiter(max_requests, window_minutes).is_allowed still limits per user."""
+    limiter = RateLimiter(max_requests=2, window_minutes=60, name="test", store=MemoryBucketStore())
+    assert [limiter.is_allowed("user-1") for _ in range(3)] == [True, True, False]
+    assert limiter.is_allowed("user-2") is True
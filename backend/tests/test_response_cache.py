@@ -0,0 +1,99 @@
+"""
+N8N-Sensei Response Cache Tests
+Tests for the exact-match AI response cache
+"""
+
+import pytest
+
+from models import AIProvider
+from services.ai_service import AIService
+from services.response_cache import (
+    CacheBackend, MemoryCacheBackend, SQLiteCacheBackend, ResponseCache, cache_key, response_cache
+)
+
+def test_cache_key_covers_every_input():
+    """Changing any part of the request changes the key."""
+    base = cache_key("ollama", "llama3", 0.7, "system", "hello", "2024-01-01")
+
+    assert base == cache_key("ollama", "llama3", 0.7, "system", "hello", "2024-01-01")
+    assert base != cache_key("openai", "llama3", 0.7, "system", "hello", "2024-01-01")
+    assert base != cache_key("ollama", "llama3", 0.2, "system", "hello", "2024-01-01")
+    assert base != cache_key("ollama", "llama3", 0.7, "system", "hello", "2024-02-01")
+
+def test_incomplete_backend_cannot_be_created():
+    """A backend missing part of the interface fails at construction."""
+    class GetOnlyBackend(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used_by_size():
+    """The in-process tier stays under its byte budget."""
+    backend = MemoryCacheBackend(max_bytes=30)
+    await backend.set("a", "x" * 10, ttl=60)
+    await backend.set("b", "y" * 10, ttl=60)
+    await backend.get("a")
+    await backend.set("c", "z" * 10, ttl=60)
+
+    assert await backend.get("b") is None
+    assert (await backend.get("a"))[0] == "x" * 10
+    assert backend.size_bytes <= 30
+
+@pytest.mark.asyncio
+async def test_disk_tier_hit_warms_memory_tier(tmp_path):
+    """A hit on the SQLite tier is promoted to the in-process tier."""
+    memory = MemoryCacheBackend(max_bytes=1024)
+    disk = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    await disk.set("key", "cached answer", ttl=60)
+    cache = ResponseCache([memory, disk])
+
+    assert await cache.get("key") == "cached answer"
+    assert (await memory.get("key"))[0] == "cached answer"
+
+@pytest.mark.asyncio
+async def test_complete_caches_successes_but_not_errors(monkeypatch):
+    """Repeats are answered from cache; provider errors are never cached."""
+    calls = []
+
+    async def dispatch(self, message, system_prompt, provider, history=None):
+        calls.append(message)
+        if message == "broken":
+            raise Exception("boom")
+        return "answer"
+
+    monkeypatch.setattr(AIService, "_dispatch", dispatch)
+    await response_cache.clear()
+    service = AIService()
+
+    first = await service.complete("explain", AIProvider.OLLAMA, cache_ttl=60)
+    second = await service.complete("explain", AIProvider.OLLAMA, cache_ttl=60)
+    assert (first.cache_hit, second.cache_hit) == (False, True)
+    assert second.text == "answer"
+
+    await service.complete("broken", AIProvider.OLLAMA, cache_ttl=60)
+    error = await service.complete("broken", AIProvider.OLLAMA, cache_ttl=60)
+    assert error.error is True
+    assert calls == ["explain", "broken", "broken"]
+    await response_cache.clear()
+
+@pytest.mark.asyncio
+async def test_generation_raises_provider_errors(monkeypatch):
+    """A failed generation raises the provider error instead of returning an empty workflow, and is not cached."""
+    calls = []
+
+    async def dispatch(self, message, system_prompt, provider, history=None):
+        calls.append(provider)
+        raise Exception("connection refused")
+
+    monkeypatch.setattr(AIService, "_dispatch", dispatch)
+    await response_cache.clear()
+    service = AIService()
+
+    for _ in range(2):
+        with pytest.raises(Exception, match="connection refused"):
+            await service.generate_workflow("send an email", AIProvider.OLLAMA, cache_ttl=60)
+    assert calls == [AIProvider.OLLAMA, AIProvider.OLLAMA]
+    await response_cache.clear()
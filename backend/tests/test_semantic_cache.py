@@ -0,0 +1,77 @@
+"""
+N8N-Sensei Semantic Cache Tests
+Tests for the embedding-based near-duplicate prompt cache
+"""
+
+import pytest
+import numpy as np
+
+from services.semantic_cache import HashingVectorizer, SemanticCache
+
+@pytest.fixture
+def cache():
+    return SemanticCache(embedder=HashingVectorizer(256), threshold=0.6, max_bytes=1024 * 1024, initial_capacity=2)
+
+def test_hashing_vectorizer_is_normalized_and_deterministic():
+    """Embeddings are unit-length float32 and stable across calls."""
+    vectorizer = HashingVectorizer(256)
+    first, second = vectorizer.embed(["add a webhook node", "add a webhook node"])
+
+    assert first.dtype == np.float32
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert np.array_equal(first, second)
+
+@pytest.mark.asyncio
+async def test_near_duplicate_prompt_hits(cache):
+    """A reworded question is answered from cache; an unrelated one is not."""
+    await cache.store("scope", "how do I add a webhook node", "Use the Webhook node.", ttl=60)
+
+    hit = await cache.lookup("scope", "how do I add a webhook node?")
+    assert hit is not None and hit[0] == "Use the Webhook node."
+    assert await cache.lookup("scope", "schedule a daily email report") is None
+
+@pytest.mark.asyncio
+async def test_lookup_is_scoped(cache):
+    """Entries from another provider/model/system prompt scope never match."""
+    await cache.store("scope-a", "how do I add a webhook node", "answer", ttl=60)
+
+    assert await cache.lookup("scope-b", "how do I add a webhook node") is None
+
+@pytest.mark.asyncio
+async def test_matrix_grows_and_evicts_by_size():
+    """The matrix grows past its initial capacity and evicts least recently used entries by size."""
+    vectorizer = HashingVectorizer(64)
+    entry_size = 64 * 4 + len("prompt 0") + len("response 0")
+    cache = SemanticCache(embedder=vectorizer, threshold=0.99, max_bytes=entry_size * 3, initial_capacity=2)
+
+    for index in range(4):
+        await cache.store("scope", f"prompt {index}", f"response {index}", ttl=60)
+
+    assert cache.vectors.shape[0] >= 3
+    assert len(cache.lru) == 3
+    assert cache.size_bytes <= entry_size * 3
+    assert await cache.lookup("scope", "prompt 0") is None
+    assert (await cache.lookup("scope", "prompt 3"))[0] == "response 3"
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_freed_before_live_ones(monkeypatch):
+    """Expired rows give up their slots before any live entry is evicted by size."""
+    import services.semantic_cache as semantic_cache_module
+    clock = [1000.0]
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: clock[0])
+    entry_size = 64 * 4 + len("prompt 0") + len("response 0")
+    cache = SemanticCache(embedder=HashingVectorizer(64), threshold=0.99, max_bytes=entry_size * 2, initial_capacity=2)
+
+    await cache.store("scope", "prompt 0", "response 0", ttl=60)
+    await cache.store("scope", "prompt 1", "response 1", ttl=1)
+    clock[0] += 5
+    assert await cache.lookup("scope", "prompt 1") is None
+    assert len(cache.lru) == 1 and len(cache.free_slots) == 1
+
+    await cache.store("scope", "prompt 1", "response 1", ttl=1)
+    clock[0] += 5
+    await cache.store("scope", "prompt 2", "response 2", ttl=60)
+
+    assert (await cache.lookup("scope", "prompt 0"))[0] == "response 0"
+    assert (await cache.lookup("scope", "prompt 2"))[0] == "response 2"
+    assert cache.size_bytes == entry_size * 2
@@ -0,0 +1,206 @@
+"""
+N8N-Sensei Workflow Catalog Tests
+Tests for the local workflow mirror and its incremental sync
+"""
+
+import json
+import pytest
+import pytest_asyncio
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database_models
+from services.n8n_service import N8NService
+from services import workflow_catalog as catalog_module
+from services.workflow_catalog import WorkflowCatalog
+
+def full_workflow(workflow_id: str, name: str, updated_at: str, active: bool = False, tags=None):
+    return {
+        "id": workflow_id, "name": name, "active": active,
+        "tags": [{"id": tag, "name": tag} for tag in tags or []],
+        "nodes": [{"name": "Start", "type": "n8n-nodes-base.start"}],
+        "connections": {}, "settings": {}, "versionId": f"v-{updated_at}",
+        "meta": {"templateCredsSetupCompleted": True}, "pinData": {"Start": [{"json": {"ok": True}}]},
+        "createdAt": "2024-01-01T00:00:00.000Z", "updatedAt": updated_at,
+    }
+
+class FakeN8N:
+    """N8N API over a mock transport, recording which workflow bodies were fetched."""
+
+    def __init__(self, workflows):
+        self.workflows = {workflow["id"]: workflow for workflow in workflows}
+        self.fetched = []
+        self.fail_listing_at = None  # skip offset whose page answers 500
+
+    def handler(self, request: httpx.Request):
+        path = request.url.path
+        if path == "/rest/workflows" and request.method == "GET":
+            params = request.url.params
+            skip, take = int(params.get("skip", 0)), int(params.get("take", 1000))
+            if skip == self.fail_listing_at:
+                return httpx.Response(500)
+            fields = json.loads(params.get("select", "null"))
+            data = [
+                {field: workflow[field] for field in fields} if fields else workflow
+                for workflow in sorted(self.workflows.values(), key=lambda workflow: workflow["id"])
+            ]
+            return httpx.Response(200, json={"data": data[skip:skip + take], "count": len(data)})
+        workflow_id = path.rsplit("/", 1)[-1]
+        if path.endswith("/activate"):
+            self.workflows[path.split("/")[-2]]["active"] = True
+            return httpx.Response(200, json={})
+        if request.method == "GET" and workflow_id in self.workflows:
+            self.fetched.append(workflow_id)
+            return httpx.Response(200, json=self.workflows[workflow_id])
+        if request.method == "PUT":
+            self.workflows[workflow_id] = {**json.loads(request.content), "id": workflow_id}
+            return httpx.Response(200, json=self.workflows[workflow_id])
+        return httpx.Response(404)
+
+@pytest_asyncio.fixture
+async def catalog():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(database_models.Base.metadata.create_all)
+    yield WorkflowCatalog(async_sessionmaker(engine, expire_on_commit=False), sync_interval=30, max_staleness=60)
+    await engine.dispose()
+
+def make_service(fake: FakeN8N, catalog: WorkflowCatalog) -> N8NService:
+    client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(fake.handler))
+    service = N8NService(client=client)
+    service.catalog = catalog
+    return service
+
+@pytest.mark.asyncio
+async def test_sync_fetches_only_changed_workflows(catalog):
+    """After the first sync only workflows with a new updatedAt are fetched, and deleted ones disappear."""
+    fake = FakeN8N([
+        full_workflow("1", "Alpha", "2024-01-02T00:00:00.000Z"),
+        full_workflow("2", "Beta", "2024-01-02T00:00:00.000Z"),
+        full_workflow("3", "Gamma", "2024-01-02T00:00:00.000Z"),
+    ])
+    service = make_service(fake, catalog)
+
+    assert await catalog.sync(service) == 3
+    assert sorted(fake.fetched) == ["1", "2", "3"]
+
+    fake.fetched.clear()
+    fake.workflows["2"] = full_workflow("2", "Beta v2", "2024-01-03T00:00:00.000Z")
+    del fake.workflows["3"]
+    assert await catalog.sync(service) == 2
+    assert fake.fetched == ["2"]
+    assert await catalog.count() == 2
+    assert (await catalog.get("2"))["name"] == "Beta v2"
+    assert await catalog.get("3") is None
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_the_catalog(catalog):
+    """Once synced, listing, filtering and single reads do not go to N8N."""
+    fake = FakeN8N([
+        full_workflow("1", "Alpha", "2024-01-02T00:00:00.000Z", active=True, tags=["Sales"]),
+        full_workflow("2", "Beta", "2024-01-02T00:00:00.000Z", tags=["crm"]),
+        full_workflow("3", "Gamma", "2024-01-02T00:00:00.000Z", active=True),
+    ])
+    service = make_service(fake, catalog)
+    await catalog.sync(service)
+    fake.fetched.clear()
+
+    page, next_offset = await service.list_workflows(active=True, select=["id", "name"], limit=1)
+    assert page == [{"id": "1", "name": "Alpha"}]
+    assert next_offset == 1
+    page, next_offset = await service.list_workflows(tag="sales")
+    assert [workflow["id"] for workflow in page] == ["1"]
+    assert page[0]["tags"] == [{"id": "Sales", "name": "Sales"}]
+    assert next_offset is None
+
+    workflow = await service.get_workflow("2")
+    assert workflow == fake.workflows["2"]
+    assert await service.get_workflows_count() == 3
+    assert fake.fetched == []
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_writes_update_the_catalog(catalog):
+    """Updates and activations through the service are visible locally without another sync."""
+    fake = FakeN8N([full_workflow("1", "Alpha", "2024-01-02T00:00:00.000Z")])
+    service = make_service(fake, catalog)
+    await catalog.sync(service)
+
+    await service.update_workflow("1", full_workflow("1", "Renamed", "2024-01-04T00:00:00.000Z"))
+    assert await service.activate_workflow("1") is True
+
+    workflow = await catalog.get("1")
+    assert workflow["name"] == "Renamed"
+    assert workflow["active"] is True
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_failed_sync_falls_back_to_n8n(catalog):
+    """If the catalog cannot sync, reads go to N8N live."""
+    def handler(request: httpx.Request):
+        if request.url.path == "/rest/workflows/1":
+            return httpx.Response(200, json={"id": "1", "name": "Live"})
+        return httpx.Response(500)
+
+    client = httpx.AsyncClient(base_url="http://n8n.test", transport=httpx.MockTransport(handler))
+    service = N8NService(client=client)
+    service.catalog = catalog
+
+    assert (await service.get_workflow("1"))["name"] == "Live"
+    assert catalog.synced_at is None
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_sync_follows_every_page_before_removing(catalog, monkeypatch):
+    """Workflows past the first page stay in the catalog, and a failed page removes nothing."""
+    monkeypatch.setattr(catalog_module, "SYNC_PAGE_SIZE", 2)
+    fake = FakeN8N([full_workflow(str(index), f"Workflow {index}", "2024-01-02T00:00:00.000Z") for index in range(5)])
+    service = make_service(fake, catalog)
+
+    await catalog.sync(service)
+    assert await catalog.count() == 5
+
+    del fake.workflows["0"]
+    fake.fail_listing_at = 2
+    with pytest.raises(Exception):
+        await catalog.sync(service)
+    assert await catalog.count() == 5
+
+    fake.fail_listing_at = None
+    await catalog.sync(service)
+    assert await catalog.count() == 4
+    assert await catalog.get("4") == fake.workflows["4"]
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_stale_catalog_is_served_while_it_refreshes(catalog):
+    """Reads within the staleness bound do not wait for N8N; the refresh runs in the background."""
+    fake = FakeN8N([full_workflow("1", "Alpha", "2024-01-02T00:00:00.000Z")])
+    service = make_service(fake, catalog)
+    await catalog.sync(service)
+    catalog.synced_at -= catalog.sync_interval
+    fake.workflows["1"] = full_workflow("1", "Renamed", "2024-01-05T00:00:00.000Z")
+
+    assert (await service.get_workflow("1"))["name"] == "Alpha"
+    await catalog._refresh
+    assert catalog.is_fresh()
+    assert (await service.get_workflow("1"))["name"] == "Renamed"
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_catalog_past_the_staleness_bound_is_not_served(catalog):
+    """Once the mirror is older than max_staleness and syncs fail, reads go to N8N."""
+    fake = FakeN8N([full_workflow("1", "Alpha", "2024-01-02T00:00:00.000Z")])
+    service = make_service(fake, catalog)
+    await catalog.sync(service)
+    catalog.synced_at -= catalog.max_staleness
+    fake.workflows["1"] = full_workflow("1", "Renamed", "2024-01-05T00:00:00.000Z")
+    fake.fail_listing_at = 0
+    fake.fetched.clear()
+
+    assert await catalog.ensure_fresh(service) is False
+    assert (await service.get_workflow("1"))["name"] == "Renamed"
+    assert fake.fetched == ["1"]
+    await service.close()
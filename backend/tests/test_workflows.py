@@ -114,4 +114,76 @@ def test_get_workflow_executions(mock_get_executions, client: TestClient):
     data = response.json()
     assert len(data) == 2
     assert data[0]["id"] == "exec_1"
-    assert data[1]["status"] == "failed"
\ No newline at end of file
+    assert data[1]["status"] == "failed"
+
+
+def n8n_workflow(index: int, active: bool, tags=()):
+    return {
+        "id": str(index),
+        "name": f"Workflow {index}",
+        "active": active,
+        "tags": [{"id": tag, "name": tag} for tag in tags],
+        "nodes": [{"id": "start", "type": "n8n-nodes-base.start"}],
+        "connections": {},
+        "createdAt": "2024-01-01T00:00:00",
+        "updatedAt": "2024-01-01T00:00:00"
+    }
+
+def test_get_workflows_pages_filters_and_projects(client: TestClient):
+    """Test cursor pages, tag and active filters and field projection on legacy N8N lists."""
+    workflows = [n8n_workflow(index, active=index % 2 == 0, tags=["Sales"] if index < 4 else []) for index in range(6)]
+
+    async def fake_fetch(self, params):
+        return workflows, None
+
+    with patch('services.n8n_service.N8NService._fetch_workflows', fake_fetch):
+        first = client.get("/api/workflows", params={"limit": 2, "category": "sales", "fields": "id,name"})
+        second = client.get("/api/workflows", params={
+            "limit": 2, "category": "sales", "fields": "id,name", "cursor": first.headers["X-Next-Cursor"]
+        })
+        active = client.get("/api/workflows", params={"active_only": True})
+
+    assert first.json() == [{"id": "0", "name": "Workflow 0"}, {"id": "1", "name": "Workflow 1"}]
+    assert [workflow["id"] for workflow in second.json()] == ["2", "3"]
+    assert "X-Next-Cursor" not in second.headers
+    assert [workflow["id"] for workflow in active.json()] == ["0", "2", "4"]
+    assert active.json()[0]["nodes"] == [{"id": "start", "type": "n8n-nodes-base.start"}]
+
+def test_get_workflows_rejects_unknown_fields(client: TestClient):
+    """Test unknown projection fields are a client error."""
+    response = client.get("/api/workflows", params={"fields": "id,secrets"})
+    assert response.status_code == 400
+
+def test_get_workflow_revalidates_with_etag(client: TestClient):
+    """An unchanged workflow answers If-None-Match with 304 and a new updatedAt changes the ETag."""
+    workflow = n8n_workflow(7, active=True)
+
+    async def fake_get(self, workflow_id):
+        return workflow
+
+    with patch('services.n8n_service.N8NService.get_workflow', fake_get):
+        first = client.get("/api/workflows/7")
+        etag = first.headers["ETag"]
+        cached = client.get("/api/workflows/7", headers={"If-None-Match": etag})
+        workflow["updatedAt"] = "2024-01-02T00:00:00"
+        changed = client.get("/api/workflows/7", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert "max-age" in first.headers["Cache-Control"]
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["name"] == "Workflow 7"
+
+@patch('services.n8n_service.N8NService.get_workflow_statistics')
+def test_get_workflow_statistics_revalidates_with_etag(mock_statistics, client: TestClient):
+    """Statistics carry an ETag and answer a matching If-None-Match with 304."""
+    mock_statistics.return_value = {"total_executions": 3, "successful": 3, "failed": 0, "running": 0, "success_rate": 100.0}
+
+    first = client.get("/api/workflows/7/statistics")
+    cached = client.get("/api/workflows/7/statistics", headers={"If-None-Match": f'W/{first.headers["ETag"]}'})
+
+    assert first.json()["total_executions"] == 3
+    assert cached.status_code == 304
@@ -0,0 +1,69 @@
+"""
+N8N-Sensei Write-Behind Tests
+Tests for batched conversation inserts
+"""
+
+import asyncio
+from datetime import datetime
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, AIConversation
+from services.write_behind import WriteBehindWriter
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+async def count_rows(session_factory) -> int:
+    async with session_factory() as db:
+        return (await db.execute(select(func.count()).select_from(AIConversation))).scalar_one()
+
+def conversation(session_id: str, text: str = "hi") -> AIConversation:
+    return AIConversation(session_id=session_id, user_message=text, ai_response=text, created_at=datetime.utcnow())
+
+@pytest.mark.asyncio
+async def test_rows_are_buffered_until_a_batch_fills(session_factory):
+    """Inserts wait in the buffer and are readable before they reach the database."""
+    writer = WriteBehindWriter(session_factory, batch_size=3, flush_interval=60, max_buffer=100)
+    writer.start()
+    try:
+        await writer.add(conversation("s1"))
+        await writer.add(conversation("s2"))
+        await asyncio.sleep(0.01)
+        assert await count_rows(session_factory) == 0
+        assert [row.session_id for row in writer.pending(AIConversation, session_id="s1")] == ["s1"]
+
+        await writer.add(conversation("s1", "again"))
+        await asyncio.sleep(0.05)
+        assert await count_rows(session_factory) == 3
+        assert writer.pending(AIConversation) == []
+    finally:
+        await writer.stop()
+
+@pytest.mark.asyncio
+async def test_stop_flushes_buffered_rows(session_factory):
+    """Shutdown writes out whatever is still buffered."""
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60, max_buffer=100)
+    writer.start()
+    await writer.add(conversation("s1"))
+    await writer.stop()
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_full_buffer_applies_backpressure(session_factory):
+    """A full buffer is flushed inline instead of growing without bound."""
+    writer = WriteBehindWriter(session_factory, batch_size=100, flush_interval=60, max_buffer=2)
+    for index in range(5):
+        await writer.add(conversation(f"s{index}"))
+    assert len(writer.buffer) <= 2
+    assert await count_rows(session_factory) == 4
+    await writer.flush()
+    assert await count_rows(session_factory) == 5